@@ -0,0 +1,172 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, Iterable, Optional, Set, Tuple
+
+from .config import settings
+
+# Streams are cut into slices of this size so a large ZIP chunk cannot hog
+# the uplink between two scheduling decisions.
+SLICE_SIZE = 64 * 1024
+_METER_WINDOW = 5.0
+
+
+class TokenBucket:
+	"""Async token bucket (bytes per second).
+
+	Consumers take what they need up front and sleep off any resulting debt,
+	so concurrent users of one bucket still share `rate` in aggregate.
+	"""
+
+	def __init__(self, rate: float, burst: Optional[float] = None):
+		self.rate = float(rate)
+		self.capacity = float(burst if burst is not None else max(rate, SLICE_SIZE))
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+
+	async def consume(self, n: int) -> None:
+		now = time.monotonic()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		self.tokens -= n
+		if self.tokens < 0:
+			await asyncio.sleep(-self.tokens / self.rate)
+
+
+class _Meter:
+	"""Bytes sent plus a sliding-window throughput estimate."""
+
+	def __init__(self):
+		self.total = 0
+		self.active = 0
+		self.samples: Deque[Tuple[float, int]] = deque()
+
+	def add(self, n: int) -> None:
+		now = time.monotonic()
+		self.total += n
+		self.samples.append((now, n))
+		self._trim(now)
+
+	def _trim(self, now: float) -> None:
+		while self.samples and now - self.samples[0][0] > _METER_WINDOW:
+			self.samples.popleft()
+
+	def rate(self) -> float:
+		self._trim(time.monotonic())
+		return sum(n for _, n in self.samples) / _METER_WINDOW
+
+
+class EgressScheduler:
+	"""Hands out the global egress budget round-robin across share tokens.
+
+	Each token is one flow; waiting slices of a flow are served FIFO, and
+	after a flow is served it moves to the back of the line, so one recipient
+	with many parallel connections gets the same share as any other.
+	"""
+
+	def __init__(self):
+		self.bucket: Optional[TokenBucket] = None
+		self._flows: "OrderedDict[str, Deque[Tuple[int, asyncio.Future]]]" = OrderedDict()
+		self._runner: Optional[asyncio.Task] = None
+
+	def configure(self, rate: float) -> None:
+		if rate <= 0:
+			self.bucket = None
+		elif self.bucket is None or self.bucket.rate != rate:
+			self.bucket = TokenBucket(rate)
+
+	async def acquire(self, flow: str, n: int) -> None:
+		if self.bucket is None:
+			return
+		loop = asyncio.get_running_loop()
+		fut = loop.create_future()
+		self._flows.setdefault(flow, deque()).append((n, fut))
+		if self._runner is None or self._runner.done() or self._runner.get_loop() is not loop:
+			self._runner = loop.create_task(self._run())
+		await fut
+
+	async def _run(self) -> None:
+		while self._flows:
+			flow, waiting = next(iter(self._flows.items()))
+			n, fut = waiting.popleft()
+			if not fut.done():  # done = cancelled, the client went away
+				if self.bucket is not None:
+					await self.bucket.consume(n)
+				if not fut.done():
+					fut.set_result(None)
+				# consume() does not suspend while the bucket has tokens: yield once
+				# so the consumer just served can queue its next slice in turn
+				await asyncio.sleep(0)
+			# Rotate only after serving, so flows that re-queued meanwhile go first
+			if waiting:
+				self._flows.move_to_end(flow)
+			else:
+				del self._flows[flow]
+
+
+_BUCKETS: Dict[str, TokenBucket] = {}
+_METERS: Dict[str, _Meter] = {}
+scheduler = EgressScheduler()
+
+
+def _share_bucket(token: str, rate: float) -> Optional[TokenBucket]:
+	if rate <= 0:
+		_BUCKETS.pop(token, None)
+		return None
+	bucket = _BUCKETS.get(token)
+	if bucket is None or bucket.rate != rate:
+		bucket = _BUCKETS[token] = TokenBucket(rate)
+	return bucket
+
+
+def _per_worker(kbps: int) -> float:
+	# Buckets live in process memory, so each uvicorn worker gets an equal slice
+	return kbps * 1024 / max(1, settings.workers)
+
+
+async def shape(token: str, rate_kbps: Optional[int], chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+	"""Re-yield `chunks` under the share's own limit and the global egress cap."""
+	bucket = _share_bucket(token, _per_worker(rate_kbps or settings.share_default_rate_kbps))
+	scheduler.configure(_per_worker(settings.share_egress_limit_kbps))
+	meter = _METERS.get(token)
+	if meter is None:
+		meter = _METERS[token] = _Meter()
+	meter.active += 1
+	try:
+		async for chunk in chunks:
+			view = memoryview(chunk)
+			for start in range(0, len(view), SLICE_SIZE):
+				piece = view[start:start + SLICE_SIZE]
+				if bucket is not None:
+					await bucket.consume(len(piece))
+				await scheduler.acquire(token, len(piece))
+				meter.add(len(piece))
+				yield bytes(piece)
+	finally:
+		meter.active -= 1
+
+
+def share_stats(token: str) -> dict:
+	"""Live figures for one share (all zero if it never streamed)."""
+	meter = _METERS.get(token)
+	if meter is None:
+		return {"throughput_bps": 0.0, "active_streams": 0, "bytes_sent": 0}
+	return {"throughput_bps": round(meter.rate(), 1), "active_streams": meter.active, "bytes_sent": meter.total}
+
+
+def forget(token: str) -> None:
+	_BUCKETS.pop(token, None)
+	_METERS.pop(token, None)
+
+
+def tokens() -> Set[str]:
+	"""Share tokens this worker holds a bucket or meter for."""
+	return set(_BUCKETS) | set(_METERS)
+
+
+def forget_idle(candidates: Iterable[str]) -> None:
+	"""forget() each token that is not streaming right now (its stats go with it)."""
+	for token in candidates:
+		meter = _METERS.get(token)
+		if meter is None or not meter.active:
+			forget(token)
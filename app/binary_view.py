@@ -0,0 +1,84 @@
+import os
+from typing import List
+
+# Largest window served by a single request
+MAX_WINDOW = 1024 * 1024
+# Bytes scanned by a single search request; callers continue from next_offset
+MAX_SCAN = 512 * 1024 * 1024
+HEX_ROW = 16
+# Bytes read at a time while searching
+SCAN_CHUNK = 4 * 1024 * 1024
+
+
+def read_window(abs_path: str, offset: int, length: int) -> tuple:
+    """Return (data, file_size) for the byte range [offset, offset + length).
+
+    Only the requested range is read, so memory use does not depend on the
+    size of the file. Plain reads rather than a mapping: a file truncated by
+    another process while mapped raises SIGBUS on POSIX, a short read does not.
+    """
+    length = max(0, min(length, MAX_WINDOW))
+    with open(abs_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = min(offset, size)
+        f.seek(offset)
+        return f.read(length), size
+
+
+def hex_rows(data: bytes, offset: int) -> List[dict]:
+    """Format bytes as classic hex dump rows."""
+    rows = []
+    for i in range(0, len(data), HEX_ROW):
+        chunk = data[i:i + HEX_ROW]
+        rows.append({
+            "offset": offset + i,
+            "hex": chunk.hex(" "),
+            "ascii": "".join(chr(b) if 32 <= b < 127 else "." for b in chunk),
+        })
+    return rows
+
+
+def parse_pattern(pattern: str, mode: str, encoding: str = "utf-8") -> bytes:
+    """Turn a user pattern into bytes. mode is 'hex' ("DE AD be ef") or 'text'."""
+    if mode == "hex":
+        needle = bytes.fromhex("".join(pattern.split()))
+    elif mode == "text":
+        needle = pattern.encode(encoding)
+    else:
+        raise ValueError("mode must be 'hex' or 'text'")
+    if not needle:
+        raise ValueError("Empty pattern")
+    return needle
+
+
+def search(abs_path: str, needle: bytes, start: int = 0, max_results: int = 100,
+           max_scan: int = MAX_SCAN) -> dict:
+    """Find occurrences of `needle` from `start`, scanning at most `max_scan` bytes.
+
+    Returns the match offsets and, when the scan stopped early, `next_offset`
+    to continue from.
+    """
+    matches: List[int] = []
+    with open(abs_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        scan_end = min(size, start + max_scan)
+        # let a match that starts inside the window run past its end
+        find_end = min(size, scan_end + len(needle) - 1)
+        pos = start
+        while pos < scan_end:
+            f.seek(pos)
+            chunk = f.read(min(max(SCAN_CHUNK, 2 * len(needle)), find_end - pos))
+            i = chunk.find(needle)
+            while i != -1 and pos + i < scan_end and len(matches) < max_results:
+                matches.append(pos + i)
+                i = chunk.find(needle, i + 1)
+            if len(matches) >= max_results:
+                pos = matches[-1] + 1 if matches else pos
+                break
+            if pos + len(chunk) >= find_end or len(chunk) < len(needle):
+                # end of the window, or the file was truncated under us
+                pos = scan_end
+                break
+            # overlap the chunks so a match across the boundary is found once
+            pos += len(chunk) - len(needle) + 1
+    return {"matches": matches, "next_offset": pos if pos < size else None, "size": size}
@@ -0,0 +1,178 @@
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+from typing import Any, Callable, List, Optional, Set
+
+from .db import aexecute, aquery_one, execute, query_all, query_one, submit
+
+# State shared by all uvicorn worker processes lives in SQLite (app/data.sqlite3).
+# Exactly one worker holds the "leader" lease and runs the background samplers
+# and sweepers; the others read what it publishes.
+
+LEASE_NAME = "leader"
+# Every worker also renews a "worker:<id>" lease, so others can tell it is alive
+WORKER_LEASE_PREFIX = "worker:"
+LEASE_TTL = 15.0
+RENEW_INTERVAL = 5.0
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+_IS_LEADER = False
+_ON_ELECTED: List[Callable[[], None]] = []
+_STOP = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+_LOCK = threading.Lock()
+
+
+def is_leader() -> bool:
+	return _IS_LEADER
+
+
+def on_elected(callback: Callable[[], None]) -> None:
+	"""Run `callback` in this worker whenever it becomes the leader."""
+	with _LOCK:
+		_ON_ELECTED.append(callback)
+	if _IS_LEADER:
+		callback()
+
+
+def _try_acquire() -> bool:
+	t = time.time()
+	# Take the lease if it is free, expired, or already ours (renewal)
+	count = execute(
+		"""
+		INSERT INTO leases(name, owner, expires_at) VALUES(?,?,?)
+		ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+		WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+		""",
+		(LEASE_NAME, WORKER_ID, t + LEASE_TTL, t),
+	)
+	return count == 1
+
+
+def _heartbeat() -> None:
+	t = time.time()
+	execute(
+		"INSERT INTO leases(name, owner, expires_at) VALUES(?,?,?) "
+		"ON CONFLICT(name) DO UPDATE SET expires_at=excluded.expires_at",
+		(WORKER_LEASE_PREFIX + WORKER_ID, WORKER_ID, t + LEASE_TTL),
+	)
+	submit("DELETE FROM leases WHERE name LIKE ? AND expires_at < ?", (WORKER_LEASE_PREFIX + "%", t))
+
+
+def live_workers() -> Set[str]:
+	"""Ids of the workers whose heartbeat lease has not expired (this one included)."""
+	rows = query_all(
+		"SELECT owner FROM leases WHERE name LIKE ? AND expires_at >= ?", (WORKER_LEASE_PREFIX + "%", time.time())
+	)
+	return {row["owner"] for row in rows} | {WORKER_ID}
+
+
+def _elect_once() -> None:
+	global _IS_LEADER
+	try:
+		_heartbeat()
+	except Exception as e:
+		print(f"Worker heartbeat error: {e}")
+	try:
+		leader = _try_acquire()
+	except Exception as e:
+		print(f"Leader election error: {e}")
+		leader = False
+	was_leader, _IS_LEADER = _IS_LEADER, leader
+	if leader and not was_leader:
+		with _LOCK:
+			callbacks = list(_ON_ELECTED)
+		for callback in callbacks:
+			try:
+				callback()
+			except Exception as e:
+				print(f"Leader callback error: {e}")
+
+
+def _election_loop() -> None:
+	while not _STOP.wait(RENEW_INTERVAL):
+		_elect_once()
+
+
+def start() -> None:
+	"""Join the election; the first worker to start wins right away."""
+	global _THREAD
+	_STOP.clear()
+	_elect_once()
+	if _THREAD is None or not _THREAD.is_alive():
+		_THREAD = threading.Thread(target=_election_loop, name="rfe-leader", daemon=True)
+		_THREAD.start()
+
+
+def stop() -> None:
+	"""Give up the leases so another worker takes over (and recovers our jobs) without waiting for expiry."""
+	global _IS_LEADER
+	_STOP.set()
+	try:
+		execute("DELETE FROM leases WHERE name = ?", (WORKER_LEASE_PREFIX + WORKER_ID,))
+	except Exception:
+		pass
+	if _IS_LEADER:
+		_IS_LEADER = False
+		try:
+			execute("DELETE FROM leases WHERE name = ? AND owner = ?", (LEASE_NAME, WORKER_ID))
+		except Exception:
+			pass
+
+
+def leader_info() -> dict:
+	row = query_one("SELECT owner, expires_at FROM leases WHERE name = ?", (LEASE_NAME,))
+	return {"worker_id": WORKER_ID, "is_leader": _IS_LEADER, "leader": row["owner"] if row else None}
+
+
+# ---------------- Shared key/value state ----------------
+
+def publish(key: str, value: Any) -> None:
+	"""Store a JSON value for other workers; does not wait for the commit."""
+	submit(
+		"INSERT INTO kv_state(key, value, updated_at) VALUES(?,?,?) "
+		"ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at",
+		(key, json.dumps(value), time.time()),
+	)
+
+
+def read(key: str, max_age: Optional[float] = None) -> Any:
+	"""Value published under `key`, or None if missing (or older than max_age seconds)."""
+	row = query_one("SELECT value, updated_at FROM kv_state WHERE key = ?", (key,))
+	if not row:
+		return None
+	if max_age is not None and time.time() - row["updated_at"] > max_age:
+		return None
+	return json.loads(row["value"])
+
+
+async def apublish(key: str, value: Any) -> None:
+	"""publish() for `async def` callers; returns once the value is committed."""
+	await aexecute(
+		"INSERT INTO kv_state(key, value, updated_at) VALUES(?,?,?) "
+		"ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at",
+		(key, json.dumps(value), time.time()),
+	)
+
+
+async def aread(key: str, max_age: Optional[float] = None) -> Any:
+	"""read() for `async def` callers; the query runs off the event loop."""
+	row = await aquery_one("SELECT value, updated_at FROM kv_state WHERE key = ?", (key,))
+	if not row:
+		return None
+	if max_age is not None and time.time() - row["updated_at"] > max_age:
+		return None
+	return json.loads(row["value"])
+
+
+def bump(key: str) -> None:
+	"""Increment an integer counter (used as a cross-worker invalidation signal)."""
+	execute(
+		"INSERT INTO kv_state(key, value, updated_at) VALUES(?, '1', ?) "
+		"ON CONFLICT(key) DO UPDATE SET value=CAST(value AS INTEGER) + 1, updated_at=excluded.updated_at",
+		(key, time.time()),
+	)
@@ -9,6 +9,47 @@ class Settings(BaseSettings):
 	password_hash: str = "$2b$12$BF.eoNGvGNVBReBIexf9DOjciaXk91DKflqBmTefVEUTLur17zmuq"  # bcrypt hash for 'admintest'
 	cors_allow_origins: List[str] = ["http://localhost:5173", "http://127.0.0.1:5173"]
 	log_file: str = "remote_explorer.log"
+	# Logging runs on a background thread behind a bounded queue. log_overflow: "drop" (INFO and
+	# below are dropped while the queue is full) or "block". log_format: "text" or "json".
+	log_format: str = "text"
+	log_queue_size: int = 10000
+	log_overflow: str = "drop"
+	# One access line per request (with request id and duration), except for these high-volume
+	# paths: they are summed up every log_aggregate_interval seconds, plus this share of single lines.
+	access_log: bool = True
+	log_sample_paths: List[str] = ["/api/thumb"]
+	log_sample_rate: float = 0.01
+	log_aggregate_interval: int = 60
+	# In-memory cache for small, frequently polled files (/read, /open, /share/read)
+	hot_cache_max_bytes: int = 64 * 1024 * 1024
+	hot_cache_max_file_size: int = 256 * 1024
+	# Share download shaping (KiB/s, 0 = unlimited). Per-share limits live in shares.rate_limit_kbps.
+	share_default_rate_kbps: int = 0
+	share_egress_limit_kbps: int = 0
+	# Disk budget for cached ZIP downloads (0 disables the cache)
+	zip_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+	# Number of uvicorn worker processes (--workers). Per-process budgets below are split between them.
+	workers: int = 1
+	# Thumbnail processes for the whole server, not per worker
+	thumb_pool_size: int = 2
+	# Automation scheduler: scripts running at once (server-wide) and default timeout in seconds (0 = none).
+	# Per-script limits come from the script header (@Concurrency, @Timeout, @Priority, @Schedule).
+	automation_max_concurrent: int = 2
+	automation_default_timeout: int = 0
+	# Job history retention (0 = no limit), enforced in the background: finished jobs older than
+	# the age or beyond the newest count are deleted; past the byte budget the oldest logs are dropped.
+	automation_log_retention_days: int = 30
+	automation_max_jobs: int = 1000
+	automation_max_log_mb: int = 512
+	# Web console: sessions survive closed tabs and are reaped after this many seconds
+	# without a viewer (0 = never); per-client limit (0 = none) and replayed scrollback.
+	console_idle_timeout: int = 3600
+	console_max_sessions_per_client: int = 4
+	console_scrollback_kb: int = 512
+	# Performance history: 1s/10s/1m samples are kept in memory for 1h/6h/24h; the 1m series
+	# is also stored in SQLite for this many days when metrics_persist is on.
+	metrics_persist: bool = True
+	metrics_retention_days: int = 7
 
 	class Config:
 		env_file = ".env"
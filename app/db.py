@@ -1,83 +1,401 @@
+import asyncio
 import os
+import queue
 import sqlite3
 import threading
-from typing import Iterable, Optional
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "data.sqlite3")
 
-# Persistent connection to avoid open/close overhead on Windows
-_CONN: Optional[sqlite3.Connection] = None
-_LOCK = threading.Lock()
+# Readers: a fixed pool of connections, checked out for the duration of one
+# query (request threads come and go, so they must not own connections).
+# WAL lets them run in parallel with each other and with the writer.
+# Writes: a single writer thread drains a queue and commits whatever is
+# queued together in one transaction (group commit).
+_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA mmap_size=268435456;",  # 256 MB
+    "PRAGMA cache_size=-16000;",  # ~16 MB per connection
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA busy_timeout=5000;",
+)
+# Upper bound on statements folded into one commit
+_MAX_BATCH = 256
 
-def get_conn() -> sqlite3.Connection:
-    global _CONN
-    with _LOCK:
-        if _CONN is None:
-            _CONN = sqlite3.connect(DB_PATH, check_same_thread=False)
-            _CONN.row_factory = sqlite3.Row
-            # WAL mode usually persistent, but setting it here again is fine
-            _CONN.execute("PRAGMA journal_mode=WAL;")
-    return _CONN
+_MAX_READERS = 8
+_IDLE_READERS: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+_READERS: List[sqlite3.Connection] = []  # every open reader, idle or checked out
+_READERS_LOCK = threading.Lock()
 
-def init_db() -> None:
-    # Ensure tables invoke get_conn which creates the connection
-    conn = get_conn()
-    with _LOCK:
+_WRITE_QUEUE: "queue.Queue" = queue.Queue()
+_WRITER: Optional[threading.Thread] = None
+_WRITER_LOCK = threading.Lock()
+_STOP = object()
+
+# Threads serving reads for coroutine endpoints; also bounds their concurrency
+_ASYNC_READERS = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rfe-db-read")
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def _reader():
+    """Borrow a read-only connection from the pool (opened on demand, up to _MAX_READERS)."""
+    try:
+        conn = _IDLE_READERS.get_nowait()
+    except queue.Empty:
+        conn = None
+        with _READERS_LOCK:
+            if len(_READERS) < _MAX_READERS:
+                conn = _connect()
+                conn.execute("PRAGMA query_only=ON;")
+                _READERS.append(conn)
+        if conn is None:
+            conn = _IDLE_READERS.get()
+    try:
+        yield conn
+    finally:
+        with _READERS_LOCK:
+            open_ = any(c is conn for c in _READERS)
+        if open_:
+            _IDLE_READERS.put(conn)
+        else:
+            conn.close()  # close_db ran while it was checked out
+
+
+# ---------------- Metrics ----------------
+
+_METRICS: Dict[str, dict] = {}
+_METRICS_LOCK = threading.Lock()
+_BATCHES = {"batches": 0, "statements": 0, "max_batch": 0}
+
+
+def _record(sql: str, elapsed: float) -> None:
+    key = " ".join(sql.split())
+    with _METRICS_LOCK:
+        m = _METRICS.get(key)
+        if m is None:
+            m = _METRICS[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        ms = elapsed * 1000.0
+        m["count"] += 1
+        m["total_ms"] += ms
+        if ms > m["max_ms"]:
+            m["max_ms"] = ms
+
+
+def stats() -> dict:
+    """Per-statement timings plus writer batching figures."""
+    with _METRICS_LOCK:
+        queries = [
+            {
+                "sql": sql,
+                "count": m["count"],
+                "avg_ms": round(m["total_ms"] / m["count"], 3),
+                "max_ms": round(m["max_ms"], 3),
+                "total_ms": round(m["total_ms"], 3),
+            }
+            for sql, m in _METRICS.items()
+        ]
+        writer = dict(_BATCHES)
+    queries.sort(key=lambda q: q["total_ms"], reverse=True)
+    writer["queue_depth"] = _WRITE_QUEUE.qsize()
+    writer["readers"] = len(_READERS)
+    return {"queries": queries, "writer": writer}
+
+
+# ---------------- Writer ----------------
+
+def _writer_loop(conn: sqlite3.Connection) -> None:
+    while True:
+        item = _WRITE_QUEUE.get()
+        if item is _STOP:
+            break
+        batch = [item]
+        stop = False
+        while len(batch) < _MAX_BATCH:
+            try:
+                nxt = _WRITE_QUEUE.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _STOP:
+                stop = True
+                break
+            batch.append(nxt)
+        _commit_batch(conn, batch)
+        if stop:
+            break
+    conn.close()
+
+
+def _commit_batch(conn: sqlite3.Connection, batch: list) -> None:
+    results = []
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+        for sql, params, fut in batch:
+            # A savepoint per statement: one failing write does not undo the others
+            conn.execute("SAVEPOINT w;")
+            start = time.perf_counter()
+            try:
+                cur = conn.execute(sql, params)
+                results.append((fut, cur.rowcount, None))
+                conn.execute("RELEASE w;")
+            except Exception as e:
+                conn.execute("ROLLBACK TO w;")
+                conn.execute("RELEASE w;")
+                results.append((fut, None, e))
+            _record(sql, time.perf_counter() - start)
+        conn.execute("COMMIT;")
+    except Exception as e:
         try:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS pins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    path TEXT NOT NULL UNIQUE,
-                    created_at INTEGER NOT NULL
-                );
-                """
-            )
+            conn.execute("ROLLBACK;")
+        except Exception:
+            pass
+        results = [(fut, None, e) for _, _, fut in batch]
+    with _METRICS_LOCK:
+        _BATCHES["batches"] += 1
+        _BATCHES["statements"] += len(batch)
+        _BATCHES["max_batch"] = max(_BATCHES["max_batch"], len(batch))
+    for fut, rowcount, err in results:
+        if err is not None:
+            fut.set_exception(err)
+        else:
+            fut.set_result(rowcount)
+
+
+def _ensure_writer() -> None:
+    global _WRITER
+    if _WRITER is not None and _WRITER.is_alive():
+        return
+    with _WRITER_LOCK:
+        if _WRITER is None or not _WRITER.is_alive():
+            conn = _connect()
+            conn.execute("PRAGMA journal_mode=WAL;")
+            _WRITER = threading.Thread(target=_writer_loop, args=(conn,), name="rfe-db-writer", daemon=True)
+            _WRITER.start()
+
+
+def submit(sql: str, params: Iterable = ()) -> Future:
+    """Queue a write; the returned future resolves to the row count once committed."""
+    _ensure_writer()
+    fut: Future = Future()
+    _WRITE_QUEUE.put((sql, tuple(params), fut))
+    return fut
+
+
+# ---------------- Public API ----------------
+
+def _ensure_column(cur: sqlite3.Cursor, table: str, column: str, decl: str) -> None:
+    """Add a column to a table created by an older version of the app."""
+    cols = [r[1] for r in cur.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def init_db() -> None:
+    conn = _connect()
+    try:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                created_at INTEGER NOT NULL
+            );
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shares (
+                token TEXT PRIMARY KEY,
+                root TEXT NOT NULL,
+                readonly INTEGER NOT NULL,
+                allow_download INTEGER NOT NULL,
+                allow_edit INTEGER NOT NULL,
+                expires_at REAL
+            );
+            """
+        )
+        _ensure_column(cur, "shares", "rate_limit_kbps", "INTEGER")
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_shares_expires_at ON shares(expires_at) WHERE expires_at IS NOT NULL;"
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                script TEXT NOT NULL,
+                status TEXT NOT NULL,
+                start_time TEXT NOT NULL,
+                end_time TEXT,
+                exit_code INTEGER,
+                log TEXT
+            );
+            """
+        )
+        # Scheduler state (see job_scheduler.py)
+        _ensure_column(cur, "jobs", "priority", "INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(cur, "jobs", "queued_at", "TEXT")
+        _ensure_column(cur, "jobs", "trigger", "TEXT")
+        _ensure_column(cur, "jobs", "timeout_s", "INTEGER")
+        _ensure_column(cur, "jobs", "cancel_requested", "INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(cur, "jobs", "owner", "TEXT")
+        # Resource usage of the job's process tree (see job_usage.py)
+        for column, kind in (
+            ("wall_s", "REAL"), ("queue_s", "REAL"), ("cpu_user_s", "REAL"), ("cpu_system_s", "REAL"),
+            ("peak_rss", "INTEGER"), ("read_bytes", "INTEGER"), ("write_bytes", "INTEGER"),
+        ):
+            _ensure_column(cur, "jobs", column, kind)
+        # Job output, chunked (see job_logs.py); jobs.log is only read to migrate old rows
+        _ensure_column(cur, "jobs", "log_chars", "INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(cur, "jobs", "log_bytes", "INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(cur, "jobs", "log_pruned", "INTEGER NOT NULL DEFAULT 0")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job_log_chunks (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                start INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                compressed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, seq)
+            ) WITHOUT ROWID;
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_start_time ON jobs(start_time);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_script_start ON jobs(script, start_time);")
+        if cur.execute("SELECT 1 FROM jobs WHERE log IS NOT NULL LIMIT 1").fetchone():
+            cur.execute("BEGIN;")
             cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS shares (
-                    token TEXT PRIMARY KEY,
-                    root TEXT NOT NULL,
-                    readonly INTEGER NOT NULL,
-                    allow_download INTEGER NOT NULL,
-                    allow_edit INTEGER NOT NULL,
-                    expires_at REAL
-                );
-                """
+                "INSERT OR IGNORE INTO job_log_chunks(job_id, seq, start, length, data, compressed) "
+                "SELECT id, 0, 0, length(log), CAST(log AS BLOB), 0 FROM jobs WHERE log IS NOT NULL AND log != ''"
             )
             cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS jobs (
-                    id TEXT PRIMARY KEY,
-                    script TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    start_time TEXT NOT NULL,
-                    end_time TEXT,
-                    exit_code INTEGER,
-                    log TEXT
-                );
-                """
+                "UPDATE jobs SET log_chars = length(log), log_bytes = length(CAST(log AS BLOB)), log = NULL "
+                "WHERE log IS NOT NULL"
             )
-            conn.commit()
-        except Exception as e:
-            print(f"DB Init Error: {e}")
+            cur.execute("COMMIT;")
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(priority DESC, queued_at) WHERE status = 'queued';"
+        )
+        # Cross-worker state (see cluster.py): undo tokens, small published
+        # values and the leader lease
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS undo (
+                token TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS kv_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS metrics_history (
+                ts INTEGER PRIMARY KEY,
+                cpu REAL NOT NULL,
+                mem REAL NOT NULL,
+                disk REAL NOT NULL,
+                net_sent REAL NOT NULL,
+                net_recv REAL NOT NULL
+            );
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            """
+        )
+    except Exception as e:
+        print(f"DB Init Error: {e}")
+    finally:
+        conn.close()
+    _ensure_writer()
+
+
+def close_db() -> None:
+    """Flush queued writes, stop the writer and close reader connections."""
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is not None and _WRITER.is_alive():
+            _WRITE_QUEUE.put(_STOP)
+            _WRITER.join(timeout=10)
+        _WRITER = None
+    # Idle readers are closed now; ones checked out are closed when returned
+    with _READERS_LOCK:
+        _READERS.clear()
+        while True:
+            try:
+                conn = _IDLE_READERS.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+
 
 def query_all(sql: str, params: Iterable = ()):
-    conn = get_conn()
-    with _LOCK:
-        cur = conn.execute(sql, params)
-        return [dict(row) for row in cur.fetchall()]
+    start = time.perf_counter()
+    with _reader() as conn:
+        rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+    _record(sql, time.perf_counter() - start)
+    return rows
+
+
+def execute(sql: str, params: Iterable = ()) -> int:
+    """Run a write through the writer thread and wait for its commit.
+
+    Returns the number of affected rows.
+    """
+    return submit(sql, params).result()
 
-def execute(sql: str, params: Iterable = ()) -> None:
-    conn = get_conn()
-    with _LOCK:
-        conn.execute(sql, params)
-        conn.commit()
 
 def query_one(sql: str, params: Iterable = ()) -> Optional[dict]:
-    conn = get_conn()
-    with _LOCK:
-        cur = conn.execute(sql, params)
-        row = cur.fetchone()
-        return dict(row) if row else None
+    start = time.perf_counter()
+    with _reader() as conn:
+        row = conn.execute(sql, params).fetchone()
+    _record(sql, time.perf_counter() - start)
+    return dict(row) if row else None
+
+
+# ---------------- Async API (for `async def` endpoints) ----------------
+# Never call the sync helpers above from a coroutine: they block the event loop.
+
+async def aquery_all(sql: str, params: Iterable = ()):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ASYNC_READERS, query_all, sql, params)
+
+
+async def aquery_one(sql: str, params: Iterable = ()) -> Optional[dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ASYNC_READERS, query_one, sql, params)
+
+
+async def aexecute(sql: str, params: Iterable = ()) -> int:
+    """Queue a write and await its commit without occupying any thread."""
+    return await asyncio.wrap_future(submit(sql, params))
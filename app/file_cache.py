@@ -0,0 +1,103 @@
+import os
+import stat as _stat
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from .config import settings
+from .text_window import content_etag
+
+
+class CachedFile(NamedTuple):
+    data: bytes
+    etag: str
+    mtime: float
+
+
+class _Entry(NamedTuple):
+    key: tuple  # (size, mtime_ns, inode)
+    file: CachedFile
+
+
+def _stat_key(st: os.stat_result) -> tuple:
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class HotFileCache:
+    """LRU cache of small file contents bounded by total bytes.
+
+    An entry stays valid while the file's (size, mtime, inode) are unchanged,
+    so a hit costs one stat() and no open/read.
+    """
+
+    def __init__(self, max_bytes: int, max_file_size: int):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, abs_path: str) -> Optional[CachedFile]:
+        """Return the file's content, or None if it is too large to cache.
+
+        Raises FileNotFoundError if the path is missing or not a regular file.
+        """
+        st = os.stat(abs_path)
+        if not _stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(abs_path)
+        if st.st_size > self.max_file_size:
+            return None
+        key = _stat_key(st)
+        with self._lock:
+            entry = self._entries.get(abs_path)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(abs_path)
+                self.hits += 1
+                return entry.file
+            self.misses += 1
+        with open(abs_path, "rb") as f:
+            data = f.read(self.max_file_size + 1)
+            st = os.fstat(f.fileno())
+        cached = CachedFile(data, content_etag(st, data), st.st_mtime)
+        if len(data) != st.st_size or len(data) > self.max_file_size:
+            # changed while reading or grew past the limit; serve once, don't cache
+            return cached if len(data) <= self.max_file_size else None
+        self._put(abs_path, _Entry(_stat_key(st), cached))
+        return cached
+
+    def _put(self, abs_path: str, entry: _Entry) -> None:
+        with self._lock:
+            old = self._entries.pop(abs_path, None)
+            if old is not None:
+                self._bytes -= len(old.file.data)
+            self._entries[abs_path] = entry
+            self._bytes += len(entry.file.data)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.file.data)
+                self.evictions += 1
+
+    def invalidate(self, abs_path: str) -> None:
+        with self._lock:
+            old = self._entries.pop(abs_path, None)
+            if old is not None:
+                self._bytes -= len(old.file.data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+hot_files = HotFileCache(settings.hot_cache_max_bytes, settings.hot_cache_max_file_size)
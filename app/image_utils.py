@@ -1,19 +1,34 @@
 import os
-from concurrent.futures import ProcessPoolExecutor
-import multiprocessing
+import threading
 
-# Global executor
-process_pool: ProcessPoolExecutor = None
+# Global executor, started by get_pool() on the first thumbnail request
+process_pool = None
+_POOL_LOCK = threading.Lock()
 
 def init_pool():
     global process_pool
-    # Limit to exactly 2 workers to save RAM as requested
-    process_pool = ProcessPoolExecutor(max_workers=2)
+    from concurrent.futures import ProcessPoolExecutor
+    from .config import settings
+    # thumb_pool_size (2 by default, to save RAM) is shared by all uvicorn workers
+    process_pool = ProcessPoolExecutor(max_workers=max(1, settings.thumb_pool_size // max(1, settings.workers)))
+
+def get_pool():
+    """Return the pool, starting it on first use; None if it cannot be started."""
+    if process_pool is None:
+        with _POOL_LOCK:
+            if process_pool is None:
+                try:
+                    init_pool()
+                except Exception as e:
+                    print(f"Thumbnail pool error: {e}")
+                    return None
+    return process_pool
 
 def shutdown_pool():
     global process_pool
     if process_pool:
         process_pool.shutdown(wait=True)
+        process_pool = None
 
 def cpu_bound_generate_thumb(input_path: str, output_path: str) -> bool:
     """
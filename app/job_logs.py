@@ -0,0 +1,124 @@
+import asyncio
+import datetime
+import zlib
+from typing import List
+
+from .config import settings
+from .db import aexecute, aquery_all, aquery_one, query_all, submit
+
+# Job output lives in job_log_chunks, one row per flush, addressed by
+# character offsets like the live JobStream. Chunks of at least
+# COMPRESS_MIN bytes are stored zlib-compressed when that saves space.
+COMPRESS_MIN = 1024
+COMPRESS_LEVEL = 6
+# Largest range returned by one read
+MAX_READ_CHARS = 1024 * 1024
+
+
+def _encode(text: str):
+    raw = text.encode("utf-8")
+    if len(raw) >= COMPRESS_MIN:
+        packed = zlib.compress(raw, COMPRESS_LEVEL)
+        if len(packed) < len(raw):
+            return packed, 1
+    return raw, 0
+
+
+def _decode(row: dict) -> str:
+    data = row["data"]
+    if row["compressed"]:
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8", errors="replace")
+
+
+async def append(job_id: str, text: str) -> None:
+    """Append output to a job's log (callers serialize appends per job)."""
+    if not text:
+        return
+    data, compressed = _encode(text)
+    # Both statements go through the single writer in order, so the chunk's
+    # start offset is the total before this append
+    inserted = submit(
+        "INSERT INTO job_log_chunks(job_id, seq, start, length, data, compressed) "
+        "SELECT id, COALESCE((SELECT MAX(seq) + 1 FROM job_log_chunks WHERE job_id = ?), 0), log_chars, ?, ?, ? "
+        "FROM jobs WHERE id = ?",
+        (job_id, len(text), data, compressed, job_id),
+    )
+    await aexecute(
+        "UPDATE jobs SET log_chars = log_chars + ?, log_bytes = log_bytes + ? WHERE id = ?",
+        (len(text), len(data), job_id),
+    )
+    await asyncio.wrap_future(inserted)
+
+
+_RANGE_SQL = (
+    "SELECT start, data, compressed FROM job_log_chunks "
+    "WHERE job_id = ? AND start < ? AND start + length > ? ORDER BY seq"
+)
+
+
+def _slice(rows: List[dict], offset: int, limit: int) -> str:
+    parts = []
+    for row in rows:
+        text = _decode(row)
+        parts.append(text[max(0, offset - row["start"]):max(0, offset + limit - row["start"])])
+    return "".join(parts)
+
+
+def read_range(job_id: str, offset: int = 0, limit: int = MAX_READ_CHARS) -> str:
+    """Up to `limit` characters of the log starting at character `offset`."""
+    offset, limit = max(0, offset), max(0, min(limit, MAX_READ_CHARS))
+    return _slice(query_all(_RANGE_SQL, (job_id, offset + limit, offset)), offset, limit)
+
+
+async def aread_range(job_id: str, offset: int = 0, limit: int = MAX_READ_CHARS) -> str:
+    offset, limit = max(0, offset), max(0, min(limit, MAX_READ_CHARS))
+    return _slice(await aquery_all(_RANGE_SQL, (job_id, offset + limit, offset)), offset, limit)
+
+
+async def delete(job_ids: List[str]) -> int:
+    """Remove jobs and their logs; returns the number of jobs removed."""
+    removed = 0
+    for job_id in job_ids:
+        submit("DELETE FROM job_log_chunks WHERE job_id = ?", (job_id,))
+        removed += await aexecute("DELETE FROM jobs WHERE id = ?", (job_id,))
+    return removed
+
+
+async def enforce_retention() -> dict:
+    """Apply the automation_log_* limits to finished jobs (run by the leader).
+
+    Jobs older than the age limit, and beyond the newest count limit, are
+    deleted with their logs. If the remaining logs still exceed the byte
+    budget, the oldest logs are dropped but their job summaries are kept.
+    """
+    finished = "status NOT IN ('queued', 'running')"
+    expired: List[str] = []
+    if settings.automation_log_retention_days > 0:
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=settings.automation_log_retention_days)).isoformat()
+        expired += [r["id"] for r in await aquery_all(
+            f"SELECT id FROM jobs WHERE {finished} AND start_time < ?", (cutoff,)
+        )]
+    if settings.automation_max_jobs > 0:
+        expired += [r["id"] for r in await aquery_all(
+            f"SELECT id FROM jobs WHERE {finished} ORDER BY start_time DESC LIMIT -1 OFFSET ?",
+            (settings.automation_max_jobs,)
+        )]
+    deleted = await delete(list(dict.fromkeys(expired)))
+
+    dropped = 0
+    budget = settings.automation_max_log_mb * 1024 * 1024
+    total = await aquery_one(f"SELECT COALESCE(SUM(log_bytes), 0) AS n FROM jobs WHERE {finished}")
+    if budget > 0 and total["n"] > budget:
+        excess = total["n"] - budget
+        rows = await aquery_all(
+            f"SELECT id, log_bytes FROM jobs WHERE {finished} AND log_bytes > 0 ORDER BY start_time ASC"
+        )
+        for row in rows:
+            if excess <= 0:
+                break
+            submit("DELETE FROM job_log_chunks WHERE job_id = ?", (row["id"],))
+            await aexecute("UPDATE jobs SET log_bytes = 0, log_pruned = 1 WHERE id = ?", (row["id"],))
+            excess -= row["log_bytes"]
+            dropped += 1
+    return {"deleted_jobs": deleted, "dropped_logs": dropped}
@@ -0,0 +1,169 @@
+import asyncio
+import codecs
+import io
+import locale
+import subprocess
+import time
+import traceback
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from . import job_logs
+
+# Output is appended to the stored job log at most this often, or sooner once this much is pending
+FLUSH_INTERVAL = 1.0
+FLUSH_CHARS = 64 * 1024
+# Recent output kept in memory for viewers that attach while the job runs
+SCROLLBACK_CHARS = 256 * 1024
+READ_SIZE = 64 * 1024
+
+
+class JobStream:
+    """Output of one running job.
+
+    Text is addressed by absolute character offsets; the scrollback keeps the
+    last SCROLLBACK_CHARS of it. Viewers follow from an offset and simply skip
+    ahead if they fall behind the scrollback, so a slow viewer never holds
+    memory. The producer waits for database flushes, which in turn throttles
+    the child through its stdout pipe.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.chunks: Deque[Tuple[int, str]] = deque()  # (start offset, text)
+        self.start = 0  # offset of the oldest character still in memory
+        self.end = 0  # total characters produced
+        self.done = False
+        self.status: Optional[str] = None
+        self.exit_code: Optional[int] = None
+        self.proc: Optional[subprocess.Popen] = None
+        self._pending: List[str] = []
+        self._pending_len = 0
+        self._last_flush = time.monotonic()
+        self._flush_lock = asyncio.Lock()
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def write(self, text: str) -> None:
+        self.chunks.append((self.end, text))
+        self.end += len(text)
+        # Drop chunks that ended more than SCROLLBACK_CHARS ago (the newest always stays)
+        while self.end - (self.chunks[0][0] + len(self.chunks[0][1])) > SCROLLBACK_CHARS:
+            self.chunks.popleft()
+        self.start = self.chunks[0][0]
+        self._pending.append(text)
+        self._pending_len += len(text)
+        self._notify()
+        if self._pending_len >= FLUSH_CHARS or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            data = "".join(self._pending)
+            self._pending.clear()
+            self._pending_len = 0
+            # Append-only, so viewers reading the stored log can follow by offset
+            await job_logs.append(self.job_id, data)
+
+    async def _flush_periodically(self) -> None:
+        # Quiet scripts still get their last lines persisted within FLUSH_INTERVAL
+        while not self.done:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            if self._pending and time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                await self.flush()
+
+    def read_from(self, offset: int) -> Tuple[int, str]:
+        """(skipped characters, text) available from `offset` onwards."""
+        skipped = max(0, self.start - offset)
+        offset = max(offset, self.start)
+        parts = []
+        for chunk_start, text in self.chunks:
+            chunk_end = chunk_start + len(text)
+            if chunk_end <= offset:
+                continue
+            parts.append(text[max(0, offset - chunk_start):])
+        return skipped, "".join(parts)
+
+    async def follow(self, offset: int = 0) -> AsyncIterator[dict]:
+        """Messages for one viewer: output (and gaps) until the job ends."""
+        while True:
+            changed = self._changed
+            if offset < self.end:
+                skipped, text = self.read_from(offset)
+                if skipped:
+                    yield {"type": "truncated", "chars": skipped}
+                offset = self.end
+                yield {"type": "output", "data": text}
+                continue
+            if self.done:
+                yield {"type": "end", "status": self.status, "exit_code": self.exit_code}
+                return
+            await changed.wait()
+
+
+_STREAMS: Dict[str, JobStream] = {}
+
+
+def get_stream(job_id: str) -> Optional[JobStream]:
+    return _STREAMS.get(job_id)
+
+
+def _pump(proc: subprocess.Popen, stream: JobStream, loop: asyncio.AbstractEventLoop) -> int:
+    """Reader thread: decode stdout as it arrives and hand it to the loop."""
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace"), translate=True
+    )
+    while True:
+        data = proc.stdout.read1(READ_SIZE)
+        text = decoder.decode(data, final=not data)
+        if text:
+            # Blocks until the loop took it (and flushed if needed): backpressure
+            asyncio.run_coroutine_threadsafe(stream.write(text), loop).result()
+        if not data:
+            break
+    proc.stdout.close()
+    return proc.wait()
+
+
+async def run(
+    job_id: str, cmd: List[str], on_start: Optional[Callable[[JobStream], None]] = None
+) -> Tuple[str, int, JobStream]:
+    """Run `cmd`, streaming its combined stdout/stderr. Returns (status, exit_code, stream).
+
+    on_start receives the stream as soon as it exists (stream.proc is set once spawned).
+    """
+    stream = JobStream(job_id)
+    _STREAMS[job_id] = stream
+    if on_start is not None:
+        on_start(stream)
+    loop = asyncio.get_running_loop()
+    flusher = loop.create_task(stream._flush_periodically())
+    try:
+        # A thread reads the pipe: asyncio subprocesses are unavailable on the
+        # selector loop uvicorn uses on Windows with --reload/--workers
+        proc = stream.proc = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+        exit_code = await loop.run_in_executor(None, _pump, proc, stream, loop)
+        status = "success" if exit_code == 0 else "failed"
+    except Exception as e:
+        await stream.write(f"Internal Error: {str(e)}\nTraceback:\n{traceback.format_exc()}")
+        exit_code, status = -1, "failed"
+    finally:
+        flusher.cancel()
+    await stream.flush()
+    stream.status, stream.exit_code = status, exit_code
+    return status, exit_code, stream
+
+
+def finish(stream: JobStream) -> None:
+    """Wake viewers with the final status and forget the stream (call after the job row is final)."""
+    stream.done = True
+    stream._notify()
+    _STREAMS.pop(stream.job_id, None)
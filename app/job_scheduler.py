@@ -0,0 +1,399 @@
+import asyncio
+import datetime
+import os
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+from . import cluster
+from . import job_logs
+from . import job_runner
+from . import job_usage
+from .config import settings
+from .db import aexecute, aquery_all
+from .startup import lazy_module
+
+psutil = lazy_module("psutil")
+
+# Created on first listing rather than at import time
+SCRIPTS_DIR = os.path.join(os.getcwd(), "server_scripts")
+SCRIPT_EXTENSIONS = ('.bat', '.ps1', '.py', '.cmd')
+TICK_INTERVAL = 1.0
+# How often the leader applies the job history retention limits
+RETENTION_INTERVAL = 600.0
+# How often the leader looks for jobs left running by workers that died
+RECOVER_INTERVAL = cluster.RENEW_INTERVAL
+
+# Job states; queued and running are "active"
+ACTIVE_STATES = ("queued", "running")
+
+
+def build_command(filename: str) -> List[str]:
+    script_path = os.path.join(SCRIPTS_DIR, filename)
+    cmd = []
+    if filename.endswith(".ps1"):
+        cmd = ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-File", script_path]
+    elif filename.endswith(".py"):
+        cmd = [sys.executable, script_path]
+    elif filename.endswith((".bat", ".cmd")):
+        cmd = ["cmd", "/c", script_path]
+    return cmd
+
+
+def read_headers(path: str) -> Dict[str, str]:
+    """`@Key: value` comments from the first 10 lines of a script (keys lower-cased)."""
+    headers = {}
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for _ in range(10):
+                line = f.readline()
+                if not line:
+                    break
+                line = line.strip()
+                at = line.find("@")
+                if at == -1 or ":" not in line[at:]:
+                    continue
+                key, value = line[at + 1:].split(":", 1)
+                if key.strip().isalpha():
+                    headers[key.strip().lower()] = value.strip()
+    except OSError:
+        pass
+    return headers
+
+
+def _int_header(headers: Dict[str, str], key: str, default: int) -> int:
+    try:
+        return int(headers.get(key, default))
+    except ValueError:
+        return default
+
+
+def script_options(filename: str) -> dict:
+    """Scheduling options from the script header.
+
+    @Schedule: cron expression (minute hour day-of-month month day-of-week)
+    @Concurrency: max simultaneous runs of this script (default 1)
+    @Timeout: seconds before the run is killed (default automation_default_timeout)
+    @Priority: default queue priority, higher runs first (default 0)
+    """
+    headers = read_headers(os.path.join(SCRIPTS_DIR, filename))
+    return {
+        "schedule": headers.get("schedule") or None,
+        "concurrency": max(1, _int_header(headers, "concurrency", 1)),
+        "timeout": max(0, _int_header(headers, "timeout", settings.automation_default_timeout)),
+        "priority": _int_header(headers, "priority", 0),
+    }
+
+
+async def ascript_options(filename: str) -> dict:
+    """script_options() for the event loop: the header is read on an executor thread."""
+    return await asyncio.get_running_loop().run_in_executor(None, script_options, filename)
+
+
+def _script_names() -> List[str]:
+    return [f for f in os.listdir(SCRIPTS_DIR) if f.lower().endswith(SCRIPT_EXTENSIONS)]
+
+
+# ---------------- Cron ----------------
+
+def _cron_field(spec: str, lo: int, hi: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in spec.split(","):
+        rng, _, step = part.partition("/")
+        step_n = int(step) if step else 1
+        if step_n < 1:
+            raise ValueError(f"bad step in {spec!r}")
+        if rng == "*":
+            start, end = lo, hi
+        elif "-" in rng:
+            a, b = rng.split("-", 1)
+            start, end = int(a), int(b)
+        else:
+            start = int(rng)
+            end = hi if step else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"{spec!r} out of range {lo}-{hi}")
+        values.update(range(start, end + 1, step_n))
+    return values
+
+
+def cron_matches(expr: str, when: datetime.datetime) -> bool:
+    """Standard 5-field cron; Sunday is 0 or 7. Raises ValueError if malformed."""
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"expected 5 fields in {expr!r}")
+    minute, hour, dom, month, dow = fields
+    if when.minute not in _cron_field(minute, 0, 59) or when.hour not in _cron_field(hour, 0, 23):
+        return False
+    if when.month not in _cron_field(month, 1, 12):
+        return False
+    dows = {d % 7 for d in _cron_field(dow, 0, 7)}
+    dom_ok = when.day in _cron_field(dom, 1, 31)
+    dow_ok = (when.isoweekday() % 7) in dows
+    # Like cron: when both day fields are restricted, either may match
+    if dom != "*" and dow != "*":
+        return dom_ok or dow_ok
+    return dom_ok and dow_ok
+
+
+# ---------------- Scheduler ----------------
+
+def _seconds_since(iso: Optional[str], now: datetime.datetime) -> Optional[float]:
+    try:
+        return round(max(0.0, (now - datetime.datetime.fromisoformat(iso)).total_seconds()), 3)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Running:
+    def __init__(self, script: str, timeout: int, queue_s: Optional[float]):
+        self.script = script
+        self.started = time.monotonic()
+        self.timeout = timeout
+        self.queue_s = queue_s
+        self.usage = job_usage.TreeUsage()
+        self.stream: Optional[job_runner.JobStream] = None
+        self.killed_as: Optional[str] = None  # "cancelled" / "timeout"
+
+
+def kill_tree(pid: int) -> None:
+    """Kill a process and all of its descendants."""
+    try:
+        parent = psutil.Process(pid)
+        procs = parent.children(recursive=True) + [parent]
+    except psutil.NoSuchProcess:
+        return
+    for p in procs:
+        try:
+            p.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+
+class JobScheduler:
+    """Runs queued automation jobs under global and per-script limits.
+
+    The queue is the `jobs` table itself (status='queued'), so it survives
+    restarts and is shared by all workers. Only the leader worker dispatches;
+    any worker may enqueue or request cancellation. Every worker enforces
+    timeouts and cancellation for the jobs it runs itself, leader or not.
+    """
+
+    def __init__(self):
+        self._running: Dict[str, _Running] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_recover = float("-inf")
+        self._last_cron_minute: Optional[str] = None
+        self._last_retention = float("-inf")
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for job_id, run in list(self._running.items()):
+            run.killed_as = "cancelled"
+            self._kill(run)
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def enqueue(self, filename: str, priority: Optional[int] = None, trigger: str = "manual") -> str:
+        options = await ascript_options(filename)
+        job_id = str(uuid.uuid4())
+        now = datetime.datetime.now().isoformat()
+        await aexecute(
+            "INSERT INTO jobs(id, script, status, start_time, queued_at, priority, trigger, timeout_s) "
+            "VALUES(?,?,?,?,?,?,?,?)",
+            (job_id, filename, "queued", now, now,
+             options["priority"] if priority is None else priority, trigger, options["timeout"])
+        )
+        await job_logs.append(job_id, "Job queued...\n")
+        self.wake()
+        return job_id
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job now; flag a running one for the worker that runs it."""
+        if await aexecute("UPDATE jobs SET status='cancelled', end_time=? WHERE id=? AND status='queued'",
+                          (datetime.datetime.now().isoformat(), job_id)):
+            return True
+        if await aexecute("UPDATE jobs SET cancel_requested=1 WHERE id=? AND status='running'", (job_id,)):
+            self.wake()
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "leader": cluster.is_leader(),
+            "max_concurrent": settings.automation_max_concurrent,
+            "running_here": [{"id": job_id, "script": r.script} for job_id, r in self._running.items()],
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # Jobs started while this worker was leader keep their limits after it loses the lease
+                await self._enforce_limits()
+                if cluster.is_leader():
+                    await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job scheduler error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), TICK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _tick(self) -> None:
+        if time.monotonic() - self._last_recover >= RECOVER_INTERVAL:
+            self._last_recover = time.monotonic()
+            await self._recover()
+        await self._fire_cron()
+        await self._dispatch()
+        if time.monotonic() - self._last_retention >= RETENTION_INTERVAL:
+            self._last_retention = time.monotonic()
+            await job_logs.enforce_retention()
+
+    async def _recover(self) -> None:
+        # A job can only be finished by the worker running it: once that worker's
+        # heartbeat lease has expired (it exited or crashed), the job never will be
+        running = await aquery_all("SELECT id, owner FROM jobs WHERE status='running'")
+        if not running:
+            return
+        alive = await asyncio.get_running_loop().run_in_executor(None, cluster.live_workers)
+        for row in running:
+            if row["owner"] in alive:
+                continue
+            if await aexecute(
+                "UPDATE jobs SET status='failed', end_time=? WHERE id=? AND status='running' AND owner IS ?",
+                (datetime.datetime.now().isoformat(), row["id"], row["owner"])
+            ):
+                await job_logs.append(row["id"], "\n[Interrupted: server restarted]\n")
+
+    async def _fire_cron(self) -> None:
+        now = datetime.datetime.now().replace(second=0, microsecond=0)
+        minute = now.isoformat()
+        if minute == self._last_cron_minute:
+            return
+        self._last_cron_minute = minute
+        try:
+            names = await asyncio.get_running_loop().run_in_executor(None, _script_names)
+        except OSError:
+            return
+        for filename in names:
+            expr = (await ascript_options(filename))["schedule"]
+            if not expr:
+                continue
+            try:
+                due = cron_matches(expr, now)
+            except ValueError as e:
+                print(f"Bad @Schedule in {filename}: {e}")
+                continue
+            # kv_state remembers the minute, so a new leader does not fire it twice
+            key = f"automation.cron.{filename}"
+            if due and await cluster.aread(key) != minute:
+                await cluster.apublish(key, minute)
+                await self.enqueue(filename, trigger="schedule")
+
+    async def _enforce_limits(self) -> None:
+        if not self._running:
+            return
+        flagged = await aquery_all(
+            "SELECT id FROM jobs WHERE cancel_requested=1 AND status='running' AND owner=?", (cluster.WORKER_ID,)
+        )
+        for row in flagged:
+            run = self._running.get(row["id"])
+            if run is not None and run.killed_as is None:
+                run.killed_as = "cancelled"
+                self._kill(run)
+        now = time.monotonic()
+        for run in self._running.values():
+            if run.timeout and run.killed_as is None and now - run.started > run.timeout:
+                run.killed_as = "timeout"
+                self._kill(run)
+
+    def _kill(self, run: _Running) -> None:
+        proc = run.stream.proc if run.stream is not None else None
+        if proc is not None and proc.poll() is None:
+            kill_tree(proc.pid)
+
+    async def _dispatch(self) -> None:
+        # Count running jobs in the table, not in self._running: jobs started by a
+        # previous leader keep running on that worker and still use up the limits
+        running = await aquery_all("SELECT script, COUNT(*) AS n FROM jobs WHERE status='running' GROUP BY script")
+        per_script: Dict[str, int] = {row["script"]: row["n"] for row in running}
+        free = settings.automation_max_concurrent - sum(per_script.values())
+        if free <= 0:
+            return
+        queued = await aquery_all(
+            "SELECT id, script, timeout_s, queued_at FROM jobs WHERE status='queued' ORDER BY priority DESC, queued_at ASC LIMIT 200"
+        )
+        limits: Dict[str, int] = {}
+        for row in queued:
+            if free <= 0:
+                break
+            script = row["script"]
+            if script not in limits:
+                limits[script] = (await ascript_options(script))["concurrency"]
+            # A script at its limit does not hold up jobs of other scripts
+            if per_script.get(script, 0) >= limits[script]:
+                continue
+            now = datetime.datetime.now()
+            claimed = await aexecute(
+                "UPDATE jobs SET status='running', start_time=?, owner=? WHERE id=? AND status='queued'",
+                (now.isoformat(), cluster.WORKER_ID, row["id"])
+            )
+            if not claimed:
+                continue
+            run = _Running(script, row["timeout_s"] or 0, _seconds_since(row["queued_at"], now))
+            self._running[row["id"]] = run
+            per_script[script] = per_script.get(script, 0) + 1
+            free -= 1
+            asyncio.get_running_loop().create_task(self._execute(row["id"], run))
+
+    async def _execute(self, job_id: str, run: _Running) -> None:
+        exited = asyncio.Event()
+        tracker = asyncio.get_running_loop().create_task(
+            job_usage.track(run.usage, lambda: run.stream.proc if run.stream is not None else None, exited)
+        )
+        try:
+            cmd = build_command(run.script)
+            try:
+                status, exit_code, stream = await job_runner.run(
+                    job_id, cmd, on_start=lambda s: setattr(run, "stream", s)
+                )
+            finally:
+                exited.set()
+                await tracker
+            if run.killed_as is not None:
+                status = run.killed_as
+                await stream.write(f"\n[{'Cancelled' if status == 'cancelled' else 'Timed out'}]\n")
+                await stream.flush()
+            usage = run.usage.totals()
+            try:
+                await aexecute(
+                    "UPDATE jobs SET status=?, end_time=?, exit_code=?, wall_s=?, queue_s=?, cpu_user_s=?, "
+                    "cpu_system_s=?, peak_rss=?, read_bytes=?, write_bytes=? WHERE id=?",
+                    (status, datetime.datetime.now().isoformat(), exit_code,
+                     round(time.monotonic() - run.started, 3), run.queue_s, usage["cpu_user_s"],
+                     usage["cpu_system_s"], usage["peak_rss"], usage["read_bytes"], usage["write_bytes"], job_id)
+                )
+            finally:
+                stream.status = status
+                job_runner.finish(stream)
+        finally:
+            self._running.pop(job_id, None)
+            self.wake()
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,81 @@
+import asyncio
+import subprocess
+from typing import Dict, Optional, Tuple
+
+from .startup import lazy_module
+
+psutil = lazy_module("psutil")
+
+# How often a running job's process tree is sampled
+SAMPLE_INTERVAL = 1.0
+
+
+class TreeUsage:
+    """Resource usage of a job's process tree, accumulated from samples.
+
+    CPU time and I/O are cumulative per process, so the last value seen for
+    each process (keyed by pid and create time, since pids are reused) is
+    summed over every process that ever appeared in the tree. Peak RSS is the
+    largest total resident size of the tree at any sample. Processes that
+    start and exit between two samples are not seen.
+    """
+
+    def __init__(self):
+        self._procs: Dict[Tuple[int, float], Tuple[float, float, int, int]] = {}
+        self.peak_rss = 0
+        self.samples = 0
+
+    def sample(self, pid: int) -> None:
+        """Blocking psutil calls: run it in an executor."""
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return
+        rss = 0
+        for p in procs:
+            try:
+                with p.oneshot():
+                    key = (p.pid, p.create_time())
+                    cpu = p.cpu_times()
+                    rss += p.memory_info().rss
+                    try:
+                        io = p.io_counters()
+                        read, written = io.read_bytes, io.write_bytes
+                    except (AttributeError, psutil.Error):
+                        # Not available on macOS, or denied
+                        read, written = self._procs.get(key, (0, 0, 0, 0))[2:]
+            except psutil.Error:
+                continue
+            self._procs[key] = (cpu.user, cpu.system, read, written)
+        self.peak_rss = max(self.peak_rss, rss)
+        self.samples += 1
+
+    def totals(self) -> dict:
+        values = self._procs.values()
+        return {
+            "cpu_user_s": round(sum(v[0] for v in values), 3),
+            "cpu_system_s": round(sum(v[1] for v in values), 3),
+            "peak_rss": self.peak_rss,
+            "read_bytes": sum(v[2] for v in values),
+            "write_bytes": sum(v[3] for v in values),
+        }
+
+
+async def track(usage: TreeUsage, get_proc, done: asyncio.Event) -> None:
+    """Sample the tree of `get_proc()` until `done` is set.
+
+    The first sample is taken as soon as the process exists so that short
+    jobs still get one.
+    """
+    loop = asyncio.get_running_loop()
+    proc: Optional[subprocess.Popen] = None
+    while not done.is_set():
+        if proc is None:
+            proc = get_proc()
+        if proc is not None:
+            await loop.run_in_executor(None, usage.sample, proc.pid)
+        try:
+            await asyncio.wait_for(done.wait(), SAMPLE_INTERVAL if proc is not None else 0.05)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,93 @@
+import base64
+import json
+import os
+from typing import Dict, List, NamedTuple
+
+from fastapi.responses import Response
+
+
+class Row(NamedTuple):
+	"""One directory entry, before it becomes an `Entry` or a column cell."""
+	parent: str
+	name: str
+	is_dir: bool
+	size: int
+	modified: float
+
+
+def scan_dir(abs_dir: str, only_dirs: bool = False) -> List[Row]:
+	"""Entries of one directory, sorted folders first then by name.
+
+	Raises PermissionError / OSError from scandir itself; entries that fail
+	to stat are skipped.
+	"""
+	rows: List[Row] = []
+	with os.scandir(abs_dir) as it:
+		for entry in it:
+			try:
+				is_dir = entry.is_dir(follow_symlinks=False)
+				# If only_dirs requested, skip files early
+				if only_dirs and not is_dir:
+					continue
+				st = entry.stat(follow_symlinks=False)
+			except Exception:
+				continue
+			rows.append(Row(abs_dir, entry.name, is_dir, 0 if is_dir else int(st.st_size), float(st.st_mtime)))
+	return sort_rows(rows)
+
+
+def sort_rows(rows: List[Row]) -> List[Row]:
+	rows.sort(key=lambda r: (not r.is_dir, r.name.lower()))
+	return rows
+
+
+def _bitmap(flags: List[bool]) -> str:
+	"""Base64 of a little-endian bitmap: bit i of byte i // 8 is flags[i]."""
+	out = bytearray((len(flags) + 7) // 8)
+	for i, flag in enumerate(flags):
+		if flag:
+			out[i >> 3] |= 1 << (i & 7)
+	return base64.b64encode(bytes(out)).decode("ascii")
+
+
+def columns_response(base: str, rows: List[Row]) -> Response:
+	"""Serialize rows as columns (`?compact=true` on list/search endpoints).
+
+	{"format": "columns", "base": <dir>, "count": n,
+	 "names": [...], "is_dir": <base64 bitmap>, "sizes": [...], "modified": [...],
+	 "dirs": [...], "dir_index": [...]}
+
+	Every entry's path is join(base, dirs[dir_index[i]], names[i]). `dirs`
+	holds parent folders relative to base; both are omitted when all rows
+	live directly in base (plain listings).
+	"""
+	payload = {
+		"format": "columns",
+		"base": base,
+		"count": len(rows),
+		"names": [r.name for r in rows],
+		"is_dir": _bitmap([r.is_dir for r in rows]),
+		"sizes": [r.size for r in rows],
+		"modified": [r.modified for r in rows],
+	}
+	if any(r.parent != base for r in rows):
+		index: Dict[str, int] = {}
+		dir_index = []
+		for r in rows:
+			i = index.get(r.parent)
+			if i is None:
+				i = index[r.parent] = len(index)
+			dir_index.append(i)
+		payload["dirs"] = [os.path.relpath(p, base) if p != base else "" for p in index]
+		payload["dir_index"] = dir_index
+	body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+	return Response(body, media_type="application/json")
+
+
+def entry_dicts(rows: List[Row]) -> List[dict]:
+	"""Classic `Entry` objects as plain dicts (one per row)."""
+	join = os.path.join
+	return [
+		{"name": r.name, "path": join(r.parent, r.name), "is_dir": r.is_dir, "size": r.size, "modified": r.modified}
+		for r in rows
+	]
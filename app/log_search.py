@@ -0,0 +1,228 @@
+import base64
+import datetime
+import json
+import os
+import re
+from typing import BinaryIO, Iterator, List, Optional, Pattern, Tuple
+
+from .config import settings
+from .log_tail import LEVELS
+
+# Records start with logging_config's "%(asctime)s - %(name)s - %(levelname)s - ",
+# or with log_format=json are one object per line, opening with the same three fields
+_HEADER_RE = re.compile(
+    rb"^(?:(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) - (.*?) - ([A-Z]+) - "
+    rb'|\{"time": "(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3})", "logger": "((?:[^"\\]|\\.)*)", "level": "([A-Z]+)")'
+)
+TS_LEN = 23  # len("2026-01-31 23:59:59,999")
+BLOCK = 64 * 1024
+# One record (a message plus its traceback) is cut beyond this
+MAX_RECORD = 64 * 1024
+# Bytes examined per request before returning a cursor, so rare matches
+# in big files cannot make one request arbitrarily slow
+SCAN_BUDGET = 32 * 1024 * 1024
+
+
+def normalize_time(value: str) -> bytes:
+    """'2026-10-19T03:12' / '2026-10-19 03:12:05.5' -> b'2026-10-19 03:12:00,000' style prefix."""
+    dt = datetime.datetime.fromisoformat(value.strip())
+    return dt.strftime("%Y-%m-%d %H:%M:%S,%f")[:TS_LEN].encode("ascii")
+
+
+def log_files() -> List[str]:
+    """The server log and its numbered backups, oldest first."""
+    base = os.path.abspath(settings.log_file)
+    directory, name = os.path.split(base)
+    backups = []
+    try:
+        for entry in os.listdir(directory):
+            suffix = entry[len(name) + 1:]
+            if entry.startswith(name + ".") and suffix.isdigit():
+                backups.append((int(suffix), os.path.join(directory, entry)))
+    except OSError:
+        pass
+    files = [path for _, path in sorted(backups, reverse=True)]
+    if os.path.exists(base):
+        files.append(base)
+    return files
+
+
+def _file_id(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_dev}:{st.st_ino}"
+
+
+def _first_record(f: BinaryIO, offset: int) -> Tuple[Optional[int], Optional[bytes]]:
+    """(position, timestamp) of the first record starting at or after `offset`."""
+    f.seek(max(0, offset - 1))
+    if offset > 0:
+        f.readline()  # finish the line `offset` falls in (no-op when offset is a line start)
+    while True:
+        pos = f.tell()
+        line = f.readline(MAX_RECORD)
+        if not line:
+            return None, None
+        m = _HEADER_RE.match(line)
+        if m:
+            return pos, m.group(1) or m.group(4)
+
+
+def _seek_time(f: BinaryIO, size: int, start: bytes) -> Optional[int]:
+    """Position of the first record with timestamp >= start (binary search; None if there is none)."""
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        pos, ts = _first_record(f, mid)
+        if pos is None or ts >= start:
+            hi = mid
+        else:
+            lo = pos + 1
+    pos, _ = _first_record(f, lo)
+    return pos
+
+
+class Query:
+    def __init__(self, start: Optional[bytes] = None, end: Optional[bytes] = None, min_level: int = 0,
+                 logger: Optional[str] = None, text: Optional[str] = None, pattern: Optional[Pattern] = None):
+        self.start = start
+        self.end = end
+        self.min_level = min_level
+        self.logger = logger
+        self.text = text.lower() if text else None
+        self.pattern = pattern
+
+    def matches(self, record: dict) -> bool:
+        if LEVELS.get(record["level"], 0) < self.min_level:
+            return False
+        if self.logger and not (record["logger"] == self.logger or record["logger"].startswith(self.logger + ".")):
+            return False
+        body = record["message"]
+        if self.text and self.text not in body.lower():
+            return False
+        if self.pattern and not self.pattern.search(body):
+            return False
+        return True
+
+
+def _record(header: "re.Match", body: bytes) -> dict:
+    if header.group(1):
+        return {
+            "time": header.group(1).decode("ascii"),
+            "logger": header.group(2).decode("utf-8", errors="replace"),
+            "level": header.group(3).decode("ascii"),
+            "message": body.decode("utf-8", errors="replace").rstrip("\r\n"),
+        }
+    try:
+        fields = json.loads(body)
+        message = fields.get("message", "")
+        if fields.get("exc"):
+            message += "\n" + fields["exc"]
+    except ValueError:  # cut at MAX_RECORD
+        fields, message = {}, body.decode("utf-8", errors="replace").rstrip("\r\n")
+    record = {
+        "time": header.group(4).decode("ascii"),
+        "logger": fields.get("logger") or json.loads(b'"' + header.group(5) + b'"'),
+        "level": header.group(6).decode("ascii"),
+        "message": message,
+    }
+    if fields.get("request_id"):
+        record["request_id"] = fields["request_id"]
+    return record
+
+
+def _records(f: BinaryIO, pos: int) -> Iterator[Tuple[int, int, dict]]:
+    """(start, end, record) for each record from `pos` (a record start) to EOF."""
+    f.seek(pos)
+    header = None
+    body: List[bytes] = []
+    size = 0
+    start = pos
+    while True:
+        line_pos = f.tell()
+        line = f.readline(MAX_RECORD)
+        m = _HEADER_RE.match(line) if line else None
+        if (m or not line) and header is not None:
+            yield start, line_pos, _record(header, b"".join(body))
+            header = None
+        if not line:
+            return
+        if m:
+            header, start = m, line_pos
+            rest = line if m.group(4) else line[m.end():]  # JSON records are parsed whole
+            body, size = [rest], len(rest)
+        elif header is not None and size < MAX_RECORD:
+            body.append(line[:MAX_RECORD - size])
+            size += len(body[-1])
+
+
+def _encode_cursor(file_id: str, offset: int, ts: str) -> str:
+    raw = json.dumps({"f": file_id, "o": offset, "t": ts}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def search(query: Query, limit: int = 200, cursor: Optional[str] = None) -> dict:
+    """Matching records, oldest first, with a cursor for the next page (None when done).
+
+    Files are read record by record from a position found by binary search
+    on the timestamps, so memory stays bounded by the page size.
+    """
+    files = log_files()
+    resume = _decode_cursor(cursor) if cursor else None
+    items: List[dict] = []
+    scanned = 0
+    start_index, start_pos = 0, None
+    if resume is not None:
+        ids = []
+        for path in files:
+            try:
+                ids.append(_file_id(path))
+            except OSError:
+                ids.append(None)
+        if resume["f"] in ids:
+            start_index, start_pos = ids.index(resume["f"]), resume["o"]
+        else:
+            # The file was rotated away since: continue from the last timestamp seen
+            query.start = max(query.start or b"", resume["t"].encode("ascii"))
+
+    for index in range(start_index, len(files)):
+        path = files[index]
+        try:
+            f = open(path, "rb")
+        except OSError:
+            continue
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            file_id = _file_id(path)
+            if start_pos is not None and index == start_index:
+                pos = start_pos
+            elif query.start:
+                pos = _seek_time(f, size, query.start)
+                if pos is None:
+                    continue  # everything in this file is older
+            else:
+                pos, _ = _first_record(f, 0)
+                if pos is None:
+                    continue
+            for rec_start, rec_end, record in _records(f, pos):
+                ts = record["time"].encode("ascii")
+                if query.end and ts >= query.end:
+                    return {"items": items, "next": None, "scanned_bytes": scanned}
+                scanned += rec_end - rec_start
+                if query.matches(record):
+                    record["file"] = os.path.basename(path)
+                    record["offset"] = rec_start
+                    items.append(record)
+                    if len(items) >= limit:
+                        return {"items": items, "next": _encode_cursor(file_id, rec_end, record["time"]),
+                                "scanned_bytes": scanned}
+                if scanned >= SCAN_BUDGET:
+                    return {"items": items, "next": _encode_cursor(file_id, rec_end, record["time"]),
+                            "scanned_bytes": scanned}
+    return {"items": items, "next": None, "scanned_bytes": scanned}
@@ -0,0 +1,252 @@
+import asyncio
+import codecs
+import os
+import re
+from typing import Dict, List, Optional, Pattern, Set, Tuple
+
+from .startup import lazy_module, module_available
+
+watchfiles = lazy_module("watchfiles")
+
+# A file is re-checked at least this often even without filesystem events
+# (and polled at this rate when watchfiles is unavailable)
+POLL_INTERVAL = 1.0
+# Largest read per step; a burst is fanned out in batches of this size
+READ_CHUNK = 1024 * 1024
+# Batches queued per subscriber; beyond that its output is dropped (with a notice)
+SUBSCRIBER_QUEUE = 64
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40, "CRITICAL": 50, "FATAL": 50}
+_LEVEL_RE = re.compile(r"\b(DEBUG|INFO|WARN(?:ING)?|ERROR|CRITICAL|FATAL)\b")
+# The level is looked for near the start of a line ("<time> - <logger> - LEVEL - ...")
+_LEVEL_SCAN = 160
+
+
+def parse_level(name: Optional[str]) -> int:
+    """Numeric level for a name like "warning" (0 for none / unknown)."""
+    return LEVELS.get((name or "").upper(), 0)
+
+
+class Subscriber:
+    """One follower of a file, with its filter and a bounded queue of text batches."""
+
+    def __init__(self, min_level: int = 0, pattern: Optional[Pattern] = None):
+        self.min_level = min_level
+        self.pattern = pattern
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.dropped = 0
+
+    def select(self, lines: List[Tuple[str, int]]) -> str:
+        return "".join(
+            line for line, level in lines
+            if level >= self.min_level and (self.pattern is None or self.pattern.search(line))
+        )
+
+    def offer(self, text: str) -> None:
+        if not text:
+            return
+        if self.dropped and not self.queue.full():
+            self.queue.put_nowait(f"[... {self.dropped} lines skipped: client too slow ...]\n")
+            self.dropped = 0
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.dropped += text.count("\n")
+
+
+class FileTailer:
+    """Follows one file for all of its subscribers.
+
+    Woken by filesystem events on the file's directory (with a periodic
+    re-check), it reads what was appended and fans it out in batches.
+    The file is opened only while reading, so the writer can rotate it even
+    on Windows. Rotation is noticed by a change of file identity: the rest of
+    the old file is read from `<name>.1` (RotatingFileHandler's backup) when
+    it is still there, then the new file is followed from its start. A file
+    that shrinks is treated as truncated and read again from the start.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.subscribers: Set[Subscriber] = set()
+        self._id: Optional[Tuple[int, int]] = None  # (st_dev, st_ino) of the file being followed
+        self._pos = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial = ""
+        self._level = 0  # level of the last line, inherited by continuation lines (tracebacks)
+        self._lock = asyncio.Lock()
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ----- reading (runs in a thread) -----
+
+    def _seek_end(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        self._id, self._pos = (st.st_dev, st.st_ino), st.st_size
+
+    def _read_from(self, path: str, limit: int) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(self._pos)
+            data = f.read(limit)
+        self._pos += len(data)
+        return data
+
+    def _read_new(self) -> Tuple[bytes, List[str]]:
+        """(appended bytes, up to READ_CHUNK; notices about rotation). Empty once caught up."""
+        notices = []
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return b"", notices  # rotated away and not recreated yet, or deleted
+        ident = (st.st_dev, st.st_ino)
+        try:
+            if self._id is None:
+                self._id, self._pos = ident, 0
+            elif ident != self._id:
+                # Rotated: finish the old file if its backup is where RotatingFileHandler puts it
+                try:
+                    backup = os.stat(self.path + ".1")
+                    if (backup.st_dev, backup.st_ino) == self._id and backup.st_size > self._pos:
+                        return self._read_from(self.path + ".1", READ_CHUNK), notices
+                except OSError:
+                    pass
+                self._id, self._pos = ident, 0
+                self._reset_decoder()
+                notices.append("[log rotated]\n")
+            elif st.st_size < self._pos:
+                self._pos = 0
+                self._reset_decoder()
+                notices.append("[file truncated]\n")
+            if st.st_size <= self._pos:
+                return b"", notices
+            return self._read_from(self.path, READ_CHUNK), notices
+        except OSError:
+            return b"", notices
+
+    def _reset_decoder(self) -> None:
+        self._decoder.reset()
+        self._partial = ""
+
+    def _split(self, data: bytes) -> List[Tuple[str, int]]:
+        text = self._partial + self._decoder.decode(data)
+        lines = text.splitlines(keepends=True)
+        self._partial = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        out = []
+        for line in lines:
+            m = _LEVEL_RE.search(line, 0, _LEVEL_SCAN)
+            if m:
+                self._level = LEVELS[m.group(1)]
+            out.append((line, self._level))
+        return out
+
+    # ----- event loop side -----
+
+    async def _poll(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                data, notices = await loop.run_in_executor(None, self._read_new)
+                for notice in notices:
+                    for sub in list(self.subscribers):
+                        sub.offer(notice)
+                if not data:
+                    return
+                lines = self._split(data)
+                if lines:
+                    for sub in list(self.subscribers):
+                        sub.offer(sub.select(lines))
+
+    async def backlog(self, sub: Subscriber, size: int) -> str:
+        """Up to `size` bytes before the current position (whole lines), filtered for `sub`."""
+        async with self._lock:
+            if self._id is None or size <= 0:
+                return ""
+            start = max(0, self._pos - size)
+
+            def read() -> bytes:
+                with open(self.path, "rb") as f:
+                    f.seek(start)
+                    return f.read(self._pos - start)
+
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(None, read)
+            except OSError:
+                return ""
+        text = data.decode("utf-8", errors="replace")
+        if start > 0:
+            text = text.partition("\n")[2]  # drop the cut first line
+        level = 0
+        lines = []
+        for line in text.splitlines(keepends=True):
+            m = _LEVEL_RE.search(line, 0, _LEVEL_SCAN)
+            if m:
+                level = LEVELS[m.group(1)]
+            lines.append((line, level))
+        return sub.select(lines)
+
+    async def _run(self) -> None:
+        if module_available("watchfiles"):
+            name = os.path.normcase(os.path.basename(self.path))
+
+            def ours(change, changed_path: str) -> bool:
+                return os.path.normcase(os.path.basename(changed_path)).startswith(name)
+
+            try:
+                async for _ in watchfiles.awatch(
+                    os.path.dirname(self.path) or ".", watch_filter=ours, recursive=False,
+                    debounce=200, step=20, rust_timeout=int(POLL_INTERVAL * 1000), yield_on_timeout=True,
+                    stop_event=self._stop,
+                ):
+                    await self._poll()
+                return
+            except Exception as e:
+                # e.g. the directory cannot be watched: fall back to polling
+                print(f"Log tailer for {self.path}: {e}; polling instead")
+        while not self._stop.is_set():
+            await self._poll()
+            try:
+                await asyncio.wait_for(self._stop.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, 5)
+            except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+                self._task.cancel()
+            self._task = None
+
+
+_TAILERS: Dict[str, FileTailer] = {}
+
+
+async def subscribe(path: str, sub: Subscriber) -> FileTailer:
+    """Follow `path` (absolute), sharing the tailer with other followers of the same file."""
+    key = os.path.normcase(os.path.abspath(path))
+    tailer = _TAILERS.get(key)
+    if tailer is None:
+        tailer = _TAILERS[key] = FileTailer(os.path.abspath(path))
+        tailer._seek_end()  # followers get what is written from now on (plus their backlog)
+        tailer.start()
+    tailer.subscribers.add(sub)
+    return tailer
+
+
+async def unsubscribe(tailer: FileTailer, sub: Subscriber) -> None:
+    tailer.subscribers.discard(sub)
+    if not tailer.subscribers:
+        _TAILERS.pop(os.path.normcase(tailer.path), None)
+        await tailer.stop()
+
+
+def stats() -> List[dict]:
+    return [{"path": t.path, "subscribers": len(t.subscribers), "position": t._pos} for t in _TAILERS.values()]
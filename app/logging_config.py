@@ -1,31 +1,271 @@
+import asyncio
+import contextvars
+import copy
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 from .config import settings
 
+# Id of the request being served, set by AccessLogMiddleware; attached to every record
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Record attributes that are not "extra" fields
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_LISTENER: Optional[QueueListener] = None
+_QUEUE_HANDLER: Optional["BoundedQueueHandler"] = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request id (runs in the logging thread's context)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, logger, level, message first (log_search relies
+    on that order), then request_id, extra fields and the traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            out["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Hands records to the listener thread through a bounded queue.
+
+    When the queue is full, "drop" discards INFO and below at once and waits
+    briefly for WARNING and above; "block" always waits. Neither ever waits on
+    a thread running an event loop: there the record is dropped, since one
+    wait would stall every request served by that loop. Dropped records are
+    counted and reported, at most once per NOTICE_INTERVAL, ahead of a
+    record that gets through.
+    """
+
+    WARNING_WAIT = 0.5
+    NOTICE_INTERVAL = 1.0
+
+    def __init__(self, q: queue.Queue, overflow: str = "drop"):
+        super().__init__(q)
+        self.overflow = overflow
+        self.dropped = 0
+        self._last_notice = 0.0
+        self.addFilter(RequestContextFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, but the traceback stays in exc_text
+        # instead of being folded into the message (JsonFormatter keeps it apart)
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _drop_notice(self) -> logging.LogRecord:
+        dropped, self.dropped = self.dropped, 0
+        return self.prepare(logging.LogRecord("app.logging", logging.WARNING, __file__, 0,
+                                              "%d log records dropped: logging queue full", (dropped,), None))
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.dropped and time.monotonic() - self._last_notice >= self.NOTICE_INTERVAL:
+            dropped = self.dropped
+            try:
+                self.queue.put_nowait(self._drop_notice())
+                self._last_notice = time.monotonic()
+            except queue.Full:
+                self.dropped += dropped
+        try:
+            if _on_event_loop():
+                self.queue.put_nowait(record)
+            elif self.overflow == "block":
+                self.queue.put(record)
+            elif record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.WARNING_WAIT)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _formatter() -> logging.Formatter:
+    if settings.log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
 def setup_logging():
-    # Configure root logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+    global _LISTENER, _QUEUE_HANDLER
+    if _LISTENER is not None:
+        return
 
     # Console Handler (stdout)
     c_handler = logging.StreamHandler(sys.stdout)
     c_handler.setLevel(logging.INFO)
-    c_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    c_handler.setFormatter(c_format)
-    logger.addHandler(c_handler)
+    c_handler.setFormatter(_formatter())
+    handlers = [c_handler]
 
     # File Handler (Rotating)
     if settings.log_file:
         # Max 2MB per file, keep only 1 backup (total ~4MB)
         f_handler = RotatingFileHandler(settings.log_file, maxBytes=2*1024*1024, backupCount=1, encoding='utf-8')
         f_handler.setLevel(logging.INFO)
-        f_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        f_handler.setFormatter(f_format)
-        logger.addHandler(f_handler)
+        f_handler.setFormatter(_formatter())
+        handlers.append(f_handler)
+
+    # Loggers only enqueue; one listener thread does the formatting, writes and rotation
+    _QUEUE_HANDLER = BoundedQueueHandler(queue.Queue(maxsize=settings.log_queue_size), settings.log_overflow)
+    _LISTENER = QueueListener(_QUEUE_HANDLER.queue, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+
+    # Configure root logger
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(_QUEUE_HANDLER)
+
+    # Uvicorn errors go through the queue too. Access lines come from
+    # AccessLogMiddleware (with request id and duration) unless it is off.
+    logging.getLogger("uvicorn.error").handlers = [_QUEUE_HANDLER]
+    logging.getLogger("uvicorn.error").propagate = False
+    access = logging.getLogger("uvicorn.access")
+    access.handlers = [] if settings.access_log else [_QUEUE_HANDLER]
+    access.propagate = False
 
-    # Uvicorn Access Logs (capture them too)
-    logging.getLogger("uvicorn.access").handlers = [c_handler, f_handler]
-    logging.getLogger("uvicorn.error").handlers = [c_handler, f_handler]
+    if settings.access_log:
+        access_log.start()
 
     logging.info(f"Logging configured. Writing to {settings.log_file}")
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _LISTENER, _QUEUE_HANDLER
+    if _LISTENER is None:
+        return
+    access_log.stop()
+    logging.getLogger().removeHandler(_QUEUE_HANDLER)
+    for name in ("uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+    if _QUEUE_HANDLER.dropped:
+        _QUEUE_HANDLER.queue.put(_QUEUE_HANDLER._drop_notice())
+    _LISTENER.stop()
+    for handler in _LISTENER.handlers:
+        handler.close()
+    _LISTENER = _QUEUE_HANDLER = None
+
+
+def logging_stats() -> dict:
+    if _QUEUE_HANDLER is None:
+        return {"running": False}
+    return {
+        "running": True,
+        "queued": _QUEUE_HANDLER.queue.qsize(),
+        "capacity": settings.log_queue_size,
+        "dropped_pending": _QUEUE_HANDLER.dropped,
+    }
+
+
+class AccessLog:
+    """Access lines, with sampling and aggregation for high-volume paths.
+
+    Paths in settings.log_sample_paths (e.g. /api/thumb) are not logged one
+    by one: they are summed per path and written as one summary line every
+    log_aggregate_interval seconds (by a timer thread, so quiet periods are
+    reported too), plus a `log_sample_rate` share of individual lines.
+    Errors (status >= 500) are always logged.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("app.access")
+        self._totals: dict = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._sampled = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, method: str, path: str, query: str, status: int, duration_ms: float, client: str) -> None:
+        extra = {"method": method, "path": path, "status": status, "duration_ms": round(duration_ms, 2), "client": client}
+        target = f"{path}?{query}" if query else path
+        if path in settings.log_sample_paths:
+            with self._lock:
+                totals = self._totals.setdefault(path, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+                totals["count"] += 1
+                totals["errors"] += status >= 400
+                totals["total_ms"] += duration_ms
+                totals["max_ms"] = max(totals["max_ms"], duration_ms)
+                self._sampled += settings.log_sample_rate
+                sampled = self._sampled >= 1.0
+                if sampled:
+                    self._sampled -= 1.0
+            if sampled or status >= 500:
+                self.logger.info('%s - "%s %s" %d %.1fms (sampled)', client, method, target, status, duration_ms,
+                                 extra=extra)
+            return
+        self.logger.info('%s - "%s %s" %d %.1fms', client, method, target, status, duration_ms, extra=extra)
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            elapsed, self._last_flush = now - self._last_flush, now
+            totals, self._totals = self._totals, {}
+        for path, t in totals.items():
+            self.logger.info(
+                "%s: %d requests, %d errors, avg %.1fms, max %.1fms (last %ds)",
+                path, t["count"], t["errors"], t["total_ms"] / t["count"], t["max_ms"], elapsed,
+                extra={"path": path, "count": t["count"], "errors": t["errors"],
+                       "avg_ms": round(t["total_ms"] / t["count"], 2), "max_ms": round(t["max_ms"], 2)},
+            )
+
+    def _run(self) -> None:
+        while not self._stop.wait(max(1, settings.log_aggregate_interval)):
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rfe-access-log", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the timer and write what is pending."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+access_log = AccessLog()
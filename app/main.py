@@ -1,33 +1,59 @@
+from . import startup  # imported first: starts the boot clock
+import threading
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from .config import settings
-from .routers import health, files
-from .routers import admin as admin_router
-from .routers import console as console_router
-from .routers import monitoring as monitoring_router
-from .routers import watcher as watcher_router
-from .auth import router as auth_router
-from .routers import services, processes, automation, logs
-from .middlewares import AuthMiddleware
-from .db import init_db
+from .middlewares import AccessLogMiddleware, AuthMiddleware, CompressionMiddleware
+from .static_assets import PrecompressedStaticFiles
+from .db import init_db, close_db
 from . import image_utils
+from . import shares
+from . import cluster
+from . import terminal
+from .job_scheduler import scheduler as job_scheduler
+
+
+ROUTER_MODULES = (
+	".routers.health",
+	".routers.files",
+	".auth",
+	".routers.admin",
+	".routers.console",
+	".routers.logs",
+	".routers.monitoring",
+	".routers.watcher",
+	".routers.services",
+	".routers.processes",
+	".routers.automation",
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 	# Startup
-	from .logging_config import setup_logging
-	setup_logging()
-	image_utils.init_pool()
-	init_db()
+	from .logging_config import setup_logging, shutdown_logging
+	with startup.phase("logging"):
+		setup_logging()
+	with startup.phase("init_db"):
+		init_db()
+	# One worker becomes leader and runs the monitor / sweepers
+	cluster.start()
+	shares.start_sweeper()
+	job_scheduler.start()
+	# Thumbnail process pool is started by the first /thumb request
+	threading.Thread(target=app.state.static.precompress, name="rfe-precompress", daemon=True).start()
+	startup.mark_ready()
 	yield
 	# Shutdown
+	await job_scheduler.stop()
+	await terminal.close_all()
+	cluster.stop()
 	image_utils.shutdown_pool()
+	close_db()
+	shutdown_logging()
 
 
 def create_app() -> FastAPI:
@@ -43,22 +69,19 @@ def create_app() -> FastAPI:
 	)
 
 	app.add_middleware(AuthMiddleware)
-	app.add_middleware(GZipMiddleware, minimum_size=1000)
-
-	app.include_router(health.router, prefix="/api")
-	app.include_router(files.router, prefix="/api")
-	app.include_router(auth_router, prefix="/api")
-	app.include_router(admin_router.router, prefix="/api")
-	app.include_router(console_router.router, prefix="/api")
-	app.include_router(logs.router, prefix="/api")
-	app.include_router(monitoring_router.router, prefix="/api")
-	app.include_router(watcher_router.router, prefix="/api")
-	app.include_router(services.router, prefix="/api")
-	app.include_router(processes.router, prefix="/api")
-	app.include_router(automation.router, prefix="/api")
-
-	# Serve CDN Vue frontend
-	app.mount("/", StaticFiles(directory=str((__file__[:__file__.rfind("\\app\\")] + "\\frontend_cdn").replace("/","\\")), html=True), name="static")
+	app.add_middleware(CompressionMiddleware, minimum_size=1000)
+	# Outermost, so the duration covers auth and compression too
+	if settings.access_log:
+		app.add_middleware(AccessLogMiddleware)
+
+	# Imported one by one so /api/monitor/startup can show what each costs
+	for module_name in ROUTER_MODULES:
+		module = startup.timed_import(module_name, __package__)
+		app.include_router(module.router, prefix="/api")
+
+	# Serve CDN Vue frontend (gzip/brotli variants are built once and cached)
+	app.state.static = PrecompressedStaticFiles(directory=str((__file__[:__file__.rfind("\\app\\")] + "\\frontend_cdn").replace("/","\\")), html=True)
+	app.mount("/", app.state.static, name="static")
 
 	return app
 
@@ -0,0 +1,265 @@
+import math
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import cluster
+from .config import settings
+from .db import query_all, submit
+
+# Series kept for the performance charts (network values are bytes per second)
+FIELDS = ("cpu", "mem", "disk", "net_sent", "net_recv")
+
+# (step in seconds, samples kept in memory): 1s for an hour, 10s for 6 hours,
+# 1m for a day. Every tier is filled by averaging the tier below it; the 1m
+# tier is also written to SQLite (metrics_history table) when persisting.
+TIERS = ((1, 3600), (10, 2160), (60, 1440))
+PRUNE_INTERVAL = 3600
+
+# The leader publishes all tiers under this kv_state key every PUBLISH_INTERVAL
+# seconds. Every worker, the leader included, answers from that publication,
+# so they all return the same series (the newest few seconds are not in it).
+PUBLISHED_KEY = "monitor.history"
+PUBLISH_INTERVAL = 5.0
+
+
+class Ring:
+    """Fixed-size buffer of (timestamp, values) in compact arrays, oldest first."""
+
+    def __init__(self, step: int, capacity: int):
+        self.step = step
+        self.capacity = capacity
+        self._ts = array("d", bytes(8 * capacity))
+        self._values = [array("f", bytes(4 * capacity)) for _ in FIELDS]
+        self._start = 0  # physical index of the oldest sample
+        self.size = 0
+
+    def append(self, ts: float, values: Sequence[float]) -> None:
+        i = (self._start + self.size) % self.capacity
+        if self.size == self.capacity:
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self.size += 1
+        self._ts[i] = ts
+        for column, value in zip(self._values, values):
+            column[i] = value
+
+    def ts_at(self, n: int) -> float:
+        return self._ts[(self._start + n) % self.capacity]
+
+    def oldest(self) -> Optional[float]:
+        return self.ts_at(0) if self.size else None
+
+    def _slice(self, column: array, lo: int, hi: int) -> List[float]:
+        """Logical positions [lo, hi) of a column as a list (two slices when wrapped)."""
+        a, b = self._start + lo, self._start + hi
+        if b <= self.capacity:
+            return column[a:b].tolist()
+        if a >= self.capacity:
+            return column[a - self.capacity:b - self.capacity].tolist()
+        return column[a:].tolist() + column[:b - self.capacity].tolist()
+
+    def _find(self, ts: float) -> int:
+        """Logical position of the first sample at or after `ts`."""
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts_at(mid) < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start: float, end: float) -> Tuple[List[float], List[List[float]]]:
+        """(timestamps, one list per field) of the samples with start <= ts < end."""
+        lo, hi = self._find(start), self._find(end)
+        return self._slice(self._ts, lo, hi), [self._slice(column, lo, hi) for column in self._values]
+
+
+class _Rollup:
+    """Averages samples over `step`-aligned buckets; returns a bucket when it closes."""
+
+    def __init__(self, step: int):
+        self.step = step
+        self._bucket: Optional[float] = None
+        self._sums = [0.0] * len(FIELDS)
+        self._count = 0
+
+    def add(self, ts: float, values: Sequence[float]) -> Optional[Tuple[float, List[float]]]:
+        bucket = ts - ts % self.step
+        closed = None
+        if self._bucket is not None and bucket != self._bucket and self._count:
+            closed = (self._bucket, [s / self._count for s in self._sums])
+            self._sums, self._count = [0.0] * len(FIELDS), 0
+        self._bucket = bucket
+        for n, value in enumerate(values):
+            self._sums[n] += value
+        self._count += 1
+        return closed
+
+
+class MetricsHistory:
+    """In-memory history of the monitor samples, downsampled on the way in.
+
+    Only the leader records samples (into `history`) and publishes them;
+    queries go through shared(), which every worker builds from the last
+    publication.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rings = [Ring(step, capacity) for step, capacity in TIERS]
+        self._rollups = [_Rollup(step) for step, _ in TIERS[1:]]
+        self._last_prune = 0.0
+        self._loaded = False
+
+    def add(self, ts: float, values: Sequence[float]) -> None:
+        with self._lock:
+            self.rings[0].append(ts, values)
+            sample: Optional[Tuple[float, Sequence[float]]] = (ts, values)
+            for ring, rollup in zip(self.rings[1:], self._rollups):
+                sample = rollup.add(*sample)
+                if sample is None:
+                    break
+                ring.append(*sample)
+                if ring is self.rings[-1] and settings.metrics_persist:
+                    submit(
+                        f"INSERT OR REPLACE INTO metrics_history(ts, {', '.join(FIELDS)}) VALUES(?{', ?' * len(FIELDS)})",
+                        (int(sample[0]), *sample[1]),
+                    )
+        if settings.metrics_persist and ts - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = ts
+            submit("DELETE FROM metrics_history WHERE ts < ?", (int(ts - settings.metrics_retention_days * 86400),))
+
+    def load_persisted(self) -> None:
+        """Refill the 1m tier from SQLite (once, when this worker starts sampling)."""
+        if self._loaded or not settings.metrics_persist:
+            return
+        self._loaded = True
+        ring = self.rings[-1]
+        rows = query_all(
+            f"SELECT ts, {', '.join(FIELDS)} FROM metrics_history WHERE ts >= ? ORDER BY ts",
+            (int(time.time() - ring.step * ring.capacity),),
+        )
+        with self._lock:
+            if ring.size:
+                return
+            for row in rows:
+                ring.append(row["ts"], [row[f] for f in FIELDS])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All tiers as JSON columns, for publishing to the other workers."""
+        tiers = []
+        with self._lock:
+            for ring in self.rings:
+                stamps, columns = ring.range(0, math.inf)
+                tier: Dict[str, Any] = {"step": ring.step, "t": [round(ts, 3) for ts in stamps]}
+                for field, column in zip(FIELDS, columns):
+                    tier[field] = [round(value, 2) for value in column]
+                tiers.append(tier)
+        return {"tiers": tiers}
+
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """Replace every tier with the one in a published snapshot (matched by step)."""
+        by_step = {tier["step"]: tier for tier in snapshot.get("tiers", [])}
+        rings = [Ring(step, capacity) for step, capacity in TIERS]
+        for ring in rings:
+            tier = by_step.get(ring.step)
+            if tier is None:
+                continue
+            for n, ts in enumerate(tier["t"]):
+                ring.append(ts, [tier[field][n] for field in FIELDS])
+        with self._lock:
+            self.rings = rings
+            self._rollups = [_Rollup(step) for step, _ in TIERS[1:]]
+            self._loaded = True
+
+    def _samples(self, start: float, end: float, memory: bool) -> Tuple[int, List[float], List[List[float]]]:
+        """(resolution, timestamps, columns): the finest tier that reaches back to
+        `start`, else the tier reaching back furthest, with what is older read from SQLite."""
+        with self._lock:
+            filled = [r for r in self.rings if r.size] if memory else []
+            ring = next((r for r in filled if r.oldest() <= start + r.step), None)
+            covered = ring is not None
+            if ring is None and filled:
+                earliest = min(r.oldest() for r in filled)
+                ring = next(r for r in filled if r.oldest() <= earliest + TIERS[-1][0])
+            if ring is not None:
+                stamps, columns = ring.range(start, end)
+            else:
+                stamps, columns = [], [[] for _ in FIELDS]
+        resolution = ring.step if ring is not None else TIERS[-1][0]
+        if covered or not settings.metrics_persist:
+            return resolution, stamps, columns
+        stop = ring.oldest() if ring is not None else end
+        rows = query_all(
+            f"SELECT ts, {', '.join(FIELDS)} FROM metrics_history WHERE ts >= ? AND ts < ? ORDER BY ts",
+            (int(start), int(stop)),
+        )
+        if not rows:
+            return resolution, stamps, columns
+        return (
+            TIERS[-1][0],
+            [row["ts"] for row in rows] + stamps,
+            [[row[f] for row in rows] + column for f, column in zip(FIELDS, columns)],
+        )
+
+    def query(self, start: float, end: float, points: int, memory: bool = True) -> Dict[str, list]:
+        """Series for [start, end) averaged into `points` buckets aligned on multiples
+        of their width (so one more when the window itself is not aligned).
+
+        memory=False answers from SQLite only (workers that are not sampling).
+        """
+        resolution, stamps, columns = self._samples(start, end, memory)
+        step = max(resolution, math.ceil((end - start) / points))
+        out: Dict[str, list] = {"step": step, "resolution": resolution, "t": []}
+        for field in FIELDS:
+            out[field] = []
+        first = 0
+        for n in range(1, len(stamps) + 1):
+            if n < len(stamps) and stamps[n] // step == stamps[first] // step:
+                continue
+            out["t"].append(int(stamps[first] - stamps[first] % step))
+            for field, column in zip(FIELDS, columns):
+                out[field].append(round(sum(column[first:n]) / (n - first), 2))
+            first = n
+        return out
+
+
+history = MetricsHistory()
+
+_SHARED: Tuple[float, MetricsHistory] = (0.0, MetricsHistory())
+_SHARED_LOCK = threading.Lock()
+
+
+def publish() -> None:
+    """Publish the leader's tiers for shared() in every worker."""
+    cluster.publish(PUBLISHED_KEY, history.snapshot())
+
+
+def resume() -> None:
+    """Start sampling from the last publication (which may be another worker's),
+    else from the persisted 1m series. Called when this worker becomes leader,
+    so it never continues from rings left over from an earlier term."""
+    published = cluster.read(PUBLISHED_KEY)
+    if published:
+        history.restore(published)
+    else:
+        history.load_persisted()
+
+
+def shared() -> MetricsHistory:
+    """The history as last published by the leader, reloaded at most every
+    PUBLISH_INTERVAL seconds. Empty when nothing was published yet, in which
+    case queries fall back to the persisted 1m series."""
+    global _SHARED
+    with _SHARED_LOCK:
+        loaded_at, view = _SHARED
+        if time.monotonic() - loaded_at >= PUBLISH_INTERVAL:
+            view = MetricsHistory()
+            published = cluster.read(PUBLISHED_KEY)
+            if published:
+                view.restore(published)
+            _SHARED = (time.monotonic(), view)
+        return view
@@ -1,26 +1,158 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+import re
+import time
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .config import settings
 from .auth import is_authenticated
+from .logging_config import access_log, request_id_var
+
+
+class AuthMiddleware:
+	"""Cookie check as a plain ASGI middleware.
 
+	Authenticated requests are handed to the app untouched (same receive/send),
+	so file downloads and ZIP streams are not copied through an extra task.
+	"""
 
-class AuthMiddleware(BaseHTTPMiddleware):
-	async def dispatch(self, request: Request, call_next):
-		# API Authentication
-		if request.url.path.startswith("/api") and not request.url.path.endswith("/login"):
-			if settings.auth_enabled and not is_authenticated(request):
-				from starlette.responses import JSONResponse
-				return JSONResponse({"detail": "Unauthorized"}, status_code=401)
-		
-		# Static Page Authentication (Redirect to Login)
-		elif settings.auth_enabled and not is_authenticated(request):
-			path = request.url.path
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		# Websockets check the session themselves
+		if scope["type"] != "http" or not settings.auth_enabled:
+			await self.app(scope, receive, send)
+			return
+		path = scope["path"]
+		if not is_authenticated(HTTPConnection(scope)):
+			# API Authentication
+			if path.startswith("/api"):
+				if not path.endswith("/login"):
+					await JSONResponse({"detail": "Unauthorized"}, status_code=401)(scope, receive, send)
+					return
+			# Static Page Authentication (Redirect to Login)
 			# Protect root, index, admin, and implicit index
-			if path in ["/", "/index.html", "/admin.html"] or path.endswith("/"):
-				from starlette.responses import RedirectResponse
-				return RedirectResponse(url="/login.html")
-				
-		return await call_next(request)
+			elif path in ["/", "/index.html", "/admin.html"] or path.endswith("/"):
+				await RedirectResponse(url="/login.html")(scope, receive, send)
+				return
+		await self.app(scope, receive, send)
+
+
+# Endpoints streaming file bodies: gzip would burn CPU on already-compressed
+# data and drop Content-Length / Range support.
+NO_COMPRESS_PATHS = (
+	"/api/file",
+	"/api/thumb",
+	"/api/zip",
+	"/api/zip/multiple",
+	"/api/share/file",
+	"/api/share/zip/multiple",
+)
+_INCOMPRESSIBLE_PREFIXES = ("image/", "audio/", "video/", "font/woff")
+_INCOMPRESSIBLE_TYPES = {
+	"application/zip",
+	"application/gzip",
+	"application/x-gzip",
+	"application/x-7z-compressed",
+	"application/x-rar-compressed",
+	"application/vnd.rar",
+	"application/x-bzip2",
+	"application/x-xz",
+	"application/zstd",
+	"application/pdf",
+	"application/octet-stream",
+	# streamed events must reach the client as they are produced
+	"text/event-stream",
+}
+
+
+def is_compressible(headers: Headers, status: int) -> bool:
+	if status == 206 or "content-encoding" in headers:
+		return False
+	if headers.get("content-disposition", "").lower().startswith("attachment"):
+		return False
+	ctype = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+	if not ctype:
+		return False
+	return ctype not in _INCOMPRESSIBLE_TYPES and not ctype.startswith(_INCOMPRESSIBLE_PREFIXES)
+
+
+class _PolicyGZipResponder(GZipResponder):
+	async def send_with_gzip(self, message: Message) -> None:
+		await super().send_with_gzip(message)
+		if message["type"] == "http.response.start":
+			headers = Headers(raw=message["headers"])
+			if not is_compressible(headers, message["status"]):
+				# GZipResponder passes the body through as-is when this is set
+				self.content_encoding_set = True
+
+
+class CompressionMiddleware:
+	"""GZip for text-like responses only.
+
+	Download routes are never wrapped; for everything else the decision is
+	made from the response headers (type, encoding, status, disposition).
+	"""
+
+	def __init__(self, app: ASGIApp, minimum_size: int = 1000, compresslevel: int = 6):
+		self.app = app
+		self.minimum_size = minimum_size
+		self.compresslevel = compresslevel
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] == "http" and scope["path"] not in NO_COMPRESS_PATHS:
+			if "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+				responder = _PolicyGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+				await responder(scope, receive, send)
+				return
+		await self.app(scope, receive, send)
+
+
+# Incoming X-Request-ID values are kept only when they look like an id
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class AccessLogMiddleware:
+	"""Request id and access line for every HTTP request.
+
+	The id (the client's X-Request-ID when sane, else a new one) is set in
+	request_id_var for every record logged while serving the request, and
+	echoed in the response headers. The access line is written once the
+	response is complete, with its duration; see logging_config.AccessLog.
+	"""
+
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		start = time.perf_counter()
+		request_id = Headers(scope=scope).get("x-request-id", "")
+		if not _REQUEST_ID_RE.match(request_id):
+			request_id = uuid.uuid4().hex[:16]
+		token = request_id_var.set(request_id)
+		status = 500
 
+		async def send_wrapper(message: Message) -> None:
+			nonlocal status
+			if message["type"] == "http.response.start":
+				status = message["status"]
+				MutableHeaders(scope=message).append("X-Request-ID", request_id)
+			await send(message)
 
+		try:
+			await self.app(scope, receive, send_wrapper)
+		finally:
+			client = scope.get("client")
+			access_log.record(
+				scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), status,
+				(time.perf_counter() - start) * 1000, f"{client[0]}:{client[1]}" if client else "-",
+			)
+			request_id_var.reset(token)
@@ -1,8 +1,12 @@
 import os
-from typing import Tuple
+from functools import lru_cache
+from typing import Sequence, Tuple
 
 from .config import settings
 
+# Recent request paths -> (allowed, absolute path)
+_RESOLVE_CACHE_SIZE = 4096
+
 
 def normalize_path(input_path: str) -> str:
 	"""Normalize Windows/Unix-like input to an absolute Windows path."""
@@ -17,40 +21,81 @@ def normalize_path(input_path: str) -> str:
 	return os.path.normpath(win_path)
 
 
+class RootMatcher:
+	"""Allowed roots, normalized once, tested with a single prefix match.
+
+	Roots are normpath'ed and case-folded (normcase: lower-case on Windows,
+	unchanged on POSIX). A path is allowed if it equals a root or starts with
+	a root followed by a separator, so C:\\data does not admit C:\\database.
+	Relative roots never match, as before.
+	"""
+
+	def __init__(self, roots: Sequence[str]):
+		self.roots = tuple(roots)
+		exact = set()
+		prefixes = []
+		for root in self.roots:
+			try:
+				norm = os.path.normcase(os.path.normpath(root))
+			except Exception:
+				continue
+			if not os.path.isabs(norm):
+				continue
+			exact.add(norm)
+			# Drive roots ("c:\\", "/") already end with a separator
+			prefixes.append(norm if norm.endswith(os.sep) else norm + os.sep)
+		self._exact = frozenset(exact)
+		self._prefixes = tuple(prefixes)
+
+	def matches(self, abs_path: str) -> bool:
+		"""`abs_path` must already be absolute and normalized (os.path.abspath)."""
+		path = os.path.normcase(abs_path)
+		return path in self._exact or path.startswith(self._prefixes)
+
+
+_MATCHER = RootMatcher(settings.root_dirs)
+
+
+def _matcher() -> RootMatcher:
+	# Rebuilt only if settings.root_dirs was reassigned or edited in place
+	global _MATCHER
+	matcher = _MATCHER
+	if matcher.roots != tuple(settings.root_dirs):
+		matcher = _MATCHER = RootMatcher(settings.root_dirs)
+		_resolve_cached.cache_clear()  # frees memory; correctness comes from the cache key
+	return matcher
+
+
 def is_within_allowed_roots(abs_path: str) -> bool:
 	"""Check if absolute path is within any allowed root (drive or configured directory)."""
 	try:
 		abs_path = os.path.abspath(abs_path)
 	except Exception:
 		return False
-	for root in settings.root_dirs:
-		root_norm = os.path.normpath(root)
-		# If root is a drive like C:\, allow any path starting with that drive
-		try:
-			common = os.path.commonpath([abs_path, root_norm])
-		except Exception:
-			continue
-		if common == os.path.normpath(root_norm):
-			return True
-	return False
+	return _matcher().matches(abs_path)
 
 
-def resolve_path(request_path: str) -> Tuple[bool, str]:
-	"""Resolve a request path to an absolute path and confirm it is allowed.
-
-	Returns (allowed, absolute_path).
-	"""
-	if not request_path:
-		return False, ""
+@lru_cache(maxsize=_RESOLVE_CACHE_SIZE)
+def _resolve_cached(request_path: str, matcher: RootMatcher) -> Tuple[bool, str]:
+	# Keyed on the matcher too: an entry computed under other roots can never be returned
 	normalized = normalize_path(request_path)
 	# If already absolute like C:\foo, use it; else try to join with first root
 	if os.path.isabs(normalized):
 		abs_target = os.path.abspath(normalized)
 	else:
 		# Default to first configured root when relative
-		base = settings.root_dirs[0] if settings.root_dirs else os.getcwd()
+		base = matcher.roots[0] if matcher.roots else os.getcwd()
 		abs_target = os.path.abspath(os.path.join(base, normalized))
-	allowed = is_within_allowed_roots(abs_target)
-	return allowed, abs_target
+	return matcher.matches(abs_target), abs_target
 
 
+def resolve_path(request_path: str) -> Tuple[bool, str]:
+	"""Resolve a request path to an absolute path and confirm it is allowed.
+
+	Returns (allowed, absolute_path). Purely lexical (no filesystem access,
+	so symlinks are not followed, as before), which is what makes the result
+	safe to memoize.
+	"""
+	if not request_path:
+		return False, ""
+	return _resolve_cached(request_path, _matcher())
@@ -1,7 +1,10 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
 
 from ..db import query_all, execute
+from .. import shares
+from .. import bandwidth
 
 
 router = APIRouter()
@@ -16,18 +19,34 @@ def admin_summary() -> Dict[str, int]:
 
 @router.get("/admin/shares")
 def admin_list_shares() -> List[dict]:
-	rows = query_all("SELECT token, root, readonly, allow_download, allow_edit, expires_at FROM shares ORDER BY rowid DESC")
+	rows = query_all("SELECT token, root, readonly, allow_download, allow_edit, expires_at, rate_limit_kbps FROM shares ORDER BY rowid DESC")
 	# normalize booleans
 	for r in rows:
 		r["readonly"] = bool(r.get("readonly", 0))
 		r["allow_download"] = bool(r.get("allow_download", 0))
 		r["allow_edit"] = bool(r.get("allow_edit", 0))
+		# live download figures (throughput_bps, active_streams, bytes_sent)
+		r.update(bandwidth.share_stats(r["token"]))
 	return rows
 
 
+class ShareRateBody(BaseModel):
+	token: str
+	rate_limit_kbps: Optional[int] = Field(None, ge=0)  # None/0 => default
+
+
+@router.post("/admin/shares/rate_limit")
+def admin_set_share_rate(body: ShareRateBody):
+	if not execute("UPDATE shares SET rate_limit_kbps = ? WHERE token = ?", (body.rate_limit_kbps or None, body.token)):
+		raise HTTPException(status_code=404, detail="Share not found")
+	shares.invalidate(body.token)
+	return {"ok": True}
+
+
 @router.delete("/admin/shares")
 def admin_delete_share(token: str):
-	execute("DELETE FROM shares WHERE token = ?", (token,))
+	shares.delete_share(token)
+	bandwidth.forget(token)
 	return {"ok": True}
 
 
@@ -45,12 +64,8 @@ def admin_delete_pin(id: int):
 
 @router.post("/admin/shares/cleanup")
 def admin_cleanup_shares() -> Dict[str, int]:
-    # Remove expired shares only
-    expired = query_all("SELECT token FROM shares WHERE expires_at IS NOT NULL AND expires_at < strftime('%s','now')")
-    count_expired = len(expired)
-    for r in expired:
-        execute("DELETE FROM shares WHERE token = ?", (r["token"],))
-    return {"expired": count_expired}
+    # Remove expired shares only (the background sweeper does the same periodically)
+    return {"expired": shares.delete_expired()}
 
 
 
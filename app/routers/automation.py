@@ -1,19 +1,17 @@
 import asyncio
-import os
-import uuid
 import datetime
-import traceback
-import subprocess
+import os
 from typing import List, Optional, Dict
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 
 router = APIRouter()
 
-SCRIPTS_DIR = os.path.join(os.getcwd(), "server_scripts")
-os.makedirs(SCRIPTS_DIR, exist_ok=True)
-
-from ..db import execute, query_all, query_one
+from ..db import query_all, query_one, aquery_one
+from ..config import settings
+from ..auth import SESSION_COOKIE
+from .. import job_logs, job_runner
+from ..job_scheduler import SCRIPTS_DIR, SCRIPT_EXTENSIONS, ACTIVE_STATES, scheduler, script_options
 
 class ScriptMetadata(BaseModel):
     name: str
@@ -21,15 +19,34 @@ class ScriptMetadata(BaseModel):
     description: str = ""
     color: str = "blue"  # blue, red, green, yellow, gray
     type: str  # ps1, bat, py
+    schedule: Optional[str] = None  # cron expression from @Schedule
 
-class JobInfo(BaseModel):
+class JobSummary(BaseModel):
     id: str
     script: str
-    status: str  # running, success, failed
+    status: str  # queued, running, success, failed, cancelled, timeout
     start_time: str
     end_time: Optional[str] = None
     exit_code: Optional[int] = None
-    log: str = ""
+    trigger: Optional[str] = None  # manual, schedule
+    log_chars: int = 0  # length of the stored log; fetch it with /automation/jobs/{id}/log
+    log_pruned: bool = False  # log removed by the retention policy
+    # Resource usage, filled in when the job finishes
+    wall_s: Optional[float] = None
+    queue_s: Optional[float] = None
+    cpu_user_s: Optional[float] = None
+    cpu_system_s: Optional[float] = None
+    peak_rss: Optional[int] = None
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+
+class JobInfo(JobSummary):
+    log: str = ""  # the last LOG_TAIL_CHARS of the log
+    log_offset: int = 0  # offset of `log` within the whole log
+
+# Everything but the log, for listings
+_SUMMARY_COLUMNS = ", ".join(JobSummary.model_fields)
+LOG_TAIL_CHARS = 64 * 1024
 
 def _parse_metadata(path: str, filename: str) -> ScriptMetadata:
     """Read first few lines of file to find @Title, @Description, @Color."""
@@ -54,101 +71,165 @@ def _parse_metadata(path: str, filename: str) -> ScriptMetadata:
         pass
 
     ext = filename.split(".")[-1].lower()
-    return ScriptMetadata(name=title, filename=filename, description=desc, color=color, type=ext)
+    return ScriptMetadata(
+        name=title, filename=filename, description=desc, color=color, type=ext,
+        schedule=script_options(filename)["schedule"]
+    )
 
 @router.get("/automation/scripts", response_model=List[ScriptMetadata])
 def list_scripts():
     scripts = []
-    if not os.path.exists(SCRIPTS_DIR):
-        return []
+    os.makedirs(SCRIPTS_DIR, exist_ok=True)
         
     for f in os.listdir(SCRIPTS_DIR):
-        if f.lower().endswith(('.bat', '.ps1', '.py', '.cmd')):
+        if f.lower().endswith(SCRIPT_EXTENSIONS):
             full_path = os.path.join(SCRIPTS_DIR, f)
             scripts.append(_parse_metadata(full_path, f))
     return scripts
 
-async def _run_script_task(job_id: str, filename: str):
-    """Async background task to run the script and capture output."""
-    script_path = os.path.join(SCRIPTS_DIR, filename)
-    
-    cmd = []
-    if filename.endswith(".ps1"):
-        cmd = ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-File", script_path]
-    elif filename.endswith(".py"):
-        import sys
-        cmd = [sys.executable, script_path] 
-    elif filename.endswith((".bat", ".cmd")):
-         cmd = ["cmd", "/c", script_path]
-    
-    def run_sync():
-        return subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            errors="replace"
-        )
-
-    exit_code = -1
-    log_output = ""
-    status = "failed"
-    end_time = datetime.datetime.now().isoformat()
-
-    try:
-        loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(None, run_sync)
-        
-        exit_code = result.returncode
-        log_output = result.stdout or ""
-        status = "success" if result.returncode == 0 else "failed"
-        
-    except Exception as e:
-        log_output = f"Internal Error: {str(e)}\nTraceback:\n{traceback.format_exc()}"
-        status = "failed"
-    
-    end_time = datetime.datetime.now().isoformat()
-    
-    # Update DB
-    execute(
-        "UPDATE jobs SET status=?, end_time=?, exit_code=?, log=? WHERE id=?",
-        (status, end_time, exit_code, log_output, job_id)
-    )
-
 @router.post("/automation/run/{filename}")
-async def run_script(filename: str, background_tasks: BackgroundTasks):
+async def run_script(filename: str, priority: Optional[int] = None):
+    """Queue a run; the scheduler starts it when the concurrency limits allow."""
     path = os.path.join(SCRIPTS_DIR, filename)
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Script not found")
-        
-    job_id = str(uuid.uuid4())
-    start_time = datetime.datetime.now().isoformat()
-    
-    # Insert initial job record
-    execute(
-        "INSERT INTO jobs(id, script, status, start_time, log) VALUES(?,?,?,?,?)",
-        (job_id, filename, "running", start_time, "Job queued...\n")
+    job_id = await scheduler.enqueue(filename, priority=priority)
+    return {"ok": True, "job_id": job_id, "status": "queued"}
+
+@router.post("/automation/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued job, or kill a running one with its whole process tree."""
+    if not await scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return {"ok": True}
+
+@router.get("/automation/scheduler")
+def scheduler_status():
+    queued = query_all(
+        "SELECT id, script, priority, queued_at FROM jobs WHERE status='queued' ORDER BY priority DESC, queued_at ASC"
     )
-    
-    # Run in background
-    background_tasks.add_task(_run_script_task, job_id, filename)
-    
-    return {"ok": True, "job_id": job_id}
+    running = query_all("SELECT id, script, start_time, owner FROM jobs WHERE status='running'")
+    return {"queued": queued, "running": running, **scheduler.stats()}
 
 @router.get("/automation/jobs/{job_id}", response_model=JobInfo)
 def get_job(job_id: str):
-    row = query_one("SELECT * FROM jobs WHERE id=?", (job_id,))
+    row = query_one(f"SELECT {_SUMMARY_COLUMNS} FROM jobs WHERE id=?", (job_id,))
     if not row:
         raise HTTPException(status_code=404, detail="Job not found")
-    return JobInfo(**row)
+    offset = max(0, row["log_chars"] - LOG_TAIL_CHARS)
+    return JobInfo(**row, log=job_logs.read_range(job_id, offset, LOG_TAIL_CHARS), log_offset=offset)
+
+@router.get("/automation/jobs/{job_id}/log")
+def get_job_log(job_id: str, offset: int = 0, limit: int = LOG_TAIL_CHARS):
+    """A range of the stored log; read on from `next` until it reaches `total`."""
+    row = query_one("SELECT status, log_chars, log_pruned FROM jobs WHERE id=?", (job_id,))
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if offset < 0:
+        offset = max(0, row["log_chars"] + offset)  # negative: from the end
+    data = job_logs.read_range(job_id, offset, limit)
+    return {
+        "offset": offset, "next": offset + len(data), "total": row["log_chars"], "data": data,
+        "pruned": bool(row["log_pruned"]), "done": row["status"] not in ACTIVE_STATES,
+    }
+
+@router.websocket("/ws/automation/jobs/{job_id}")
+async def follow_job(websocket: WebSocket, job_id: str):
+    """Live output of a job for any number of viewers.
 
-@router.get("/automation/history", response_model=List[JobInfo])
-def get_history():
-    # Return last 20 jobs, sorted new to old
-    rows = query_all("SELECT * FROM jobs ORDER BY start_time DESC LIMIT 20")
-    return [JobInfo(**r) for r in rows]
+    Messages: {"type": "output", "data"}, {"type": "truncated", "chars"} when
+    output older than the in-memory scrollback was skipped, and a final
+    {"type": "end", "status", "exit_code"}.
+    """
+    if settings.auth_enabled:
+        cookie = websocket.cookies.get(SESSION_COOKIE)
+        if cookie != "1":
+            await websocket.close(code=1008, reason="Unauthorized")
+            return
+
+    await websocket.accept()
+    try:
+        stream = job_runner.get_stream(job_id)
+        if stream is not None:
+            async for message in stream.follow():
+                await websocket.send_json(message)
+        else:
+            # Finished, or running in another worker process: follow the stored log
+            await _follow_stored_log(websocket, job_id)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+async def _follow_stored_log(websocket: WebSocket, job_id: str):
+    offset = 0
+    while True:
+        row = await aquery_one("SELECT status, exit_code, log_chars FROM jobs WHERE id=?", (job_id,))
+        if not row:
+            await websocket.send_json({"type": "error", "detail": "Job not found"})
+            return
+        while offset < row["log_chars"]:
+            data = await job_logs.aread_range(job_id, offset)
+            if not data:
+                break  # removed by retention
+            await websocket.send_json({"type": "output", "data": data})
+            offset += len(data)
+        if row["status"] not in ACTIVE_STATES:
+            await websocket.send_json({"type": "end", "status": row["status"], "exit_code": row["exit_code"]})
+            return
+        await asyncio.sleep(job_runner.FLUSH_INTERVAL)
+
+@router.get("/automation/history", response_model=List[JobSummary])
+def get_history(script: Optional[str] = None, limit: int = 20, before: Optional[str] = None):
+    # The last jobs (optionally of one script), new to old, without their logs.
+    # Pass the start_time of the last item as `before` for the next page.
+    limit = max(1, min(limit, 500))
+    where, params = [], []
+    if script:
+        where.append("script=?")
+        params.append(script)
+    if before:
+        where.append("start_time < ?")
+        params.append(before)
+    clause = ("WHERE " + " AND ".join(where)) if where else ""
+    rows = query_all(
+        f"SELECT {_SUMMARY_COLUMNS} FROM jobs {clause} ORDER BY start_time DESC LIMIT ?", (*params, limit)
+    )
+    return [JobSummary(**r) for r in rows]
+
+# start_time is ISO text, so a prefix is a calendar bucket
+_BUCKETS = {"none": "''", "day": "substr(start_time, 1, 10)", "hour": "substr(start_time, 1, 13)"}
+
+@router.get("/automation/history/stats")
+def get_history_stats(days: int = 7, bucket: str = "day", script: Optional[str] = None):
+    """Resource usage of finished jobs per script, per day/hour (or overall with bucket=none)."""
+    if bucket not in _BUCKETS:
+        raise HTTPException(status_code=400, detail="bucket must be one of: " + ", ".join(_BUCKETS))
+    since = (datetime.datetime.now() - datetime.timedelta(days=max(1, days))).isoformat()
+    where = "start_time >= ? AND status NOT IN ('queued', 'running')"
+    params: list = [since]
+    if script:
+        where += " AND script = ?"
+        params.append(script)
+    rows = query_all(
+        f"""
+        SELECT script, {_BUCKETS[bucket]} AS period,
+               COUNT(*) AS runs,
+               SUM(status = 'success') AS succeeded,
+               SUM(status IN ('failed', 'timeout')) AS failed,
+               AVG(wall_s) AS avg_wall_s, MAX(wall_s) AS max_wall_s,
+               AVG(queue_s) AS avg_queue_s, MAX(queue_s) AS max_queue_s,
+               SUM(cpu_user_s + cpu_system_s) AS cpu_s, AVG(cpu_user_s + cpu_system_s) AS avg_cpu_s,
+               MAX(peak_rss) AS max_peak_rss, AVG(peak_rss) AS avg_peak_rss,
+               SUM(read_bytes) AS read_bytes, SUM(write_bytes) AS write_bytes
+        FROM jobs WHERE {where}
+        GROUP BY script, period
+        ORDER BY period, script
+        """,
+        tuple(params)
+    )
+    return {"since": since, "bucket": bucket, "items": rows}
 
 @router.delete("/automation/jobs/{job_id}")
-def delete_job(job_id: str):
-    execute("DELETE FROM jobs WHERE id=?", (job_id,))
+async def delete_job(job_id: str):
+    await job_logs.delete([job_id])
     return {"ok": True}
@@ -1,24 +1,40 @@
 import asyncio
 import json
-import os
-from typing import Optional
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState
 
-# Try importing winpty, handle error if user hasn't installed it yet
-try:
-    from winpty import PtyProcess
-except ImportError:
-    PtyProcess = None
-
 from ..config import settings
 from ..auth import SESSION_COOKIE
+from .. import terminal
 
 router = APIRouter()
 
+@router.get("/console/sessions")
+def list_sessions():
+    return terminal.list_sessions()
+
+@router.delete("/console/sessions/{session_id}")
+async def kill_session(session_id: str):
+    if not await terminal.close_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"ok": True}
+
 @router.websocket("/ws/console")
-async def websocket_console(websocket: WebSocket):
+async def websocket_console(websocket: WebSocket, session: str = "", mode: str = "rw"):
+    """Interactive shell: PowerShell via winpty on Windows, the user's shell on a POSIX pty elsewhere.
+
+    The shell keeps running when the socket closes. `?session=<id>` reattaches
+    (replaying the scrollback) and `mode=ro` watches without typing; without a
+    session, or if its shell has exited, a new one is started (the exited
+    session's scrollback is not kept). Sessions live in the worker process
+    that created them.
+
+    Output arrives as binary frames (UTF-8 bytes, possibly split mid-character).
+    Text frames are control messages: {"type": "session", "id", "mode", "resumed"}
+    first, {"type": "error", "detail"} on failure. Input is text, plus JSON
+    {"type": "resize", "cols", "rows"} messages.
+    """
     # 1. Auth Check (Basic Cookie Check similar to HTTP endpoints)
     if settings.auth_enabled:
         cookie = websocket.cookies.get(SESSION_COOKIE)
@@ -28,75 +44,40 @@ async def websocket_console(websocket: WebSocket):
 
     await websocket.accept()
 
-    if PtyProcess is None:
-        await websocket.send_text("Error: 'pywinpty' library not found on server. Please install it: pip install pywinpty")
-        await websocket.close()
-        return
-
-    # dimensions=(rows, cols)
-    cwd = os.getcwd()
-    try:
-        # "Lối đi mới 2.0": PowerShell + Clean Registry Environment
-        # We reconstruct the environment from Windows Registry to ensure it's identical
-        # to a fresh local session, removing any Server Venv pollution.
-        env = os.environ.copy()
-        
-        # 1. Cleanup vars
-        if "VIRTUAL_ENV" in env:
-            del env["VIRTUAL_ENV"]
-        
-        # 2. Reconstruct PATH from Registry (True Cleanliness)
-        try:
-            import winreg
-            # Load System PATH
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r'SYSTEM\CurrentControlSet\Control\Session Manager\Environment') as key:
-                sys_path, _ = winreg.QueryValueEx(key, 'Path')
-            
-            # Load User PATH
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r'Environment') as key:
-                user_path, _ = winreg.QueryValueEx(key, 'Path')
-            
-            # Combine
-            full_path = f"{sys_path};{user_path}"
-            # Expand variables (like %SystemRoot%)
-            env["PATH"] = os.path.expandvars(full_path)
-        except Exception:
-            # Fallback: Just keep existing PATH if registry fails
-            pass
-
-        # 3. Spawn PowerShell (Clean ENV + CWD)
-        proc = PtyProcess.spawn("powershell.exe -NoLogo", cwd=cwd, env=env, dimensions=(24, 80))
-    except Exception as e:
-        await websocket.send_text(f"Error spawning process: {str(e)}")
-        await websocket.close()
-        return
-
-    # Helper to set UTF-8 mode for cmd (optional but recommended for visual artifacts)
-    try:
-        proc.write("chcp 65001\r\n")
-        # Clear the initial output artifacts from chcp if possible, 
-        # but usually it just shows up in the terminal, which is fine.
-    except:
-        pass
+    writable = mode != "ro"
+    term = terminal.get_session(session) if session else None
+    resumed = term is not None
+    if term is None:
+        ok, error = terminal.available()
+        if ok and not writable:
+            ok, error = False, "Console session not found"
+        if ok:
+            try:
+                owner = websocket.client.host if websocket.client else "local"
+                term = terminal.create_session(owner, rows=24, cols=80)
+            except terminal.SessionLimitError as e:
+                ok, error = False, str(e)
+            except Exception as e:
+                ok, error = False, f"Error spawning process: {str(e)}"
+        if not ok:
+            await websocket.send_json({"type": "error", "detail": error})
+            await websocket.close()
+            return
 
-    loop = asyncio.get_event_loop()
+    viewer = term.attach(writable)
+    await websocket.send_json({"type": "session", "id": term.id, "mode": "rw" if writable else "ro", "resumed": resumed})
 
     async def read_from_pty():
-        """Reads from PTY in a separate thread to avoid blocking event loop."""
-        while proc.isalive():
-            try:
-                # pty.read is blocking, so run in executor
-                output = await loop.run_in_executor(None, proc.read, 1024)
-                if not output:
-                    break
+        """Sends coalesced output; awaiting each send slows the reader when the client lags."""
+        try:
+            async for frame in viewer.frames():
                 # Check WS state before sending
-                if websocket.client_state == WebSocketState.CONNECTED:
-                    await websocket.send_text(output)
-                else:
-                    break
-            except Exception:
-                break
-        # If PTY dies, close WS
+                if websocket.client_state != WebSocketState.CONNECTED:
+                    return
+                await websocket.send_bytes(frame)
+        except Exception:
+            return
+        # If the shell exited, close WS
         if websocket.client_state == WebSocketState.CONNECTED:
             await websocket.close()
 
@@ -105,6 +86,8 @@ async def websocket_console(websocket: WebSocket):
         try:
             while True:
                 data = await websocket.receive_text()
+                if not writable:
+                    continue
                 # Check if it's a resize command (JSON) or raw input
                 # We assume resize commands are JSON starting with {
                 if data.startswith("{"):
@@ -113,20 +96,20 @@ async def websocket_console(websocket: WebSocket):
                         if cmd.get("type") == "resize":
                             cols = cmd.get("cols", 80)
                             rows = cmd.get("rows", 24)
-                            proc.setwinsize(rows, cols)
+                            term.resize(rows, cols)
                             continue
                     except json.JSONDecodeError:
                         pass # Not JSON, treat as raw input
                 
                 # Write raw input to PTY
-                proc.write(data)
+                term.write(data)
         except WebSocketDisconnect:
             pass
         except Exception:
             pass
 
     # 3. Run both loops concurrently
-    # logic: if either task finishes (WS disconnects OR PTY dies), we terminate everything.
+    # logic: if either task finishes (WS disconnects OR PTY dies), we stop watching.
     read_task = asyncio.create_task(read_from_pty())
     write_task = asyncio.create_task(write_to_pty())
 
@@ -135,9 +118,9 @@ async def websocket_console(websocket: WebSocket):
         return_when=asyncio.FIRST_COMPLETED,
     )
 
-    # 4. Cleanup
+    # 4. Cleanup: the shell keeps running for the next attach (see terminal.reap)
     for task in pending:
         task.cancel() 
-    
-    # Kill the process forcefully to prevent zombie cmd.exe processes
-    proc.terminate()
+    term.detach(viewer)
+    if not term.alive and not term.viewers:
+        await terminal.close_session(term.id)
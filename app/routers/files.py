@@ -4,16 +4,17 @@ import tempfile
 import zipfile
 import secrets
 import io
+import json
 from typing import Dict, Generator, Tuple
 from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request
-from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 
 from ..path_utils import resolve_path
-from ..db import query_all, execute, query_one
+from ..db import query_all, query_one, execute, submit
 import hashlib
 from ..config import settings
 import stat as _stat
@@ -22,15 +23,32 @@ import asyncio
 from ..config import settings
 import stat as _stat
 from .. import image_utils
-import aiofiles
+from .. import text_window
+from .. import binary_view
+from .. import file_cache
+from .. import shares
+from .. import bandwidth
+from .. import zip_cache
+from .. import listing
+from urllib.parse import quote
+from starlette.concurrency import iterate_in_threadpool
+import mimetypes
+from email.utils import formatdate
+from concurrent.futures import ThreadPoolExecutor
+from ..startup import lazy_module
+
+# Heavy / optional dependencies are imported on first use
+aiofiles = lazy_module("aiofiles")
 
 # --- Constants & Config ---
 SEARCH_BLACKLIST = {
     "node_modules", ".git", "venv", ".venv", "__pycache__", 
     "$RECYCLE.BIN", "System Volume Information", ".idea", ".vscode"
 }
+# Created by the thumbnail worker when it writes the first thumbnail
 THUMB_CACHE_DIR = os.path.join(tempfile.gettempdir(), "rfe_thumbs")
-os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+# Directory scans for /tree run in parallel (slow network drives / large folders)
+_TREE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rfe-tree")
 
 router = APIRouter()
 
@@ -55,15 +73,16 @@ async def get_thumbnail(path: str):
     if os.path.exists(cache_path):
         return FileResponse(cache_path)
     
-    # If no pool initialized (e.g. startup failed or dev mode), fallback to raw
-    if not image_utils.process_pool:
+    # Pool is started on the first thumbnail; if that failed, fallback to raw
+    pool = image_utils.get_pool()
+    if pool is None:
         return FileResponse(abs_path)
 
     # Offload to worker process
     loop = asyncio.get_running_loop()
     # run_in_executor(executor, func, *args)
     success = await loop.run_in_executor(
-        image_utils.process_pool,
+        pool,
         image_utils.cpu_bound_generate_thumb,
         abs_path,
         cache_path
@@ -201,43 +220,144 @@ class Entry(BaseModel):
 	is_dir: bool
 	size: int
 	modified: float  # epoch seconds
-# In-memory undo store: token -> inverse operation data
-_UNDO_STORE: Dict[str, dict] = {}
+# Undo tokens live in SQLite (table `undo`) so any worker can redeem them
+UNDO_TTL = 24 * 3600
 # Shares will be persisted in SQLite; keep a tiny read-through cache if needed (not required now)
 
 
 
 @router.get("/list", response_model=List[Entry])
-def list_dir(path: str = Query(""), only_dirs: bool = False):
+def list_dir(path: str = Query(""), only_dirs: bool = False, compact: bool = False):
+	"""Directory entries; `compact=true` returns the columnar format (see listing.columns_response)."""
 	allowed, abs_dir = resolve_path(path or ".")
 	if not allowed:
 		raise HTTPException(status_code=403, detail="Path not allowed")
 	if not os.path.isdir(abs_dir):
 		raise HTTPException(status_code=404, detail="Directory not found")
-	entries: List[Entry] = []
+	try:
+		rows = listing.scan_dir(abs_dir, only_dirs)
+	except PermissionError:
+		raise HTTPException(status_code=403, detail="Access denied: insufficient permissions to read this directory")
+	if compact:
+		return listing.columns_response(abs_dir, rows)
+	return listing.entry_dicts(rows)
+
+
+def _tree_node(abs_dir: str, name: Optional[str] = None, modified: float = 0.0) -> dict:
+	return {
+		"name": name if name is not None else (os.path.basename(abs_dir.rstrip("/\\")) or abs_dir),
+		"path": abs_dir,
+		"is_dir": True,
+		"size": 0,
+		"modified": modified,
+		"children": None,  # None = not loaded, [] = no subdirectories
+	}
+
+
+def _scan_subdirs(abs_dir: str) -> List[dict]:
+	nodes = []
 	try:
 		with os.scandir(abs_dir) as it:
 			for entry in it:
 				try:
-					# If only_dirs requested, skip files early
-					if only_dirs and not entry.is_dir(follow_symlinks=False):
+					if not entry.is_dir(follow_symlinks=False):
 						continue
-
-					stat = entry.stat(follow_symlinks=False)
+					mtime = float(entry.stat(follow_symlinks=False).st_mtime)
 				except Exception:
 					continue
-				entries.append(
-					Entry(
-						name=entry.name,
-						path=os.path.join(abs_dir, entry.name),
-						is_dir=entry.is_dir(follow_symlinks=False),
-						size=0 if entry.is_dir(follow_symlinks=False) else int(stat.st_size),
-						modified=float(stat.st_mtime),
-					)
-				)
-	except PermissionError:
-		raise HTTPException(status_code=403, detail="Access denied: insufficient permissions to read this directory")
-	return sorted(entries, key=lambda e: (not e.is_dir, e.name.lower()))
+				nodes.append(_tree_node(os.path.join(abs_dir, entry.name), entry.name, mtime))
+	except OSError:
+		return []
+	nodes.sort(key=lambda n: n["name"].lower())
+	return nodes
+
+
+@router.get("/tree")
+def dir_tree(
+	path: str,
+	depth: int = Query(1, ge=0, le=10),
+	expand_to: Optional[str] = None,
+	max_nodes: int = Query(5000, ge=1, le=50000),
+):
+	"""Subdirectory tree in one round trip.
+
+	Returns `depth` levels of subdirectories under `path`. With `expand_to`,
+	every directory on the chain from `path` down to `expand_to` is listed
+	(siblings included) and `depth` levels are expanded below `expand_to`.
+	Nodes whose `children` is null were not loaded. At `max_nodes` the tree is
+	cut: `truncated` is set on the result and on every node whose children
+	were cut short.
+	"""
+	allowed, abs_root = resolve_path(path)
+	if not allowed:
+		raise HTTPException(status_code=403, detail="Path not allowed")
+	if not os.path.isdir(abs_root):
+		raise HTTPException(status_code=404, detail="Directory not found")
+
+	chain: List[str] = []
+	if expand_to:
+		allowed, abs_target = resolve_path(expand_to)
+		if not allowed:
+			raise HTTPException(status_code=403, detail="Path not allowed")
+		root_norm = os.path.normcase(os.path.normpath(abs_root)).rstrip(os.sep)
+		target_norm = os.path.normcase(os.path.normpath(abs_target))
+		if target_norm != root_norm and not target_norm.startswith(root_norm + os.sep):
+			raise HTTPException(status_code=400, detail="expand_to must be inside path")
+		rel = os.path.relpath(abs_target, abs_root)
+		parts = [] if rel == "." else rel.split(os.sep)
+		for i in range(1, len(parts) + 1):
+			chain.append(os.path.join(abs_root, *parts[:i]))
+
+	root = _tree_node(abs_root, modified=float(os.stat(abs_root).st_mtime))
+	count = 0
+	truncated = False
+
+	def attach(node: dict, children: List[dict], keep: Optional[dict] = None) -> None:
+		"""Give `node` as many children as the budget allows; `keep` is never cut."""
+		nonlocal count, truncated
+		room = max_nodes - count
+		if children and room <= 0 and keep is None:
+			truncated = True
+			return
+		if len(children) > room:
+			cut = children[:room]
+			if keep is not None and keep not in cut:
+				cut = sorted(children[:max(0, room - 1)] + [keep], key=lambda n: n["name"].lower())
+			children = cut
+			truncated = True
+			node["truncated"] = True
+		node["children"] = children
+		count += len(children)
+
+	# Chain: list root and every ancestor of expand_to in parallel, then link them.
+	# The chain shares the max_nodes budget, but the next directory on it is
+	# always kept (so at most one node per level over budget) to reach expand_to.
+	anchor = root
+	if chain:
+		listings = list(_TREE_POOL.map(_scan_subdirs, [abs_root] + chain[:-1]))
+		for entries, next_dir in zip(listings, chain):
+			next_name = os.path.normcase(os.path.basename(next_dir))
+			found = next((n for n in entries if os.path.normcase(n["name"]) == next_name), None)
+			if found is None:
+				raise HTTPException(status_code=404, detail="Directory not found")
+			attach(anchor, entries, keep=found)
+			anchor = found
+
+	# Expand `depth` levels below the anchor, one parallel batch per level
+	level = [anchor]
+	for _ in range(depth):
+		if not level or truncated:
+			break
+		listings = list(_TREE_POOL.map(_scan_subdirs, [n["path"] for n in level]))
+		next_level: List[dict] = []
+		for node, entries in zip(level, listings):
+			if truncated:
+				break
+			attach(node, entries)
+			next_level.extend(node["children"] or [])
+		level = next_level
+
+	return {"root": root, "nodes": count, "truncated": truncated}
 
 
 @router.get("/roots", response_model=List[str])
@@ -261,20 +381,29 @@ def get_file(path: str):
 
 
 @router.get("/open")
-def open_inline(path: str):
+def open_inline(path: str, request: Request):
 	"""Open file inline in browser (no attachment filename header)."""
 	allowed, abs_file = resolve_path(path)
 	if not allowed:
 		raise HTTPException(status_code=403, detail="Path not allowed")
-	if not os.path.isfile(abs_file):
+	try:
+		cached = file_cache.hot_files.get(abs_file)
+	except FileNotFoundError:
 		raise HTTPException(status_code=404, detail="File not found")
-	return FileResponse(abs_file)
+	if cached is None:
+		return FileResponse(abs_file)
+	headers = {"ETag": cached.etag, "Cache-Control": "no-cache", "Last-Modified": formatdate(cached.mtime, usegmt=True)}
+	if _etag_not_modified(request, cached.etag):
+		return Response(status_code=304, headers=headers)
+	media_type = mimetypes.guess_type(abs_file)[0] or "text/plain"
+	return Response(cached.data, media_type=media_type, headers=headers)
 
 
 class SearchBody(BaseModel):
 	path: str
 	query: str
 	max_depth: int = 5
+	compact: bool = False  # columnar response (see listing.columns_response)
 
 
 @router.post("/search", response_model=List[Entry])
@@ -285,7 +414,7 @@ def search_files(body: SearchBody):
 	if not os.path.isdir(abs_path):
 		raise HTTPException(status_code=404, detail="Directory not found")
 
-	results: List[Entry] = []
+	results: List[listing.Row] = []
 	query_lower = body.query.lower()
 	max_count = 500  # Hard limit to prevent payload explosion
 	
@@ -309,17 +438,11 @@ def search_files(body: SearchBody):
 				full_path = os.path.join(root, fname)
 				try:
 					stat = os.stat(full_path)
-					results.append(Entry(
-						name=fname,
-						path=full_path,
-						is_dir=False,
-						size=int(stat.st_size),
-						modified=float(stat.st_mtime)
-					))
+					results.append(listing.Row(root, fname, False, int(stat.st_size), float(stat.st_mtime)))
 				except Exception:
 					continue
 				if len(results) >= max_count:
-					return results
+					return _search_response(abs_path, results, body.compact, sort=False)
 		
 		# Check folders (optional, if we want to return matching folders too)
 		for dname in dirs:
@@ -327,23 +450,45 @@ def search_files(body: SearchBody):
 				full_path = os.path.join(root, dname)
 				try:
 					stat = os.stat(full_path)
-					results.append(Entry(
-						name=dname,
-						path=full_path,
-						is_dir=True,
-						size=0,
-						modified=float(stat.st_mtime)
-					))
+					results.append(listing.Row(root, dname, True, 0, float(stat.st_mtime)))
 				except Exception:
 					continue
 				if len(results) >= max_count:
-					return results
+					return _search_response(abs_path, results, body.compact, sort=False)
 
-	return sorted(results, key=lambda e: (not e.is_dir, e.name.lower()))
+	return _search_response(abs_path, results, body.compact, sort=True)
+
+
+def _search_response(base: str, rows: List[listing.Row], compact: bool, sort: bool):
+	# Truncated results keep discovery order, as before
+	if sort:
+		listing.sort_rows(rows)
+	if compact:
+		return listing.columns_response(base, rows)
+	return listing.entry_dicts(rows)
+
+
+def _zip_response(request: Request, files_to_zip: List[Tuple[str, str]], compression: int, filename: str, shaper=None):
+	"""Serve an archive from the ZIP artifact cache, building and caching it on a miss.
+
+	shaper: optional wrapper for the async chunk stream (share bandwidth shaping).
+	"""
+	key = zip_cache.fingerprint(files_to_zip, compression)
+	headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+	cached = zip_cache.cached_path(key)
+	if cached is not None:
+		try:
+			return _ranged_file_response(request, cached, "application/zip", headers, shaper)
+		except FileNotFoundError:
+			pass  # evicted in between, rebuild
+	chunks = zip_cache.tee(key, generate_zip_stream(files_to_zip, compression=compression))
+	if shaper is not None:
+		chunks = shaper(iterate_in_threadpool(chunks))
+	return StreamingResponse(chunks, media_type="application/zip", headers=headers)
 
 
 @router.get("/zip")
-def download_zip(path: str, fast: bool = False):
+def download_zip(path: str, request: Request, fast: bool = False):
 	"""Zip a folder (or single file) and stream as ZIP download."""
 	allowed, abs_path = resolve_path(path)
 	if not allowed:
@@ -356,12 +501,7 @@ def download_zip(path: str, fast: bool = False):
 	
 	compression = zipfile.ZIP_STORED if fast else zipfile.ZIP_DEFLATED
 	
-	response = StreamingResponse(
-		generate_zip_stream(files_to_zip, compression=compression),
-		media_type="application/zip"
-	)
-	response.headers["Content-Disposition"] = f'attachment; filename="{basename}.zip"'
-	return response
+	return _zip_response(request, files_to_zip, compression, f"{basename}.zip")
 
 
 class MultipleZipBody(BaseModel):
@@ -370,7 +510,7 @@ class MultipleZipBody(BaseModel):
 
 
 @router.post("/zip/multiple")
-def download_multiple_zip(body: MultipleZipBody):
+def download_multiple_zip(body: MultipleZipBody, request: Request):
 	"""Zip multiple files/folders and stream as ZIP download."""
 	if not body.paths:
 		raise HTTPException(status_code=400, detail="No paths provided")
@@ -391,12 +531,7 @@ def download_multiple_zip(body: MultipleZipBody):
 	
 	compression = zipfile.ZIP_STORED if body.fast else zipfile.ZIP_DEFLATED
 
-	response = StreamingResponse(
-		generate_zip_stream(files_to_zip, compression=compression),
-		media_type="application/zip"
-	)
-	response.headers["Content-Disposition"] = 'attachment; filename="selected_files.zip"'
-	return response
+	return _zip_response(request, files_to_zip, compression, "selected_files.zip")
 
 
 from fastapi import Form
@@ -534,18 +669,27 @@ def move_path(body: MoveBody):
 	shutil.move(abs_src, target)
 	# Register undo token to move back
 	token = secrets.token_urlsafe(16)
-	_UNDO_STORE[token] = {"type": "move", "src": target, "dst": abs_src}
+	_register_undo(token, {"type": "move", "src": target, "dst": abs_src})
 	return {"ok": True, "path": target, "undo_token": token}
 
 
 class UndoBody(BaseModel):
 	token: str
+
+
+class LineEdit(BaseModel):
+	start_line: int = Field(ge=0)  # first replaced line (0-based)
+	end_line: int = Field(ge=0)  # exclusive; equal to start_line for a pure insert
+	text: str  # replacement, including its own line terminators
+
+
 class ShareCreateBody(BaseModel):
     path: str
     readonly: bool = True
     allow_download: bool = True
     allow_edit: bool = False
     expires_hours: Optional[float] = None  # None => no expiry
+    rate_limit_kbps: Optional[int] = Field(None, ge=0)  # per-share download cap, None/0 => default
 
 
 @router.post("/share/create")
@@ -561,7 +705,7 @@ def create_share_link(body: ShareCreateBody, request: Request):
 		expires_at = (datetime.utcnow().timestamp() + float(body.expires_hours) * 3600.0)
 	# persist share
 	execute(
-		"INSERT INTO shares(token, root, readonly, allow_download, allow_edit, expires_at) VALUES(?,?,?,?,?,?)",
+		"INSERT INTO shares(token, root, readonly, allow_download, allow_edit, expires_at, rate_limit_kbps) VALUES(?,?,?,?,?,?,?)",
 		(
 			token,
 			abs_path,
@@ -569,22 +713,30 @@ def create_share_link(body: ShareCreateBody, request: Request):
 			1 if bool(body.allow_download) else 0,
 			1 if bool(body.allow_edit) else 0,
 			expires_at,
+			body.rate_limit_kbps or None,
 		),
 	)
+	shares.invalidate(token)
 	base = str(request.base_url).rstrip("/")
 	share_url = f"{base}/shared.html?token={token}"
 	return {"ok": True, "token": token, "url": share_url, "expires_at": expires_at}
 
 
-def _get_share_or_410(token: str) -> dict:
-	share = query_one("SELECT * FROM shares WHERE token = ?", (token,))
-	if not share:
+def _get_share_entry(token: str) -> Tuple[dict, str]:
+	"""Cached (share row, normalized real root); 404 if unknown, 410 if expired."""
+	cached = shares.get_share(token)
+	if cached is None:
 		raise HTTPException(status_code=404, detail="Share not found")
+	share, root_real = cached
 	expires_at = share.get("expires_at")
-	if expires_at is not None and datetime.utcnow().timestamp() > float(expires_at):
-		execute("DELETE FROM shares WHERE token = ?", (token,))
+	if expires_at is not None and shares.now() > float(expires_at):
+		shares.delete_share(token)
 		raise HTTPException(status_code=410, detail="Share expired")
-	return share
+	return share, root_real
+
+
+def _get_share_or_410(token: str) -> dict:
+	return _get_share_entry(token)[0]
 
 
 def _verify_password_or_401(share: dict, supplied_password):
@@ -596,7 +748,7 @@ def _touch_access(token: str) -> None:
 
 
 def _resolve_share_path(token: str, rel_path: str, password: Optional[str] = None) -> str:
-    share = _get_share_or_410(token)
+    share, base_norm = _get_share_entry(token)
     _verify_password_or_401(share, password)
     base = share["root"]
     # Reject absolute rel paths to avoid base being ignored by join
@@ -605,36 +757,23 @@ def _resolve_share_path(token: str, rel_path: str, password: Optional[str] = Non
     # Use realpath to resolve symlinks where supported
     target = os.path.realpath(os.path.join(base, rel_path or "."))
     # Normalize for comparison: path, case (Windows), and ensure separator boundary
-    base_norm = os.path.normcase(os.path.normpath(os.path.realpath(base)))
+    # (base_norm is the cached realpath of the share root)
     target_norm = os.path.normcase(os.path.normpath(target))
-    if not (target_norm == base_norm or target_norm.startswith(base_norm + os.sep)):
+    if not (target_norm == base_norm or target_norm.startswith(base_norm.rstrip(os.sep) + os.sep)):
         raise HTTPException(status_code=403, detail="Path outside share")
     _touch_access(token)
     return target
 
 
 @router.get("/share/list", response_model=List[Entry])
-def share_list(token: str, path: str = ""):
+def share_list(token: str, path: str = "", compact: bool = False):
 	abs_target = _resolve_share_path(token, path)
 	if not os.path.isdir(abs_target):
 		raise HTTPException(status_code=404, detail="Directory not found")
-	entries: List[Entry] = []
-	with os.scandir(abs_target) as it:
-		for entry in it:
-			try:
-				stat = entry.stat(follow_symlinks=False)
-			except Exception:
-				continue
-			entries.append(
-				Entry(
-					name=entry.name,
-					path=os.path.join(abs_target, entry.name),
-					is_dir=entry.is_dir(follow_symlinks=False),
-					size=0 if entry.is_dir(follow_symlinks=False) else int(stat.st_size),
-					modified=float(stat.st_mtime),
-				)
-			)
-	return sorted(entries, key=lambda e: (not e.is_dir, e.name.lower()))
+	rows = listing.scan_dir(abs_target)
+	if compact:
+		return listing.columns_response(abs_target, rows)
+	return listing.entry_dicts(rows)
 
 
 @router.get("/share/file")
@@ -645,45 +784,184 @@ def share_file(token: str, path: str, download: bool = False):
 		raise HTTPException(status_code=404, detail="File not found")
 	if download and not bool(share.get("allow_download")):
 		raise HTTPException(status_code=403, detail="Download not allowed")
-	filename = os.path.basename(abs_file)
-	return FileResponse(abs_file, filename=filename if download else None)
+	st = os.stat(abs_file)
+	headers = {"Content-Length": str(st.st_size), "Last-Modified": formatdate(st.st_mtime, usegmt=True)}
+	if download:
+		headers["Content-Disposition"] = _attachment_header(os.path.basename(abs_file))
+	media_type = mimetypes.guess_type(abs_file)[0] or "text/plain"
+	# Streamed through the shaper (per-share limit, global egress cap, fair scheduling)
+	chunks = bandwidth.shape(token, share.get("rate_limit_kbps"), _aiter_file(abs_file))
+	return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+async def _aiter_file(abs_path: str, start: int = 0, length: Optional[int] = None, chunk_size: int = 256 * 1024):
+	async with aiofiles.open(abs_path, "rb") as f:
+		if start:
+			await f.seek(start)
+		remaining = length
+		while remaining is None or remaining > 0:
+			chunk = await f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+			if not chunk:
+				break
+			if remaining is not None:
+				remaining -= len(chunk)
+			yield chunk
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+	"""Parse a single "bytes=a-b" range. None = ignore the header (serve everything)."""
+	unit, _, spec = header.partition("=")
+	if unit.strip().lower() != "bytes" or "," in spec:
+		return None
+	first, _, last = spec.strip().partition("-")
+	try:
+		if first:
+			start = int(first)
+			end = int(last) if last else size - 1
+		else:
+			start = max(0, size - int(last))
+			end = size - 1
+	except ValueError:
+		return None
+	if start >= size or start > end:
+		raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+	return start, min(end, size - 1)
+
+
+def _ranged_file_response(request: Request, abs_path: str, media_type: str, headers: Dict[str, str], shaper=None):
+	"""Stream a file honouring a single Range header (206 / 416).
+
+	The file is opened before the headers are built and streamed from that
+	handle, so an archive evicted from the ZIP cache in between still sends
+	the body its Content-Length promised. Raises FileNotFoundError if it is
+	already gone.
+	"""
+	f = open(abs_path, "rb")
+	try:
+		size = os.fstat(f.fileno()).st_size
+		headers = dict(headers)
+		headers["Accept-Ranges"] = "bytes"
+		start, end, status = 0, size - 1, 200
+		rng = request.headers.get("range")
+		parsed = _parse_range(rng, size) if rng else None
+		if parsed is not None:
+			start, end = parsed
+			status = 206
+			headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+		headers["Content-Length"] = str(end - start + 1)
+	except BaseException:
+		f.close()
+		raise
+	chunks = iterate_in_threadpool(_iter_open_file(f, start, end - start + 1))
+	if shaper is not None:
+		chunks = shaper(chunks)
+	return StreamingResponse(chunks, status_code=status, media_type=media_type, headers=headers)
+
+
+def _iter_open_file(f, start: int, length: int, chunk_size: int = 256 * 1024) -> Generator[bytes, None, None]:
+	"""Read [start, start + length) of an open file in chunks, then close it."""
+	with f:
+		f.seek(start)
+		while length > 0:
+			chunk = f.read(min(chunk_size, length))
+			if not chunk:
+				break
+			length -= len(chunk)
+			yield chunk
+
+
+def _attachment_header(filename: str) -> str:
+	# Same encoding rules as FileResponse(filename=...)
+	quoted = quote(filename)
+	if quoted != filename:
+		return f"attachment; filename*=utf-8''{quoted}"
+	return f'attachment; filename="{filename}"'
 
 
 @router.get("/share/read", response_class=PlainTextResponse)
-def share_read(token: str, path: str):
+def share_read(token: str, path: str, request: Request):
+	abs_target = _resolve_share_path(token, path)
+	return _read_text_response(abs_target, request)
+
+
+@router.get("/share/read/window")
+def share_read_window(
+	token: str,
+	path: str,
+	start_line: int = Query(0, ge=0),
+	max_lines: int = Query(1000, ge=1, le=100000),
+	offset: Optional[int] = Query(None, ge=0),
+	length: int = Query(64 * 1024, ge=1),
+	tail: Optional[int] = Query(None, ge=1, le=100000),
+	encoding: Optional[str] = None,
+	count_lines: bool = False,
+):
+	abs_target = _resolve_share_path(token, path)
+	if not os.path.isfile(abs_target):
+		raise HTTPException(status_code=404, detail="File not found")
+	return _read_window(abs_target, start_line, max_lines, offset, length, tail, encoding, count_lines)
+
+
+@router.get("/share/binary")
+def share_binary_window(token: str, path: str, offset: int = Query(0, ge=0), length: int = Query(4096, ge=1), format: str = "raw"):
 	abs_target = _resolve_share_path(token, path)
 	if not os.path.isfile(abs_target):
 		raise HTTPException(status_code=404, detail="File not found")
-	with open(abs_target, "r", encoding="utf-8", errors="replace") as f:
-		return f.read()
+	return _binary_window(abs_target, offset, length, format)
+
+
+@router.get("/share/binary/search")
+def share_binary_search(
+	token: str,
+	path: str,
+	pattern: str,
+	mode: str = "text",
+	encoding: str = "utf-8",
+	start: int = Query(0, ge=0),
+	max_results: int = Query(100, ge=1, le=10000),
+):
+	abs_target = _resolve_share_path(token, path)
+	if not os.path.isfile(abs_target):
+		raise HTTPException(status_code=404, detail="File not found")
+	return _binary_search(abs_target, pattern, mode, encoding, start, max_results)
 
 
 class ShareSaveBody(BaseModel):
 	token: str
 	path: str
 	content: str
+	base_etag: Optional[str] = None  # reject with 412 if the file changed since this version
 
 
 @router.post("/share/save")
 def share_save(body: ShareSaveBody):
-	share = query_one("SELECT * FROM shares WHERE token = ?", (body.token,))
-	if not share:
-		raise HTTPException(status_code=404, detail="Share not found")
+	share = _get_share_or_410(body.token)
 	if not bool(share.get("allow_edit")):
 		raise HTTPException(status_code=403, detail="Edit not allowed")
 	abs_target = _resolve_share_path(body.token, body.path)
-	parent = os.path.dirname(abs_target)
-	os.makedirs(parent, exist_ok=True)
-	with open(abs_target, "w", encoding="utf-8", newline="") as f:
-		f.write(body.content)
-	return {"ok": True}
+	return _save_text(abs_target, body.content, body.base_etag)
+
+
+class SharePatchBody(BaseModel):
+	token: str
+	path: str
+	base_etag: str
+	edits: List[LineEdit]
+	encoding: Optional[str] = None
+
+
+@router.post("/share/save/patch")
+def share_save_patch(body: SharePatchBody):
+	share = _get_share_or_410(body.token)
+	if not bool(share.get("allow_edit")):
+		raise HTTPException(status_code=403, detail="Edit not allowed")
+	abs_target = _resolve_share_path(body.token, body.path)
+	return _save_patch(abs_target, body.edits, body.base_etag, body.encoding)
 
 
 @router.get("/share/info")
 def share_info(token: str):
-	share = query_one("SELECT * FROM shares WHERE token = ?", (token,))
-	if not share:
-		raise HTTPException(status_code=404, detail="Share not found")
+	share = _get_share_or_410(token)
 	return {
         "allow_edit": bool(share.get("allow_edit", 0)),
         "allow_download": bool(share.get("allow_download", 0)),
@@ -697,11 +975,9 @@ class ShareMultipleZipBody(BaseModel):
 
 
 @router.post("/share/zip/multiple")
-def share_download_multiple_zip(body: ShareMultipleZipBody):
+def share_download_multiple_zip(body: ShareMultipleZipBody, request: Request):
 	"""Zip multiple files/folders from a share and stream as ZIP download."""
-	share = query_one("SELECT * FROM shares WHERE token = ?", (body.token,))
-	if not share:
-		raise HTTPException(status_code=404, detail="Share not found")
+	share = _get_share_or_410(body.token)
 	
 	if not body.paths:
 		raise HTTPException(status_code=400, detail="No paths provided")
@@ -718,17 +994,30 @@ def share_download_multiple_zip(body: ShareMultipleZipBody):
 		# Strategy: maintain relative path from the *parent* of the selected item to avoid Deep nesting if picking deep files.
 		files_to_zip.extend(_collect_files_recursive(abs_path, root_arcname=os.path.basename(abs_path)))
 	
-	response = StreamingResponse(
-		generate_zip_stream(files_to_zip),
-		media_type="application/zip"
-	)
-	response.headers["Content-Disposition"] = 'attachment; filename="selected_files.zip"'
-	return response
+	def shaper(chunks):
+		return bandwidth.shape(body.token, share.get("rate_limit_kbps"), chunks)
+
+	return _zip_response(request, files_to_zip, zipfile.ZIP_DEFLATED, "selected_files.zip", shaper)
+
+
+def _register_undo(token: str, data: dict) -> None:
+	now_ts = datetime.utcnow().timestamp()
+	execute("INSERT INTO undo(token, data, created_at) VALUES(?,?,?)", (token, json.dumps(data), now_ts))
+	# Housekeeping rides along; no need to wait for it
+	submit("DELETE FROM undo WHERE created_at < ?", (now_ts - UNDO_TTL,))
+
+
+def _pop_undo(token: str) -> Optional[dict]:
+	row = query_one("SELECT data FROM undo WHERE token = ?", (token,))
+	# Only the request whose DELETE hits the row may act on it
+	if not row or execute("DELETE FROM undo WHERE token = ?", (token,)) != 1:
+		return None
+	return json.loads(row["data"])
 
 
 @router.post("/undo")
 def undo_action(body: UndoBody):
-	data = _UNDO_STORE.pop(body.token, None)
+	data = _pop_undo(body.token)
 	if not data:
 		raise HTTPException(status_code=404, detail="Undo token not found")
 	if data.get("type") == "move":
@@ -754,6 +1043,40 @@ def undo_action(body: UndoBody):
 class SaveBody(BaseModel):
 	path: str
 	content: str
+	base_etag: Optional[str] = None  # reject with 412 if the file changed since this version
+
+
+def _save_text(abs_path: str, content: str, base_etag: Optional[str]) -> dict:
+	parent = os.path.dirname(abs_path)
+	os.makedirs(parent, exist_ok=True)
+	try:
+		etag = text_window.write_text(abs_path, content, base_etag)
+	except text_window.VersionConflict:
+		raise HTTPException(status_code=412, detail="File was modified by someone else")
+	return {"ok": True, "etag": etag}
+
+
+def _save_patch(abs_path: str, edits: List[LineEdit], base_etag: str, encoding: Optional[str]) -> dict:
+	if not os.path.isfile(abs_path):
+		raise HTTPException(status_code=404, detail="File not found")
+	try:
+		etag = text_window.apply_line_edits(
+			abs_path,
+			[(e.start_line, e.end_line, e.text) for e in edits],
+			base_etag,
+			encoding,
+		)
+	except text_window.VersionConflict:
+		raise HTTPException(status_code=412, detail="File was modified by someone else")
+	except text_window.NotTextError:
+		raise HTTPException(status_code=415, detail="Not a text file")
+	except UnicodeEncodeError:
+		raise HTTPException(status_code=400, detail="Text cannot be encoded in the file's encoding")
+	except LookupError:
+		raise HTTPException(status_code=400, detail="Unknown encoding")
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	return {"ok": True, "etag": etag}
 
 
 @router.post("/save")
@@ -761,27 +1084,159 @@ def save_text_file(body: SaveBody):
 	allowed, abs_path = resolve_path(body.path)
 	if not allowed:
 		raise HTTPException(status_code=403, detail="Path not allowed")
-	parent = os.path.dirname(abs_path)
-	os.makedirs(parent, exist_ok=True)
-	with open(abs_path, "w", encoding="utf-8", newline="") as f:
-		f.write(body.content)
-	return {"ok": True}
+	return _save_text(abs_path, body.content, body.base_etag)
+
+
+class PatchSaveBody(BaseModel):
+	path: str
+	base_etag: str
+	edits: List[LineEdit]
+	encoding: Optional[str] = None
+
+
+@router.post("/save/patch")
+def save_text_patch(body: PatchSaveBody):
+	"""Apply line-range edits against the version identified by base_etag."""
+	allowed, abs_path = resolve_path(body.path)
+	if not allowed:
+		raise HTTPException(status_code=403, detail="Path not allowed")
+	return _save_patch(abs_path, body.edits, body.base_etag, body.encoding)
 
 
 @router.get("/read", response_class=PlainTextResponse)
-def read_text_file(path: str):
+def read_text_file(path: str, request: Request):
 	allowed, abs_path = resolve_path(path)
 	if not allowed:
 		raise HTTPException(status_code=403, detail="Path not allowed")
-	if not os.path.isfile(abs_path):
-		raise HTTPException(status_code=404, detail="File not found")
 	try:
-		with open(abs_path, "r", encoding="utf-8", errors="replace") as f:
-			return f.read()
+		return _read_text_response(abs_path, request)
 	except UnicodeDecodeError:
 		raise HTTPException(status_code=415, detail="Not a text file")
 
 
+def _etag_not_modified(request: Request, etag: str) -> bool:
+	inm = request.headers.get("if-none-match")
+	if not inm:
+		return False
+	return any(text_window.etag_matches(etag, t.strip().removeprefix("W/")) for t in inm.split(","))
+
+
+def _read_text_response(abs_path: str, request: Request) -> Response:
+	"""Whole-file text read. Small files are served from the hot-file cache and
+	revalidated with If-None-Match, so repeated polls cost a single stat."""
+	try:
+		cached = file_cache.hot_files.get(abs_path)
+	except FileNotFoundError:
+		raise HTTPException(status_code=404, detail="File not found")
+	etag = cached.etag if cached is not None else text_window.file_etag(abs_path)
+	headers = {"ETag": etag, "Cache-Control": "no-cache"}
+	if _etag_not_modified(request, etag):
+		return Response(status_code=304, headers=headers)
+	if cached is None:
+		with open(abs_path, "r", encoding="utf-8", errors="replace") as f:
+			content = f.read()
+	else:
+		# Same newline translation as the text-mode read of large files
+		content = cached.data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+	return PlainTextResponse(content, headers=headers)
+
+
+def _read_window(abs_path: str, start_line: int, max_lines: int, offset: Optional[int], length: int,
+		tail: Optional[int], encoding: Optional[str], count_lines: bool) -> dict:
+	"""Serve one window of a text file: a line range, a byte range or the last N lines."""
+	try:
+		if tail is not None:
+			result = text_window.read_tail(abs_path, tail, encoding)
+		elif offset is not None:
+			result = text_window.read_bytes(abs_path, offset, length, encoding)
+		else:
+			if count_lines:
+				text_window.get_line_index(abs_path, encoding).build()
+			result = text_window.read_lines(abs_path, start_line, max_lines, encoding)
+	except text_window.NotTextError:
+		raise HTTPException(status_code=415, detail="Not a text file")
+	except LookupError:
+		raise HTTPException(status_code=400, detail="Unknown encoding")
+	result["size"] = os.path.getsize(abs_path)
+	result["etag"] = text_window.file_etag(abs_path)
+	return result
+
+
+@router.get("/read/window")
+def read_text_window(
+	path: str,
+	start_line: int = Query(0, ge=0),
+	max_lines: int = Query(1000, ge=1, le=100000),
+	offset: Optional[int] = Query(None, ge=0),
+	length: int = Query(64 * 1024, ge=1),
+	tail: Optional[int] = Query(None, ge=1, le=100000),
+	encoding: Optional[str] = None,
+	count_lines: bool = False,
+):
+	"""Windowed read for large text files (lines N..N+max_lines, bytes or tail)."""
+	allowed, abs_path = resolve_path(path)
+	if not allowed:
+		raise HTTPException(status_code=403, detail="Path not allowed")
+	if not os.path.isfile(abs_path):
+		raise HTTPException(status_code=404, detail="File not found")
+	return _read_window(abs_path, start_line, max_lines, offset, length, tail, encoding, count_lines)
+
+
+# ---------------- Binary viewer (Normal & Share) ----------------
+
+def _binary_window(abs_path: str, offset: int, length: int, format: str):
+	if format not in ("raw", "hex"):
+		raise HTTPException(status_code=400, detail="format must be 'raw' or 'hex'")
+	data, size = binary_view.read_window(abs_path, offset, length)
+	offset = min(offset, size)
+	if format == "hex":
+		return {"offset": offset, "length": len(data), "size": size, "rows": binary_view.hex_rows(data, offset)}
+	return Response(
+		content=data,
+		media_type="application/octet-stream",
+		headers={"X-File-Size": str(size), "X-Offset": str(offset)},
+	)
+
+
+def _binary_search(abs_path: str, pattern: str, mode: str, encoding: str, start: int, max_results: int) -> dict:
+	try:
+		needle = binary_view.parse_pattern(pattern, mode, encoding)
+	except LookupError:
+		raise HTTPException(status_code=400, detail="Unknown encoding")
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	return binary_view.search(abs_path, needle, start, max_results)
+
+
+@router.get("/binary")
+def binary_window(path: str, offset: int = Query(0, ge=0), length: int = Query(4096, ge=1), format: str = "raw"):
+	"""Read-only byte window of any file (raw bytes or hex dump rows); only the window is read."""
+	allowed, abs_path = resolve_path(path)
+	if not allowed:
+		raise HTTPException(status_code=403, detail="Path not allowed")
+	if not os.path.isfile(abs_path):
+		raise HTTPException(status_code=404, detail="File not found")
+	return _binary_window(abs_path, offset, length, format)
+
+
+@router.get("/binary/search")
+def binary_search(
+	path: str,
+	pattern: str,
+	mode: str = "text",
+	encoding: str = "utf-8",
+	start: int = Query(0, ge=0),
+	max_results: int = Query(100, ge=1, le=10000),
+):
+	"""Search a file for a text or hex byte pattern; continue with start=next_offset."""
+	allowed, abs_path = resolve_path(path)
+	if not allowed:
+		raise HTTPException(status_code=403, detail="Path not allowed")
+	if not os.path.isfile(abs_path):
+		raise HTTPException(status_code=404, detail="File not found")
+	return _binary_search(abs_path, pattern, mode, encoding, start, max_results)
+
+
 # ---------------- Metadata (Normal & Share) ----------------
 
 def _build_metadata(abs_path: str) -> dict:
@@ -870,9 +1325,7 @@ class ShareUpdateMetaBody(BaseModel):
 
 @router.post("/share/update_meta")
 def share_update_meta(body: ShareUpdateMetaBody):
-	share = query_one("SELECT * FROM shares WHERE token = ?", (body.token,))
-	if not share:
-		raise HTTPException(status_code=404, detail="Share not found")
+	share = _get_share_or_410(body.token)
 	if not bool(share.get("allow_edit")):
 		raise HTTPException(status_code=403, detail="Edit not allowed")
 	abs_path = _resolve_share_path(body.token, body.path)
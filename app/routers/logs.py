@@ -1,47 +1,109 @@
 
 import asyncio
-import aiofiles
 import os
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import re
+from typing import Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from ..config import settings
+from ..auth import SESSION_COOKIE
+from ..path_utils import resolve_path
+from .. import log_search, log_tail
 
 router = APIRouter()
 
+@router.get("/logs/search")
+def search_logs(start: Optional[str] = None, end: Optional[str] = None, level: Optional[str] = None,
+                logger: Optional[str] = None, q: Optional[str] = None, regex: Optional[str] = None,
+                limit: int = 200, cursor: Optional[str] = None):
+    """Search the server log and its rotated backups, oldest first.
+
+    start/end: ISO times ("2026-10-19T03:12"), end exclusive. level: minimum
+    level. logger: name or parent name. q: case-insensitive substring and
+    regex: regular expression, both matched against the message (with its
+    traceback). Pass `next` back as `cursor` for the following page.
+    """
+    try:
+        query = log_search.Query(
+            start=log_search.normalize_time(start) if start else None,
+            end=log_search.normalize_time(end) if end else None,
+            min_level=log_tail.parse_level(level),
+            logger=logger,
+            text=q,
+            pattern=re.compile(regex) if regex else None,
+        )
+        return log_search.search(query, limit=max(1, min(limit, 2000)), cursor=cursor)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.websocket("/ws/logs")
-async def websocket_logs(websocket: WebSocket):
+async def websocket_logs(websocket: WebSocket, path: Optional[str] = None, level: Optional[str] = None,
+                         pattern: Optional[str] = None, backlog: int = 20 * 1024):
+    """Follow the server log, or any allowed file with `?path=` (tail -f).
+
+    `level` (e.g. WARNING) keeps lines at or above it, continuation lines
+    such as tracebacks included; `pattern` is a regular expression lines
+    must match. Both are applied on the server. Text frames carry batches
+    of whole lines, starting with up to `backlog` bytes of recent content.
+    """
+    if settings.auth_enabled:
+        cookie = websocket.cookies.get(SESSION_COOKIE)
+        if cookie != "1":
+            await websocket.close(code=1008, reason="Unauthorized")
+            return
+
     await websocket.accept()
-    log_file = settings.log_file
-    
-    # Send initial content (last 20KB or so to give context)
-    init_bytes = 20 * 1024
-    
+
+    if path:
+        allowed, log_file = resolve_path(path)
+        if not allowed or os.path.isdir(log_file):
+            await websocket.send_text("Error: path not allowed or not a file\n")
+            await websocket.close()
+            return
+    else:
+        log_file = os.path.abspath(settings.log_file)
+    try:
+        regex = re.compile(pattern) if pattern else None
+    except re.error as e:
+        await websocket.send_text(f"Error: invalid pattern: {e}\n")
+        await websocket.close()
+        return
+
+    sub = log_tail.Subscriber(log_tail.parse_level(level), regex)
+    tailer = await log_tail.subscribe(log_file, sub)
     try:
-        # Determine file size
         if not os.path.exists(log_file):
-             # If no log file, just keep connection open but silent until file appears
-             await websocket.send_text("Waiting for log file...")
+            # Keep the connection open; the tailer picks the file up when it appears
+            await websocket.send_text("Waiting for log file...\n")
         else:
-            file_size = os.path.getsize(log_file)
-            start_pos = max(0, file_size - init_bytes)
-            
-            async with aiofiles.open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                await f.seek(start_pos)
-                while True:
-                    line = await f.readline()
-                    if line:
-                        await websocket.send_text(line)
-                    else:
-                        # No new line, wait a bit
-                        await asyncio.sleep(0.5)
-                        # Check if file rotated or similar? For now simple tail.
-                        # Using seek to end if we just read? NO, readline at EOF returns empty string.
-                        # We just stay in loop.
-                        # Check file existence / rotation logic could be added here.
+            initial = await tailer.backlog(sub, max(0, min(backlog, 1024 * 1024)))
+            if initial:
+                await websocket.send_text(initial)
+
+        async def receive():
+            # Only to notice the client going away
+            while True:
+                await websocket.receive_text()
+
+        closed = asyncio.ensure_future(receive())
+        try:
+            while not closed.done():
+                getter = asyncio.ensure_future(sub.queue.get())
+                await asyncio.wait([getter, closed], return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                await websocket.send_text(getter.result())
+        finally:
+            closed.cancel()
     except WebSocketDisconnect:
-        print("Log client disconnected")
+        pass
     except Exception as e:
         print(f"Log stream error: {e}")
         try:
              await websocket.close()
         except:
              pass
+    finally:
+        await log_tail.unsubscribe(tailer, sub)
@@ -1,10 +1,21 @@
 import shutil
-import psutil
 import ctypes
 import os
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
+from .. import file_cache
+from .. import db
+from .. import startup
+from .. import cluster
+from .. import logging_config
+from .. import metrics_history
+from ..metrics_history import history
+
+# Imported on first use, not at boot
+psutil = startup.lazy_module("psutil")
+
 router = APIRouter()
 
 class SystemStats(BaseModel):
@@ -17,6 +28,9 @@ class SystemStats(BaseModel):
     disk_total: int
     net_sent: int
     net_recv: int
+    # Bytes per second over the last sample interval
+    net_sent_rate: float = 0.0
+    net_recv_rate: float = 0.0
     is_admin: bool
     server_pid: int
 
@@ -36,14 +50,19 @@ _CACHE_DURATION = 1.0  # Seconds. Task Manager standard is usually 1s.
 import time
 import threading
 
-# Global stats storage
+# Global stats storage (only the leader worker samples; others read kv_state)
+_STATS_KEY = "monitor.stats"
 _LATEST_STATS = None
 _MONITOR_THREAD = None
 _LOCK = threading.Lock()
 
 def _monitor_loop():
     global _LATEST_STATS
-    while True:
+    metrics_history.resume()
+    last_net = None  # (monotonic time, bytes_sent, bytes_recv)
+    last_publish = 0.0
+    # Stops when leadership moves to another worker; on_elected restarts it
+    while cluster.is_leader():
         try:
             # interval=1 means we measure usage over 1 second. 
             # This is blocking for this thread, which is fine.
@@ -60,6 +79,13 @@ def _monitor_loop():
                 disk_data = (0, 0, 0.0)
 
             net = psutil.net_io_counters()
+            now = time.monotonic()
+            sent_rate = recv_rate = 0.0
+            if last_net is not None and now > last_net[0]:
+                # max(0, ...): counters can restart (adapter reset, 32-bit wrap)
+                sent_rate = max(0, net.bytes_sent - last_net[1]) / (now - last_net[0])
+                recv_rate = max(0, net.bytes_recv - last_net[2]) / (now - last_net[0])
+            last_net = (now, net.bytes_sent, net.bytes_recv)
             
             # Update global atomically-ish
             _LATEST_STATS = SystemStats(
@@ -72,9 +98,16 @@ def _monitor_loop():
                 disk_total=disk_data[0],
                 net_sent=net.bytes_sent,
                 net_recv=net.bytes_recv,
+                net_sent_rate=round(sent_rate, 1),
+                net_recv_rate=round(recv_rate, 1),
                 is_admin=is_user_admin(),
                 server_pid=os.getpid()
             )
+            cluster.publish(_STATS_KEY, _LATEST_STATS.model_dump())
+            history.add(time.time(), (cpu, mem.percent, disk_data[2], sent_rate, recv_rate))
+            if now - last_publish >= metrics_history.PUBLISH_INTERVAL:
+                last_publish = now
+                metrics_history.publish()
             
         except Exception as e:
             print(f"Monitor thread error: {e}")
@@ -87,13 +120,19 @@ def start_monitor_if_needed():
             _MONITOR_THREAD = threading.Thread(target=_monitor_loop, daemon=True)
             _MONITOR_THREAD.start()
 
+# The leader runs the sampler from the moment it is elected
+cluster.on_elected(start_monitor_if_needed)
+
 @router.get("/monitor/stats", response_model=SystemStats)
 def get_stats():
     """Get current system resource usage from background monitor."""
-    start_monitor_if_needed()
+    latest = _LATEST_STATS
+    if not cluster.is_leader():
+        published = cluster.read(_STATS_KEY, max_age=10.0)
+        latest = SystemStats(**published) if published else None
     
     # Return latest available, or strict fallback if first run
-    if _LATEST_STATS is None:
+    if latest is None:
         # Quick fallback for first immediate call
         return SystemStats(
             cpu_percent=0.0, memory_percent=0.0, memory_used=0, memory_total=0,
@@ -102,4 +141,58 @@ def get_stats():
             server_pid=os.getpid()
         )
         
-    return _LATEST_STATS
+    return latest
+
+
+@router.get("/monitor/history")
+def get_history(
+    window: int = Query(3600, ge=10, le=366 * 86400),
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: int = Query(300, ge=1, le=5000),
+):
+    """CPU / memory / disk percentages and network rates (bytes/s) over time.
+
+    The window is [end - window, end) unless start is given (unix seconds;
+    end defaults to now). Samples are averaged into at most `points` buckets
+    of `step` seconds; `resolution` is the sampling interval they came from.
+
+    Every worker answers from the history the leader last published (see
+    metrics_history.shared), so the same request gets the same resolution
+    whichever worker serves it; the newest few seconds may be missing.
+    """
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - window
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return metrics_history.shared().query(start, end, points)
+
+
+@router.get("/monitor/cache")
+def get_cache_stats():
+    """Hit/miss statistics of the in-memory file caches."""
+    return {"hot_files": file_cache.hot_files.stats()}
+
+
+@router.get("/monitor/db")
+def get_db_stats():
+    """Per-query timings and writer batching statistics of the SQLite layer."""
+    return db.stats()
+
+
+@router.get("/monitor/logging")
+def get_logging_stats():
+    """Fill level of the logging queue and records dropped since the last notice."""
+    return logging_config.logging_stats()
+
+
+@router.get("/monitor/startup")
+def get_startup_report():
+    """Boot time, per-module import cost and which heavy dependencies are loaded."""
+    return startup.report()
+
+
+@router.get("/monitor/cluster")
+def get_cluster_info():
+    """This worker's id and which worker currently holds the leader lease."""
+    return cluster.leader_info()
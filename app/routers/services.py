@@ -1,8 +1,12 @@
-import psutil
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 
+from ..startup import lazy_module
+
+# Imported on first use, not at boot
+psutil = lazy_module("psutil")
+
 router = APIRouter()
 
 class ServiceInfo(BaseModel):
@@ -2,11 +2,13 @@ import asyncio
 import os
 import json
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from watchfiles import awatch
 
 from ..path_utils import resolve_path
 from ..config import settings
 from ..auth import SESSION_COOKIE
+from ..startup import lazy_module
+
+watchfiles = lazy_module("watchfiles")
 
 router = APIRouter()
 
@@ -27,7 +29,7 @@ async def websocket_watcher(websocket: WebSocket):
     async def watch_folder(path: str):
         try:
             # awatch is an async generator
-            async for changes in awatch(path, stop_event=stop_event):
+            async for changes in watchfiles.awatch(path, stop_event=stop_event):
                 # 'changes' is a set of (ChangeType, path_string)
                 # We just notify client that "something changed" so it can reload
                 if websocket.client_state == WebSocket.CONNECTED:
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from . import bandwidth
+from . import cluster
+from .db import execute, query_all, query_one
+
+# Share rows are re-read from SQLite at most this often per token
+CACHE_TTL = 30.0
+_MAX_ENTRIES = 1024
+SWEEP_INTERVAL = 60.0
+# Other workers signal share changes through a counter in kv_state;
+# it is polled at most this often before serving from the cache
+VERSION_CHECK_INTERVAL = 1.0
+_VERSION_KEY = "shares.version"
+
+# token -> (share row, normalized real root, loaded_at)
+_CACHE: "OrderedDict[str, Tuple[dict, str, float]]" = OrderedDict()
+_LOCK = threading.Lock()
+_SWEEPER: Optional[threading.Thread] = None
+_SEEN_VERSION = None
+_VERSION_CHECKED_AT = 0.0
+
+
+def now() -> float:
+	"""Clock used for shares.expires_at (written as utcnow().timestamp())."""
+	return datetime.utcnow().timestamp()
+
+
+def get_share(token: str) -> Optional[Tuple[dict, str]]:
+	"""Return (share row, normalized real root) for a token, or None if unknown.
+
+	Rows are cached for CACHE_TTL seconds; expiry is still checked by the caller
+	on every request against the cached expires_at.
+	"""
+	t = time.monotonic()
+	_sync_version(t)
+	with _LOCK:
+		hit = _CACHE.get(token)
+		if hit is not None and t - hit[2] < CACHE_TTL:
+			_CACHE.move_to_end(token)
+			return hit[0], hit[1]
+	share = query_one("SELECT * FROM shares WHERE token = ?", (token,))
+	if not share:
+		_forget(token)
+		return None
+	root_real = os.path.normcase(os.path.normpath(os.path.realpath(share["root"])))
+	with _LOCK:
+		_CACHE[token] = (share, root_real, t)
+		_CACHE.move_to_end(token)
+		while len(_CACHE) > _MAX_ENTRIES:
+			_CACHE.popitem(last=False)
+	return share, root_real
+
+
+def _forget(token: Optional[str]) -> None:
+	with _LOCK:
+		if token is None:
+			_CACHE.clear()
+		else:
+			_CACHE.pop(token, None)
+
+
+def _sync_version(t: float) -> None:
+	"""Drop the whole cache if another worker changed shares since the last check."""
+	global _SEEN_VERSION, _VERSION_CHECKED_AT
+	if t - _VERSION_CHECKED_AT < VERSION_CHECK_INTERVAL:
+		return
+	_VERSION_CHECKED_AT = t
+	version = cluster.read(_VERSION_KEY)
+	if version != _SEEN_VERSION:
+		_SEEN_VERSION = version
+		_forget(None)
+
+
+def invalidate(token: Optional[str] = None) -> None:
+	"""Forget one cached share, or all of them when token is None, in every worker."""
+	_forget(token)
+	cluster.bump(_VERSION_KEY)
+
+
+def delete_share(token: str) -> None:
+	execute("DELETE FROM shares WHERE token = ?", (token,))
+	invalidate(token)
+
+
+def delete_expired() -> int:
+	"""Remove every expired share in one statement (uses idx_shares_expires_at)."""
+	count = execute("DELETE FROM shares WHERE expires_at IS NOT NULL AND expires_at < ?", (now(),))
+	if count:
+		invalidate()
+	return count
+
+
+def prune_bandwidth() -> None:
+	"""Drop this worker's bandwidth state for shares that expired or were deleted."""
+	known = sorted(bandwidth.tokens())
+	live = set()
+	# Stay well below SQLite's limit on bound parameters
+	for i in range(0, len(known), 500):
+		batch = known[i:i + 500]
+		rows = query_all(
+			f"SELECT token FROM shares WHERE token IN ({','.join('?' * len(batch))}) "
+			"AND (expires_at IS NULL OR expires_at >= ?)",
+			(*batch, now()),
+		)
+		live.update(row["token"] for row in rows)
+	bandwidth.forget_idle(t for t in known if t not in live)
+
+
+def _sweep_loop() -> None:
+	while True:
+		time.sleep(SWEEP_INTERVAL)
+		try:
+			if cluster.is_leader():
+				delete_expired()
+			# Every worker keeps its own buckets and meters
+			prune_bandwidth()
+		except Exception as e:
+			print(f"Share sweeper error: {e}")
+
+
+def start_sweeper() -> None:
+	"""Start the sweep thread; it only deletes while this worker is the leader,
+	but every worker drops the bandwidth state of shares that are gone."""
+	global _SWEEPER
+	with _LOCK:
+		if _SWEEPER is None or not _SWEEPER.is_alive():
+			_SWEEPER = threading.Thread(target=_sweep_loop, name="rfe-share-sweeper", daemon=True)
+			_SWEEPER.start()
@@ -0,0 +1,109 @@
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+# Optional / heavy third-party modules; the report shows which are loaded yet
+HEAVY_MODULES = ("psutil", "PIL", "py7zr", "patoolib", "winpty", "watchfiles", "aiofiles", "brotli")
+
+_BOOT_START = time.perf_counter()
+_BOOT_END: Optional[float] = None
+_IMPORTS: List[dict] = []
+_PHASES: List[dict] = []
+_LOCK = threading.Lock()
+
+
+class LazyModule:
+	"""Stand-in for a module that is imported on first attribute access.
+
+	`psutil = lazy_module("psutil")` keeps call sites unchanged
+	(`psutil.cpu_percent()`), while the import cost moves to the first
+	request that needs it.
+	"""
+
+	def __init__(self, name: str):
+		self._name = name
+		self._module = None
+		self._lock = threading.Lock()
+
+	def _load(self):
+		with self._lock:
+			if self._module is None:
+				self._module = _timed(self._name, None, "lazy")
+			return self._module
+
+	def __getattr__(self, attr):
+		module = self._module
+		if module is None:
+			module = self._load()
+		return getattr(module, attr)
+
+	def __repr__(self):
+		state = "loaded" if self._module is not None else "not loaded"
+		return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+	return LazyModule(name)
+
+
+def module_available(name: str) -> bool:
+	"""True if `name` can be imported, without importing it."""
+	if name in sys.modules:
+		return True
+	try:
+		return importlib.util.find_spec(name) is not None
+	except (ImportError, ValueError):
+		return False
+
+
+def _timed(name: str, package: Optional[str], kind: str):
+	start = time.perf_counter()
+	cached = importlib.util.resolve_name(name, package) in sys.modules
+	module = importlib.import_module(name, package)
+	elapsed = (time.perf_counter() - start) * 1000.0
+	if not cached:
+		with _LOCK:
+			_IMPORTS.append({"module": module.__name__, "kind": kind, "ms": round(elapsed, 2)})
+	return module
+
+
+def timed_import(name: str, package: Optional[str] = None):
+	"""import_module() that records how long the (first) import took."""
+	return _timed(name, package, "boot")
+
+
+@contextmanager
+def phase(name: str):
+	"""Time one step of application startup."""
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		with _LOCK:
+			_PHASES.append({"phase": name, "ms": round((time.perf_counter() - start) * 1000.0, 2)})
+
+
+def mark_ready() -> None:
+	global _BOOT_END
+	_BOOT_END = time.perf_counter()
+
+
+def report() -> dict:
+	"""Import and startup timings collected so far.
+
+	Module times are inclusive: whatever a module pulls in for the first
+	time is charged to it, so shared dependencies land on the first importer.
+	"""
+	with _LOCK:
+		imports = sorted(_IMPORTS, key=lambda i: i["ms"], reverse=True)
+		phases = list(_PHASES)
+	return {
+		"boot_ms": round((_BOOT_END - _BOOT_START) * 1000.0, 2) if _BOOT_END is not None else None,
+		"imports": imports,
+		"phases": phases,
+		"heavy_modules_loaded": {name: name in sys.modules for name in HEAVY_MODULES},
+	}
@@ -0,0 +1,102 @@
+import gzip
+import os
+import stat
+import threading
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# Only text assets are worth compressing; anything else is served as-is
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".xml"}
+_MIN_SIZE = 1000
+
+# full path -> ((mtime_ns, size), {encoding: body})
+_VARIANTS: Dict[str, Tuple[tuple, Dict[str, bytes]]] = {}
+_LOCK = threading.Lock()
+
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+	variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+	if brotli is not None:
+		variants["br"] = brotli.compress(data, quality=11)
+	return variants
+
+
+def _variants(full_path: str, st: os.stat_result) -> Optional[Dict[str, bytes]]:
+	if os.path.splitext(full_path)[1].lower() not in COMPRESSIBLE_SUFFIXES or st.st_size < _MIN_SIZE:
+		return None
+	key = (st.st_mtime_ns, st.st_size)
+	with _LOCK:
+		hit = _VARIANTS.get(full_path)
+	if hit is not None and hit[0] == key:
+		return hit[1]
+	with open(full_path, "rb") as f:
+		data = f.read()
+	variants = _compress(data)
+	with _LOCK:
+		_VARIANTS[full_path] = (key, variants)
+	return variants
+
+
+def _pick_encoding(accept: str, available: Dict[str, bytes]) -> Optional[str]:
+	offered = set()
+	for part in accept.split(","):
+		token, _, params = part.strip().partition(";")
+		if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+			continue
+		offered.add(token.strip().lower())
+	for encoding in ("br", "gzip"):
+		if encoding in available and encoding in offered:
+			return encoding
+	return None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+	"""StaticFiles that answers with cached gzip/brotli bodies when the client accepts them.
+
+	Each asset is compressed once per (mtime, size) at the highest level and
+	kept in memory; the frontend is a handful of files so this stays small.
+	"""
+
+	def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+		response = super().file_response(full_path, stat_result, scope, status_code)
+		if not isinstance(response, FileResponse) or status_code != 200:
+			return response
+		request_headers = Headers(scope=scope)
+		variants = _variants(str(full_path), stat_result)
+		encoding = _pick_encoding(request_headers.get("accept-encoding", ""), variants) if variants else None
+		if encoding is None:
+			if variants:
+				response.headers["Vary"] = "Accept-Encoding"
+			return response
+		# Each encoding is a different representation, so it gets its own validator
+		headers = {
+			"etag": response.headers["etag"][:-1] + f'-{encoding}"',
+			"last-modified": response.headers["last-modified"],
+			"content-encoding": encoding,
+			"vary": "Accept-Encoding",
+		}
+		if self.is_not_modified(Headers(headers), request_headers):
+			return NotModifiedResponse(Headers(headers))
+		return Response(variants[encoding], media_type=response.media_type, headers=headers)
+
+	def precompress(self) -> None:
+		"""Build the compressed variants of every asset up front."""
+		for directory in self.all_directories:
+			for dirpath, _, filenames in os.walk(directory):
+				for name in filenames:
+					full_path = os.path.join(dirpath, name)
+					try:
+						st = os.stat(full_path)
+						if stat.S_ISREG(st.st_mode):
+							_variants(full_path, st)
+					except OSError:
+						pass
@@ -0,0 +1,435 @@
+import asyncio
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from .config import settings
+from .startup import lazy_module, module_available
+
+# winpty is only imported when a console is opened on Windows (and may not be installed)
+winpty = lazy_module("winpty")
+psutil = lazy_module("psutil")
+
+READ_SIZE = 64 * 1024
+# Output is sent in frames of at most FRAME_MAX bytes. While it keeps coming,
+# a frame gathers output for COALESCE_WINDOW; the first output after a quiet
+# spell (a keystroke echo) goes out immediately.
+FRAME_MAX = 64 * 1024
+COALESCE_WINDOW = 0.008
+# How often sessions without viewers are checked for idleness
+REAP_INTERVAL = 30.0
+
+
+def available() -> Tuple[bool, str]:
+    """(True, "") if a PTY backend can be used on this platform, else (False, reason)."""
+    if sys.platform == "win32":
+        if not module_available("winpty"):
+            return False, "Error: 'pywinpty' library not found on server. Please install it: pip install pywinpty"
+        return True, ""
+    if not module_available("pty"):
+        return False, "Error: no pseudo-terminal support on this platform"
+    return True, ""
+
+
+# ---------------- Backends ----------------
+
+def _clean_windows_env() -> dict:
+    # "Lối đi mới 2.0": PowerShell + Clean Registry Environment
+    # We reconstruct the environment from Windows Registry to ensure it's identical
+    # to a fresh local session, removing any Server Venv pollution.
+    env = os.environ.copy()
+
+    # 1. Cleanup vars
+    if "VIRTUAL_ENV" in env:
+        del env["VIRTUAL_ENV"]
+
+    # 2. Reconstruct PATH from Registry (True Cleanliness)
+    try:
+        import winreg
+        # Load System PATH
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r'SYSTEM\CurrentControlSet\Control\Session Manager\Environment') as key:
+            sys_path, _ = winreg.QueryValueEx(key, 'Path')
+
+        # Load User PATH
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r'Environment') as key:
+            user_path, _ = winreg.QueryValueEx(key, 'Path')
+
+        # Combine
+        full_path = f"{sys_path};{user_path}"
+        # Expand variables (like %SystemRoot%)
+        env["PATH"] = os.path.expandvars(full_path)
+    except Exception:
+        # Fallback: Just keep existing PATH if registry fails
+        pass
+    return env
+
+
+class WinPty:
+    """PowerShell on a winpty console."""
+
+    def __init__(self, rows: int, cols: int):
+        # dimensions=(rows, cols)
+        self.proc = winpty.PtyProcess.spawn(
+            "powershell.exe -NoLogo", cwd=os.getcwd(), env=_clean_windows_env(), dimensions=(rows, cols)
+        )
+        self.pid = self.proc.pid
+        # UTF-8 code page, so output decodes cleanly
+        try:
+            self.proc.write("chcp 65001\r\n")
+        except Exception:
+            pass
+
+    def read(self, size: int) -> bytes:
+        try:
+            return self.proc.read(size).encode("utf-8")
+        except EOFError:
+            return b""
+
+    def write(self, data: str) -> None:
+        self.proc.write(data)
+
+    def resize(self, rows: int, cols: int) -> None:
+        self.proc.setwinsize(rows, cols)
+
+    def isalive(self) -> bool:
+        return self.proc.isalive()
+
+    def terminate(self) -> None:
+        # Kill the process to prevent zombie powershell/cmd processes
+        self.proc.terminate()
+
+    def close(self) -> None:
+        pass
+
+
+def _make_controlling_tty() -> None:
+    # Runs in the child after setsid(): adopt the PTY on stdin as the controlling terminal
+    import fcntl
+    import termios
+    try:
+        fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+    except OSError:
+        pass
+
+
+class PosixPty:
+    """The user's shell on a POSIX pseudo-terminal (Linux/macOS)."""
+
+    def __init__(self, rows: int, cols: int):
+        self.master, slave = os.openpty()
+        try:
+            self.resize(rows, cols)
+            env = os.environ.copy()
+            env.pop("VIRTUAL_ENV", None)
+            env["TERM"] = "xterm-256color"
+            shell = env.get("SHELL") or "/bin/sh"
+            self.proc = subprocess.Popen(
+                [shell], stdin=slave, stdout=slave, stderr=slave, cwd=os.getcwd(), env=env,
+                start_new_session=True, preexec_fn=_make_controlling_tty,
+            )
+        except Exception:
+            os.close(self.master)
+            raise
+        finally:
+            os.close(slave)
+        self.pid = self.proc.pid
+
+    def read(self, size: int) -> bytes:
+        try:
+            return os.read(self.master, size)
+        except OSError:
+            # EIO once the last process holding the slave side exits
+            return b""
+
+    def write(self, data: str) -> None:
+        view = memoryview(data.encode("utf-8"))
+        while view:
+            view = view[os.write(self.master, view):]
+
+    def resize(self, rows: int, cols: int) -> None:
+        import fcntl
+        import struct
+        import termios
+        fcntl.ioctl(self.master, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+    def isalive(self) -> bool:
+        return self.proc.poll() is None
+
+    def terminate(self) -> None:
+        # The shell and everything started from it: with job control on,
+        # background jobs live in process groups of their own
+        try:
+            procs = psutil.Process(self.proc.pid).children(recursive=True)
+        except psutil.Error:
+            procs = []
+        self.proc.kill()
+        for p in procs:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        self.proc.wait()
+
+    def close(self) -> None:
+        if self.master >= 0:
+            os.close(self.master)
+            self.master = -1
+
+
+def spawn(rows: int = 24, cols: int = 80):
+    return WinPty(rows, cols) if sys.platform == "win32" else PosixPty(rows, cols)
+
+
+# ---------------- Session ----------------
+
+class SessionLimitError(Exception):
+    pass
+
+
+class Viewer:
+    """One websocket attached to a session; read-only viewers cannot type or resize."""
+
+    def __init__(self, session: "TerminalSession", writable: bool, offset: int):
+        self.session = session
+        self.writable = writable
+        self.offset = offset
+
+    def frames(self) -> AsyncIterator[bytes]:
+        """Output from this viewer's offset, coalesced into frames, until the shell exits."""
+        return self.session._frames(self)
+
+
+class TerminalSession:
+    """A shell on a PTY that outlives the websockets watching it.
+
+    A dedicated thread reads the PTY into a scrollback ring addressed by
+    absolute byte offsets (the last `scrollback` bytes are kept). Every
+    viewer follows from its own offset: a new viewer replays the ring, a
+    viewer that falls behind it skips ahead. The reader pauses while even
+    the most up-to-date viewer is a whole ring behind, so a slow client
+    throttles the program through the PTY; with no viewers attached the
+    shell keeps running and only the ring is kept. Create it from the loop.
+    """
+
+    def __init__(self, owner: str, rows: int = 24, cols: int = 80, scrollback: int = 512 * 1024):
+        self.id = secrets.token_urlsafe(9)
+        self.owner = owner
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        self.scrollback = scrollback
+        self.pty = spawn(rows, cols)
+        self._loop = asyncio.get_running_loop()
+        self._cond = threading.Condition()
+        self._chunks: Deque[Tuple[int, bytes]] = deque()  # (start offset, data)
+        self._start = 0  # offset of the oldest byte still in the ring
+        self._end = 0  # total bytes produced
+        self._viewers: Set[Viewer] = set()
+        self._eof = False
+        self._closing = False
+        self._changed = asyncio.Event()
+        self._thread = threading.Thread(target=self._read_loop, name=f"rfe-console-{self.pty.pid}", daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return not self._eof
+
+    @property
+    def viewers(self) -> int:
+        return len(self._viewers)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _wake(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._notify)
+        except RuntimeError:
+            pass  # loop already closed
+
+    def _read_loop(self) -> None:
+        try:
+            while True:
+                data = self.pty.read(READ_SIZE)
+                if not data:
+                    break
+                with self._cond:
+                    while (
+                        self._viewers and not self._closing
+                        and self._end - max(v.offset for v in self._viewers) >= self.scrollback
+                    ):
+                        self._cond.wait()
+                    if self._closing:
+                        break
+                    self._chunks.append((self._end, data))
+                    self._end += len(data)
+                    # Drop chunks that ended more than a ring ago (the newest always stays)
+                    while self._end - (self._chunks[0][0] + len(self._chunks[0][1])) > self.scrollback:
+                        self._chunks.popleft()
+                    self._start = self._chunks[0][0]
+                self._wake()
+        except Exception:
+            pass
+        finally:
+            with self._cond:
+                self._eof = True
+            self._wake()
+
+    def attach(self, writable: bool = True) -> Viewer:
+        """A new viewer, positioned to replay the scrollback."""
+        with self._cond:
+            viewer = Viewer(self, writable, self._start)
+            self._viewers.add(viewer)
+        self.last_active = time.monotonic()
+        return viewer
+
+    def detach(self, viewer: Viewer) -> None:
+        with self._cond:
+            self._viewers.discard(viewer)
+            self._cond.notify_all()
+        self.last_active = time.monotonic()
+
+    def _take(self, viewer: Viewer) -> Tuple[bytes, int]:
+        """(up to FRAME_MAX bytes from the viewer's offset, bytes skipped because they left the ring)."""
+        with self._cond:
+            skipped = max(0, self._start - viewer.offset)
+            offset = max(viewer.offset, self._start)
+            parts = []
+            size = 0
+            for chunk_start, data in self._chunks:
+                if size >= FRAME_MAX:
+                    break
+                chunk_end = chunk_start + len(data)
+                if chunk_end <= offset:
+                    continue
+                part = data[max(0, offset - chunk_start):][:FRAME_MAX - size]
+                parts.append(part)
+                size += len(part)
+            viewer.offset = offset + size
+            self._cond.notify_all()
+        return b"".join(parts), skipped
+
+    async def _frames(self, viewer: Viewer) -> AsyncIterator[bytes]:
+        last_sent = float("-inf")
+        while True:
+            changed = self._changed
+            pending = self._end - viewer.offset
+            if pending <= 0:
+                if self._eof:
+                    return
+                await changed.wait()
+                continue
+            wait = COALESCE_WINDOW - (time.monotonic() - last_sent)
+            if pending < FRAME_MAX and not self._eof and wait > 0:
+                # Output is streaming: let it gather into a bigger frame
+                await asyncio.sleep(wait)
+                continue
+            data, skipped = self._take(viewer)
+            if skipped:
+                yield f"\r\n[... {skipped} bytes of output skipped ...]\r\n".encode("ascii")
+            if data:
+                yield data
+                last_sent = time.monotonic()
+
+    def write(self, data: str) -> None:
+        self.last_active = time.monotonic()
+        self.pty.write(data)
+
+    def resize(self, rows: int, cols: int) -> None:
+        self.pty.resize(rows, cols)
+
+    def info(self) -> dict:
+        return {
+            "id": self.id, "owner": self.owner, "created": self.created, "pid": self.pty.pid,
+            "alive": self.alive, "viewers": self.viewers,
+            "idle_s": 0 if self._viewers else round(time.monotonic() - self.last_active, 1),
+        }
+
+    async def close(self) -> None:
+        """Kill the shell and wait for the reader thread before releasing the PTY."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.pty.terminate)
+        except Exception:
+            pass
+        await loop.run_in_executor(None, self._thread.join, 5)
+        if not self._thread.is_alive():
+            self.pty.close()
+
+
+# ---------------- Registry ----------------
+# Sessions belong to the worker process that spawned them. A session whose
+# shell has exited cannot be reattached to: viewers still connected get the
+# rest of its output, then the reaper drops it and its scrollback.
+
+_SESSIONS: Dict[str, TerminalSession] = {}
+_REAPER: Optional[asyncio.Task] = None
+
+
+def create_session(owner: str, rows: int = 24, cols: int = 80) -> TerminalSession:
+    """Spawn a session for `owner` (the client address), within console_max_sessions_per_client."""
+    global _REAPER
+    limit = settings.console_max_sessions_per_client
+    if limit > 0 and sum(1 for s in _SESSIONS.values() if s.owner == owner and s.alive) >= limit:
+        raise SessionLimitError(f"Too many console sessions (limit {limit}); close one first")
+    session = TerminalSession(owner, rows, cols, settings.console_scrollback_kb * 1024)
+    _SESSIONS[session.id] = session
+    if _REAPER is None or _REAPER.done():
+        _REAPER = asyncio.get_running_loop().create_task(_reap_loop())
+    return session
+
+
+def get_session(session_id: str) -> Optional[TerminalSession]:
+    """The session to attach to, or None if it is unknown or its shell has exited."""
+    session = _SESSIONS.get(session_id)
+    return session if session is not None and session.alive else None
+
+
+def list_sessions() -> List[dict]:
+    return [s.info() for s in _SESSIONS.values()]
+
+
+async def close_session(session_id: str) -> bool:
+    session = _SESSIONS.pop(session_id, None)
+    if session is None:
+        return False
+    await session.close()
+    return True
+
+
+async def close_all() -> None:
+    global _REAPER
+    if _REAPER is not None:
+        _REAPER.cancel()
+        _REAPER = None
+    for session_id in list(_SESSIONS):
+        await close_session(session_id)
+
+
+async def reap() -> None:
+    """Close sessions nobody watches whose shell exited or that sat idle too long."""
+    timeout = settings.console_idle_timeout
+    now = time.monotonic()
+    for session in list(_SESSIONS.values()):
+        if session.viewers:
+            continue
+        if not session.alive or (timeout > 0 and now - session.last_active > timeout):
+            await close_session(session.id)
+
+
+async def _reap_loop() -> None:
+    while _SESSIONS:
+        await asyncio.sleep(REAP_INTERVAL)
+        try:
+            await reap()
+        except Exception as e:
+            print(f"Console reaper error: {e}")
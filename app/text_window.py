@@ -0,0 +1,527 @@
+import codecs
+import hashlib
+import os
+import secrets
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Sample one checkpoint every INDEX_STEP lines. Jumping to line N costs one
+# seek to offsets[N // INDEX_STEP] plus a forward scan of at most INDEX_STEP lines.
+INDEX_STEP = 1000
+# Read size used while building the index / scanning windows
+CHUNK_SIZE = 1024 * 1024
+# Sub-block used to locate a checkpoint inside a chunk without a per-line loop
+_BLOCK_SIZE = 4096
+# Hard cap on the amount of text returned by a single window
+MAX_WINDOW_BYTES = 4 * 1024 * 1024
+# Number of files whose line index is kept in memory
+_MAX_CACHED_INDEXES = 16
+# Bytes hashed from each end of a file when computing its ETag
+_ETAG_SAMPLE = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+class NotTextError(Exception):
+    """Raised when a file looks binary and no explicit encoding was requested."""
+
+
+class VersionConflict(Exception):
+    """Raised when a file no longer matches the ETag an edit was based on."""
+
+
+def file_etag(abs_path: str, st: Optional[os.stat_result] = None) -> str:
+    """Version tag of a file: size + mtime + hash of its head and tail.
+
+    Size and mtime catch nearly every write; the sampled hash covers writers
+    that preserve mtime. Small files are hashed completely.
+    """
+    if st is None:
+        st = os.stat(abs_path)
+    with open(abs_path, "rb") as f:
+        if st.st_size <= 2 * _ETAG_SAMPLE:
+            return content_etag(st, f.read())
+        h = hashlib.blake2b(digest_size=8)
+        h.update(f.read(_ETAG_SAMPLE))
+        f.seek(-_ETAG_SAMPLE, os.SEEK_END)
+        h.update(f.read(_ETAG_SAMPLE))
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}-{h.hexdigest()}"'
+
+
+def content_etag(st: os.stat_result, data: bytes) -> str:
+    """ETag of a small file whose full content is already in memory (same format as file_etag)."""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}-{hashlib.blake2b(data, digest_size=8).hexdigest()}"'
+
+
+def etag_matches(etag: str, other: Optional[str]) -> bool:
+    """Compare ETags, tolerating clients that strip the quotes."""
+    return other is not None and etag.strip('"') == other.strip().strip('"')
+
+
+def detect_encoding(abs_path: str, sample_size: int = 64 * 1024) -> Tuple[str, int]:
+    """Guess the encoding of a text file from its first bytes.
+
+    Returns (encoding, bom_length). BOMs win; otherwise the sample must decode
+    as UTF-8 (a multibyte sequence cut by the sample edge is tolerated), else
+    cp1252 is assumed. Raises NotTextError for data containing NUL bytes.
+    """
+    with open(abs_path, "rb") as f:
+        sample = f.read(sample_size)
+    for bom, name in _BOMS:
+        if sample.startswith(bom):
+            return ("utf-8" if name == "utf-8-sig" else name), len(bom)
+    if b"\x00" in sample:
+        raise NotTextError(abs_path)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        return "cp1252", 0
+
+
+def _newline_for(encoding: str) -> bytes:
+    enc = encoding.lower().replace("_", "-")
+    if enc in ("utf-16-le", "utf-16le"):
+        return b"\n\x00"
+    if enc in ("utf-16-be", "utf-16be"):
+        return b"\x00\n"
+    return b"\n"
+
+
+class LineIndex:
+    """Sparse line-offset index of one file, extended lazily on demand.
+
+    offsets[i] is the byte offset where line i * INDEX_STEP starts. The index
+    is only scanned as far as the furthest line requested so far.
+    """
+
+    def __init__(self, abs_path: str, encoding: str, origin: int, size: int, mtime_ns: int):
+        self.path = abs_path
+        self.encoding = encoding
+        self.origin = origin  # first byte after the BOM
+        self.newline = _newline_for(encoding)
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.offsets: List[int] = [origin]
+        self.scanned_to = origin  # file offset the scan has reached
+        self.lines_scanned = 0  # newlines seen before scanned_to
+        self.complete = False
+        self.ends_with_newline = False
+        self.lock = threading.Lock()
+
+    @property
+    def total_lines(self) -> Optional[int]:
+        """Number of lines in the file, known once the whole file was scanned."""
+        if not self.complete:
+            return None
+        partial = self.scanned_to > self.origin and not self.ends_with_newline
+        return self.lines_scanned + (1 if partial else 0)
+
+    def _count(self, buf: bytes, start: int, end: int) -> int:
+        nl = self.newline
+        if len(nl) == 1:
+            return buf.count(nl, start, end)
+        # Two-byte newlines must sit on a code unit boundary to count
+        n = 0
+        pos = buf.find(nl, start, end)
+        while pos != -1:
+            if (pos - start) % 2 == 0:
+                n += 1
+                pos = buf.find(nl, pos + 2, end)
+            else:
+                pos = buf.find(nl, pos + 1, end)
+        return n
+
+    def _find(self, buf: bytes, start: int, end: int) -> int:
+        nl = self.newline
+        pos = buf.find(nl, start, end)
+        if len(nl) > 1:
+            while pos != -1 and (pos - start) % 2:
+                pos = buf.find(nl, pos + 1, end)
+        return pos
+
+    def ensure(self, line: int) -> None:
+        """Scan forward until the checkpoint covering `line` is known (or EOF)."""
+        with self.lock:
+            if self.complete or len(self.offsets) * INDEX_STEP > line:
+                return
+            nl_len = len(self.newline)
+            with open(self.path, "rb") as f:
+                f.seek(self.scanned_to)
+                while len(self.offsets) * INDEX_STEP <= line:
+                    base = self.scanned_to
+                    buf = f.read(CHUNK_SIZE)
+                    if not buf:
+                        self.complete = True
+                        break
+                    if nl_len > 1 and len(buf) % 2:
+                        # keep code units aligned across chunks
+                        buf = buf[:-1]
+                        f.seek(-1, os.SEEK_CUR)
+                    i, n = 0, len(buf)
+                    while i < n:
+                        need = len(self.offsets) * INDEX_STEP - self.lines_scanned
+                        j = min(i + _BLOCK_SIZE, n)
+                        c = self._count(buf, i, j)
+                        if c < need:
+                            self.lines_scanned += c
+                            i = j
+                            continue
+                        pos = i - nl_len
+                        for _ in range(need):
+                            pos = self._find(buf, pos + nl_len, j)
+                        self.lines_scanned += need
+                        i = pos + nl_len
+                        self.offsets.append(base + i)
+                    self.scanned_to = base + n
+                    self.ends_with_newline = buf.endswith(self.newline)
+
+    def offset_of(self, line: int) -> int:
+        """Byte offset where 0-based `line` starts (file size if past EOF)."""
+        cp_line, offset = self.checkpoint(line)
+        nl_len = len(self.newline)
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            buf = b""
+            i = 0
+            while cp_line < line:
+                pos = self._find(buf, i, len(buf))
+                if pos == -1:
+                    # Nothing of the skipped line is needed: account for it and drop it
+                    offset += len(buf) - i
+                    buf = f.read(CHUNK_SIZE)
+                    i = 0
+                    if not buf:
+                        return offset
+                    continue
+                offset += pos + nl_len - i
+                i = pos + nl_len
+                cp_line += 1
+        return offset
+
+    def build(self) -> None:
+        """Scan the whole file (needed for total line counts)."""
+        self.ensure(1 << 62)
+
+    def checkpoint(self, line: int) -> Tuple[int, int]:
+        """Return (line_number, byte_offset) of the closest checkpoint at or before `line`."""
+        self.ensure(line)
+        idx = min(line // INDEX_STEP, len(self.offsets) - 1)
+        return idx * INDEX_STEP, self.offsets[idx]
+
+
+_INDEX_CACHE: "OrderedDict[str, LineIndex]" = OrderedDict()
+_INDEX_LOCK = threading.Lock()
+
+
+def _new_index(abs_path: str, encoding: Optional[str], st: os.stat_result) -> LineIndex:
+    if encoding:
+        origin = 0
+        for bom, name in _BOMS:
+            if name == encoding or (name == "utf-8-sig" and encoding == "utf-8"):
+                with open(abs_path, "rb") as f:
+                    if f.read(len(bom)) == bom:
+                        origin = len(bom)
+                break
+        enc = encoding
+    else:
+        enc, origin = detect_encoding(abs_path)
+    return LineIndex(abs_path, enc, origin, st.st_size, st.st_mtime_ns)
+
+
+def get_line_index(abs_path: str, encoding: Optional[str] = None) -> LineIndex:
+    """Return the cached index for a file, rebuilding it if the file changed.
+
+    Any change of size or mtime drops the index: a file that grew may also
+    have been rewritten in front of the checkpoints.
+    """
+    st = os.stat(abs_path)
+    with _INDEX_LOCK:
+        idx = _INDEX_CACHE.get(abs_path)
+        if (idx is not None and (encoding is None or idx.encoding == encoding)
+                and idx.size == st.st_size and idx.mtime_ns == st.st_mtime_ns):
+            _INDEX_CACHE.move_to_end(abs_path)
+            return idx
+    idx = _new_index(abs_path, encoding, st)
+    with _INDEX_LOCK:
+        _INDEX_CACHE[abs_path] = idx
+        _INDEX_CACHE.move_to_end(abs_path)
+        while len(_INDEX_CACHE) > _MAX_CACHED_INDEXES:
+            _INDEX_CACHE.popitem(last=False)
+    return idx
+
+
+def invalidate(abs_path: str) -> None:
+    """Drop the cached index of a file (call after rewriting it)."""
+    with _INDEX_LOCK:
+        _INDEX_CACHE.pop(abs_path, None)
+
+
+def read_lines(abs_path: str, start_line: int, max_lines: int, encoding: Optional[str] = None) -> dict:
+    """Read up to `max_lines` lines starting at 0-based `start_line`.
+
+    The returned text keeps the original line terminators so that a window
+    can be edited and written back verbatim. A line that alone would exceed
+    MAX_WINDOW_BYTES is cut there and `truncated` is set; end_offset then
+    points into that line.
+    """
+    idx = get_line_index(abs_path, encoding)
+    line, offset = idx.checkpoint(start_line)
+    nl_len = len(idx.newline)
+    out = bytearray()
+    start_offset = None
+    count = 0
+    truncated = False
+    with open(abs_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        buf = bytearray()
+        i = 0
+        at_eof = False
+        while count < max_lines and len(out) < MAX_WINDOW_BYTES:
+            pos = idx._find(buf, i, len(buf))
+            if pos != -1:
+                end = pos + nl_len
+            elif not at_eof:
+                if line < start_line:
+                    # Skipped line: only its length matters
+                    offset += len(buf) - i
+                    buf.clear()
+                elif len(buf) - i > MAX_WINDOW_BYTES - len(out):
+                    break  # the line will not fit: it is cut below, or left for the next window
+                else:
+                    del buf[:i]
+                chunk = f.read(CHUNK_SIZE)
+                buf += chunk
+                i = 0
+                at_eof = not chunk
+                continue
+            elif i < len(buf):
+                end = len(buf)  # last line without terminator
+            else:
+                break
+            if line >= start_line:
+                if end - i > MAX_WINDOW_BYTES - len(out):
+                    break
+                if start_offset is None:
+                    start_offset = offset
+                out += buf[i:end]
+                count += 1
+            offset += end - i
+            line += 1
+            i = end
+        if count == 0 and line >= start_line and len(buf) - i > MAX_WINDOW_BYTES:
+            # A single line longer than a whole window: return its head
+            start_offset = offset
+            out += buf[i:i + MAX_WINDOW_BYTES]
+            count = 1
+            truncated = True
+    if start_offset is None:
+        start_offset = offset
+    return {
+        "encoding": idx.encoding,
+        "start_line": start_line,
+        "line_count": count,
+        "start_offset": start_offset,
+        "end_offset": start_offset + len(out),
+        "eof": start_offset + len(out) >= size,
+        "total_lines": idx.total_lines,
+        "truncated": truncated,
+        "text": out.decode(idx.encoding, errors="replace"),
+    }
+
+
+def read_bytes(abs_path: str, offset: int, length: int, encoding: Optional[str] = None) -> dict:
+    """Decode the raw byte range [offset, offset + length)."""
+    if encoding is None:
+        encoding, origin = detect_encoding(abs_path)
+        offset = max(offset, origin)
+    length = max(0, min(length, MAX_WINDOW_BYTES))
+    if _newline_for(encoding) != b"\n" and offset % 2:
+        offset -= 1
+    with open(abs_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+        size = os.fstat(f.fileno()).st_size
+    return {
+        "encoding": encoding,
+        "start_offset": offset,
+        "end_offset": offset + len(data),
+        "eof": offset + len(data) >= size,
+        "text": data.decode(encoding, errors="replace"),
+    }
+
+
+def read_tail(abs_path: str, lines: int, encoding: Optional[str] = None) -> dict:
+    """Return the last `lines` lines by scanning backwards from the end of file."""
+    if encoding is None:
+        encoding, origin = detect_encoding(abs_path)
+    else:
+        origin = 0
+    nl = _newline_for(encoding)
+    nl_len = len(nl)
+    with open(abs_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size
+        # a trailing newline terminates the last line, it does not start a new one
+        if size - nl_len >= origin:
+            f.seek(size - nl_len)
+            if f.read(nl_len) == nl:
+                end = size - nl_len
+        pos = end
+        found = 0
+        start = origin
+        step = 64 * 1024
+        while pos > origin and found < lines:
+            read_from = max(origin, pos - step)
+            if nl_len > 1 and (read_from - origin) % 2:
+                read_from += 1
+            f.seek(read_from)
+            buf = f.read(pos - read_from)
+            j = len(buf)
+            while found < lines:
+                k = buf.rfind(nl, 0, j)
+                while k != -1 and nl_len > 1 and k % 2:
+                    k = buf.rfind(nl, 0, k + 1)
+                if k == -1:
+                    break
+                found += 1
+                if found == lines:
+                    start = read_from + k + nl_len
+                    break
+                j = k
+            pos = read_from
+        if found < lines:
+            start = origin
+        length = size - start
+        truncated = length > MAX_WINDOW_BYTES
+        if truncated:
+            start = size - MAX_WINDOW_BYTES
+            if nl_len > 1 and (start - origin) % 2:
+                start += 1
+        f.seek(start)
+        data = f.read(size - start)
+    text = data.decode(encoding, errors="replace")
+    return {
+        "encoding": encoding,
+        "start_offset": start,
+        "end_offset": size,
+        "line_count": text.count("\n") + (1 if text and not text.endswith("\n") else 0),
+        "eof": True,
+        "truncated": truncated,
+        "text": text,
+    }
+
+
+_SAVE_LOCKS: Dict[str, threading.Lock] = {}
+_SAVE_LOCKS_GUARD = threading.Lock()
+
+
+def _save_lock(abs_path: str) -> threading.Lock:
+    key = os.path.normcase(abs_path)
+    with _SAVE_LOCKS_GUARD:
+        lock = _SAVE_LOCKS.get(key)
+        if lock is None:
+            lock = _SAVE_LOCKS[key] = threading.Lock()
+        return lock
+
+
+def _create_temp(abs_path: str) -> Tuple[int, str]:
+    """(fd, path) of a new empty file next to `abs_path`.
+
+    Created with mode 0666 so the kernel applies the umask, as for any new
+    file (mkstemp would make it 0600).
+    """
+    parent, name = os.path.split(abs_path)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp_path = os.path.join(parent, f".~{name}.{secrets.token_hex(4)}.tmp")
+        try:
+            return os.open(tmp_path, flags, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+def _copy_range(src, dst, start: int, end: Optional[int]) -> None:
+    src.seek(start)
+    remaining = None if end is None else end - start
+    while remaining is None or remaining > 0:
+        chunk = src.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        dst.write(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+
+
+def _replace_atomically(abs_path: str, base_etag: Optional[str], write_body) -> str:
+    """Write a new version through a temp file next to `abs_path` and swap it in.
+
+    `write_body(dst)` produces the new content. When `base_etag` is given the
+    file must still match it both before and after the body is written,
+    otherwise VersionConflict is raised and the original is left untouched.
+    """
+    with _save_lock(abs_path):
+        exists = os.path.isfile(abs_path)
+        if base_etag is not None and not (exists and etag_matches(file_etag(abs_path), base_etag)):
+            raise VersionConflict(abs_path)
+        fd, tmp_path = _create_temp(abs_path)
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                write_body(dst)
+            if exists:
+                shutil.copymode(abs_path, tmp_path)
+                if base_etag is not None and not etag_matches(file_etag(abs_path), base_etag):
+                    raise VersionConflict(abs_path)
+            os.replace(tmp_path, abs_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        invalidate(abs_path)
+        return file_etag(abs_path)
+
+
+def write_text(abs_path: str, content: str, base_etag: Optional[str] = None) -> str:
+    """Replace a file with UTF-8 `content`; returns the new ETag."""
+    data = content.encode("utf-8")
+    return _replace_atomically(abs_path, base_etag, lambda dst: dst.write(data))
+
+
+def apply_line_edits(abs_path: str, edits: List[Tuple[int, int, str]], base_etag: str,
+                     encoding: Optional[str] = None) -> str:
+    """Apply line-range edits without loading the file into memory.
+
+    Each edit (start_line, end_line, text) replaces lines [start_line, end_line)
+    with `text`, which carries its own line terminators. Edits must be sorted
+    and must not overlap. The original is streamed into a temp file around the
+    edited ranges and then atomically swapped in. Returns the new ETag.
+    """
+    prev_end = 0
+    for start, end, _ in edits:
+        if start < prev_end or end < start:
+            raise ValueError("Edits must be sorted and non-overlapping")
+        prev_end = end
+
+    def write_body(dst) -> None:
+        # Runs under the save lock after the ETag check: the edits are located
+        # with an index of exactly the version being rewritten, never a cached one
+        idx = _new_index(abs_path, encoding, os.stat(abs_path))
+        spans = [(idx.offset_of(start), idx.offset_of(end), text.encode(idx.encoding)) for start, end, text in edits]
+        with open(abs_path, "rb") as src:
+            pos = 0
+            for start, end, data in spans:
+                _copy_range(src, dst, pos, start)
+                dst.write(data)
+                pos = end
+            _copy_range(src, dst, pos, None)
+
+    return _replace_atomically(abs_path, base_etag, write_body)
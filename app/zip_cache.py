@@ -0,0 +1,130 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from .config import settings
+
+ZIP_CACHE_DIR = os.path.join(tempfile.gettempdir(), "rfe_zips")
+
+# A copy is abandoned when the disk's free space would drop below this
+MIN_FREE_BYTES = 1024 * 1024 * 1024
+# Free space is re-checked every this many bytes written
+_FREE_CHECK_EVERY = 64 * 1024 * 1024
+
+_IN_PROGRESS: Set[str] = set()
+_LOCK = threading.Lock()
+
+
+def fingerprint(files_to_zip: List[Tuple[str, str]], compression: int) -> str:
+	"""Key of an archive: every (path, arcname, size, mtime) plus the compression mode."""
+	h = hashlib.sha256(f"zip:{compression}\n".encode())
+	for abs_path, arc_name in files_to_zip:
+		try:
+			st = os.stat(abs_path)
+		except OSError:
+			continue
+		h.update(f"{abs_path}\0{arc_name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8", "surrogatepass"))
+	return h.hexdigest()
+
+
+def _final_path(key: str) -> str:
+	return os.path.join(ZIP_CACHE_DIR, key + ".zip")
+
+
+def cached_path(key: str) -> Optional[str]:
+	"""Path of a finished archive for `key`, or None. Marks it as recently used."""
+	path = _final_path(key)
+	try:
+		os.utime(path, None)  # mtime doubles as last-use time for the LRU
+	except OSError:
+		return None
+	return path
+
+
+def tee(key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+	"""Yield `chunks` while copying them into the cache.
+
+	The copy only becomes visible once the stream completed; aborted downloads
+	leave nothing behind. If the same archive is already being written by
+	another request, this one just streams. So does one that outgrows the
+	cache budget or would leave less than MIN_FREE_BYTES on the disk: its
+	partial copy is deleted on the spot.
+	"""
+	with _LOCK:
+		busy = key in _IN_PROGRESS
+		if not busy:
+			_IN_PROGRESS.add(key)
+	if busy or settings.zip_cache_max_bytes <= 0:
+		yield from chunks
+		return
+	tmp_path = None
+	out = None
+	done = False
+	try:
+		os.makedirs(ZIP_CACHE_DIR, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=ZIP_CACHE_DIR, prefix=key, suffix=".part")
+		out = os.fdopen(fd, "wb")
+		written = 0
+		next_check = 0
+		for chunk in chunks:
+			if out is not None:
+				try:
+					out.write(chunk)
+					written += len(chunk)
+					if written > settings.zip_cache_max_bytes:
+						raise OSError("archive larger than the cache budget")
+					if written >= next_check:
+						next_check = written + _FREE_CHECK_EVERY
+						if shutil.disk_usage(ZIP_CACHE_DIR).free < MIN_FREE_BYTES + _FREE_CHECK_EVERY:
+							raise OSError("not enough free space to cache the archive")
+				except OSError:
+					# e.g. disk full: keep serving the download, drop the copy now
+					out.close()
+					out = None
+					try:
+						os.remove(tmp_path)
+						tmp_path = None
+					except OSError:
+						pass  # retried below
+			yield chunk
+		if out is not None:
+			out.close()
+			os.replace(tmp_path, _final_path(key))
+			done = True
+	finally:
+		if out is not None and not out.closed:
+			out.close()
+		if not done and tmp_path:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+		with _LOCK:
+			_IN_PROGRESS.discard(key)
+	enforce_quota()
+
+
+def enforce_quota() -> None:
+	"""Delete least recently used archives until the cache fits its byte budget."""
+	try:
+		entries = []
+		with os.scandir(ZIP_CACHE_DIR) as it:
+			for entry in it:
+				if entry.name.endswith(".zip"):
+					st = entry.stat()
+					entries.append((st.st_mtime, st.st_size, entry.path))
+	except OSError:
+		return
+	total = sum(size for _, size, _ in entries)
+	entries.sort()
+	for _, size, path in entries:
+		if total <= settings.zip_cache_max_bytes:
+			break
+		try:
+			os.remove(path)
+			total -= size
+		except OSError:
+			pass
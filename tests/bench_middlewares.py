@@ -0,0 +1,104 @@
+"""Throughput of the middleware stack, pure ASGI vs the BaseHTTPMiddleware one it
+replaced: python -m tests.bench_middlewares"""
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, RedirectResponse
+
+from app.auth import is_authenticated
+from app.config import settings
+from app.middlewares import AuthMiddleware, CompressionMiddleware
+
+DOWNLOAD_BYTES = 64 * 1024 * 1024
+CHUNK = 256 * 1024
+SMALL_REQUESTS = 2000
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """AuthMiddleware as it was before the pure-ASGI rewrite."""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path.startswith("/api") and not request.url.path.endswith("/login"):
+            if settings.auth_enabled and not is_authenticated(request):
+                return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+        elif settings.auth_enabled and not is_authenticated(request):
+            path = request.url.path
+            if path in ["/", "/index.html", "/admin.html"] or path.endswith("/"):
+                return RedirectResponse(url="/login.html")
+        return await call_next(request)
+
+
+def _app(legacy: bool) -> FastAPI:
+    app = FastAPI()
+    block = os.urandom(CHUNK)  # downloads are mostly incompressible
+
+    @app.get("/api/file")
+    def download():
+        return StreamingResponse(iter([block] * (DOWNLOAD_BYTES // CHUNK)), media_type="application/octet-stream")
+
+    @app.get("/api/files")
+    def files():
+        return [{"name": f"file{i}.txt", "size": i} for i in range(100)]
+
+    if legacy:
+        app.add_middleware(LegacyAuthMiddleware)
+        app.add_middleware(GZipMiddleware, minimum_size=1000)
+    else:
+        app.add_middleware(AuthMiddleware)
+        app.add_middleware(CompressionMiddleware, minimum_size=1000)
+    return app
+
+
+async def _request(app, path: str) -> int:
+    """Drive one GET through the ASGI app; returns the body bytes received."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench"), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    received = 0
+    sent_request = False
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()  # no disconnect while the response streams
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return received
+
+
+async def _run(app) -> None:
+    start = time.perf_counter()
+    received = await _request(app, "/api/file")
+    elapsed = time.perf_counter() - start
+    print(f"  download  {DOWNLOAD_BYTES / elapsed / 1e6:8.0f} MB/s  ({received / 1e6:.1f} MB sent)")
+    start = time.perf_counter()
+    for _ in range(SMALL_REQUESTS):
+        await _request(app, "/api/files")
+    elapsed = time.perf_counter() - start
+    print(f"  small     {SMALL_REQUESTS / elapsed:8.0f} req/s")
+
+
+def main() -> None:
+    settings.auth_enabled = False
+    for name, legacy in (("BaseHTTPMiddleware + GZipMiddleware", True), ("pure ASGI + CompressionMiddleware", False)):
+        print(name)
+        asyncio.run(_run(_app(legacy)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Microbenchmark of the allowed-roots check: python -m tests.bench_path_utils"""
+import ntpath
+import timeit
+import types
+
+from app import path_utils
+from app.config import settings
+from tests.test_path_utils import _reference_resolve
+
+PATHS = [f"C:\\foo\\dir{i % 50}\\sub\\file{i}.txt" for i in range(1000)] + ["C:\\foobar\\x", "..\\..\\windows"]
+
+
+def main() -> None:
+    path_utils.os = types.SimpleNamespace(path=ntpath, sep="\\", getcwd=lambda: "C:\\srv")
+    settings.root_dirs = ["C:\\foo", "D:\\", "E:\\shares\\public"]
+    roots = list(settings.root_dirs)
+
+    def reference():
+        for p in PATHS:
+            _reference_resolve(p, roots)
+
+    def cold():
+        path_utils._resolve_cached.cache_clear()
+        for p in PATHS:
+            path_utils.resolve_path(p)
+
+    def warm():
+        for p in PATHS:
+            path_utils.resolve_path(p)
+
+    def matcher_only():
+        for p in PATHS:
+            path_utils.is_within_allowed_roots(p)
+
+    warm()
+    for name, fn in (("reference (commonpath)", reference), ("resolve_path, cold cache", cold),
+                     ("resolve_path, warm cache", warm), ("is_within_allowed_roots", matcher_only)):
+        best = min(timeit.repeat(fn, number=20, repeat=5)) / 20 / len(PATHS)
+        print(f"{name:28s} {best * 1e6:7.2f} us/path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import pytest
+
+from app import db
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A fresh SQLite database for the test; the writer thread is stopped afterwards."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.sqlite3"))
+    db.init_db()
+    yield db
+    db.close_db()
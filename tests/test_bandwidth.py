@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+
+from app import bandwidth, shares
+from app.bandwidth import SLICE_SIZE, EgressScheduler, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(bandwidth, "_BUCKETS", {})
+    monkeypatch.setattr(bandwidth, "_METERS", {})
+
+
+def test_token_bucket_holds_the_rate():
+    async def main():
+        bucket = TokenBucket(rate=4 * SLICE_SIZE * 10, burst=SLICE_SIZE)  # 10 slices per 0.25s
+        start = time.perf_counter()
+        for _ in range(41):
+            await bucket.consume(SLICE_SIZE)
+        return time.perf_counter() - start
+
+    # The first slice is the burst; the other 40 take a second at the rate
+    assert 0.9 < asyncio.run(main()) < 1.3
+
+
+def test_egress_is_shared_per_token_not_per_connection():
+    async def main():
+        scheduler = EgressScheduler()
+        scheduler.configure(40 * SLICE_SIZE)  # 40 slices per second in total
+        served = {"many": 0, "one": 0}
+        stop = asyncio.Event()
+
+        async def stream(flow):
+            while not stop.is_set():
+                await scheduler.acquire(flow, SLICE_SIZE)
+                if not stop.is_set():  # not the slices still queued at the end
+                    served[flow] += 1
+
+        tasks = [asyncio.create_task(stream("many")) for _ in range(4)] + [asyncio.create_task(stream("one"))]
+        await asyncio.sleep(1.0)
+        stop.set()
+        await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return served
+
+    served = asyncio.run(main())
+    # Four connections of one share get the same share as one connection of another
+    assert abs(served["many"] - served["one"]) <= 2
+    # One second at the rate on top of the initial burst (one second's worth)
+    assert 70 <= served["many"] + served["one"] <= 95
+
+
+def test_shape_yields_everything_in_slices(monkeypatch):
+    monkeypatch.setattr(bandwidth.settings, "share_egress_limit_kbps", 0)
+
+    async def main():
+        async def chunks():
+            yield b"a" * (SLICE_SIZE * 2 + 10)
+            yield b"b" * 5
+
+        return [piece async for piece in bandwidth.shape("tok", 0, chunks())]
+
+    pieces = asyncio.run(main())
+    assert [len(p) for p in pieces] == [SLICE_SIZE, SLICE_SIZE, 10, 5]
+    assert bandwidth.share_stats("tok")["bytes_sent"] == 2 * SLICE_SIZE + 15
+    assert bandwidth.share_stats("tok")["active_streams"] == 0
+
+
+def test_expired_and_deleted_shares_are_pruned(database, monkeypatch):
+    monkeypatch.setattr(shares, "now", lambda: 1000.0)
+    for token, expires in (("live", 2000.0), ("forever", None), ("expired", 500.0), ("streaming", 500.0)):
+        database.execute(
+            "INSERT INTO shares(token, root, readonly, allow_download, allow_edit, expires_at) VALUES(?,?,1,1,0,?)",
+            (token, "/tmp", expires),
+        )
+    for token in ("live", "forever", "expired", "streaming", "deleted"):
+        bandwidth._METERS[token] = bandwidth._Meter()
+        bandwidth._BUCKETS[token] = TokenBucket(1000)
+    bandwidth._METERS["streaming"].active = 1  # dropped once its stream ends
+    shares.prune_bandwidth()
+    assert bandwidth.tokens() == {"live", "forever", "streaming"}
+    bandwidth._METERS["streaming"].active = 0
+    shares.prune_bandwidth()
+    assert bandwidth.tokens() == {"live", "forever"}
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from app import binary_view
+
+
+def _naive(data: bytes, needle: bytes, start: int, max_results: int, max_scan: int) -> dict:
+    matches = []
+    scan_end = min(len(data), start + max_scan)
+    pos = start
+    while len(matches) < max_results:
+        hit = data.find(needle, pos, min(len(data), scan_end + len(needle) - 1))
+        if hit == -1:
+            pos = scan_end
+            break
+        matches.append(hit)
+        pos = hit + 1
+    return {"matches": matches, "next_offset": pos if pos < len(data) else None, "size": len(data)}
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(binary_view, "SCAN_CHUNK", 64)
+
+
+def test_read_window(tmp_path):
+    path = tmp_path / "f.bin"
+    path.write_bytes(bytes(range(256)) * 4)
+    assert binary_view.read_window(str(path), 10, 4) == (bytes([10, 11, 12, 13]), 1024)
+    assert binary_view.read_window(str(path), 1020, 100) == (bytes([252, 253, 254, 255]), 1024)
+    assert binary_view.read_window(str(path), 5000, 10) == (b"", 1024)
+    (tmp_path / "empty").write_bytes(b"")
+    assert binary_view.read_window(str(tmp_path / "empty"), 0, 10) == (b"", 0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_search_matches_naive_scan_across_chunks(tmp_path, small_chunks, seed):
+    rng = random.Random(seed)
+    data = bytes(rng.choice(b"ab") for _ in range(rng.randrange(0, 2000)))
+    needle = bytes(rng.choice(b"ab") for _ in range(rng.randrange(1, 6)))
+    start = rng.randrange(0, 300)
+    max_results = rng.randrange(1, 50)
+    max_scan = rng.randrange(1, 2500)
+    path = tmp_path / "f.bin"
+    path.write_bytes(data)
+    got = binary_view.search(str(path), needle, start, max_results, max_scan)
+    assert got == _naive(data, needle, start, max_results, max_scan)
+
+
+def test_search_survives_truncation(tmp_path, small_chunks, monkeypatch):
+    path = tmp_path / "f.bin"
+    path.write_bytes(b"xy" * 1000)
+    real_open = open
+
+    class Truncated:
+        """Truncates the file on the first seek, after search() took its size."""
+
+        def __init__(self, f):
+            self.f, self.done = f, False
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.f.close()
+
+        def fileno(self):
+            return self.f.fileno()
+
+        def seek(self, pos):
+            if not self.done:
+                self.done = True
+                with real_open(path, "r+b") as other:
+                    other.truncate(100)
+            return self.f.seek(pos)
+
+        def read(self, n):
+            return self.f.read(n)
+
+    def truncating_open(name, mode="r"):
+        return Truncated(real_open(name, mode))
+
+    monkeypatch.setattr(binary_view, "open", truncating_open, raising=False)
+    got = binary_view.search(str(path), b"xy", max_results=1000)
+    assert got["matches"] == list(range(0, 100, 2))
+    assert got["size"] == 2000
@@ -0,0 +1,99 @@
+import asyncio
+import sqlite3
+import time
+
+from app import db
+
+SLOW_QUERY = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000000) "
+    "SELECT COUNT(*) AS c FROM n"
+)
+
+
+async def _max_stall(work) -> float:
+    """Run `work` while a ticker measures the longest gap between event loop turns."""
+    gaps = []
+    done = asyncio.Event()
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await work
+    finally:
+        done.set()
+        await task
+    return max(gaps), result
+
+
+def test_async_helpers_match_sync(database):
+    async def main():
+        assert await db.aexecute("INSERT INTO kv_state(key, value, updated_at) VALUES('a', '1', 0)") == 1
+        assert await db.aexecute("INSERT INTO kv_state(key, value, updated_at) VALUES('b', '2', 0)") == 1
+        assert await db.aexecute("UPDATE kv_state SET value = '3'") == 2
+        rows = await db.aquery_all("SELECT key, value FROM kv_state ORDER BY key")
+        assert rows == db.query_all("SELECT key, value FROM kv_state ORDER BY key")
+        assert rows == [{"key": "a", "value": "3"}, {"key": "b", "value": "3"}]
+        assert await db.aquery_one("SELECT value FROM kv_state WHERE key = 'a'") == {"value": "3"}
+        assert await db.aquery_one("SELECT value FROM kv_state WHERE key = 'zz'") is None
+
+    asyncio.run(main())
+
+
+def test_concurrent_writes_keep_order(database):
+    async def main():
+        await asyncio.gather(*(
+            db.aexecute(
+                "INSERT INTO kv_state(key, value, updated_at) VALUES('k', ?, 0) "
+                "ON CONFLICT(key) DO UPDATE SET value = value || ',' || excluded.value",
+                (str(i),),
+            )
+            for i in range(50)
+        ))
+        row = await db.aquery_one("SELECT value FROM kv_state WHERE key = 'k'")
+        assert row["value"].split(",") == [str(i) for i in range(50)]
+
+    asyncio.run(main())
+
+
+def test_slow_read_does_not_block_event_loop(database):
+    async def main():
+        stall, row = await _max_stall(db.aquery_one(SLOW_QUERY))
+        assert row == {"c": 2000000}
+        assert stall < 0.1
+
+    asyncio.run(main())
+
+
+def test_write_waiting_for_lock_does_not_block_event_loop(database):
+    blocker = sqlite3.connect(db.DB_PATH, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.3, blocker.execute, "COMMIT")
+        started = time.perf_counter()
+        stall, count = await _max_stall(db.aexecute("INSERT INTO kv_state(key, value, updated_at) VALUES('w', '1', 0)"))
+        assert count == 1
+        assert time.perf_counter() - started >= 0.25  # really waited for the lock
+        assert stall < 0.1
+
+    try:
+        asyncio.run(main())
+    finally:
+        blocker.close()
+
+
+def test_many_concurrent_reads_share_bounded_connections(database):
+    async def main():
+        results = await asyncio.gather(*(db.aquery_one("SELECT ? AS n", (i,)) for i in range(200)))
+        assert [r["n"] for r in results] == list(range(200))
+
+    asyncio.run(main())
+    assert len(db._READERS) <= db._MAX_READERS
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import files
+from app.routers.files import dir_tree
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """root/d00..d29, d15/e00..e49 (e49 holds f0..f2), and a file at root."""
+
+    def resolve(path):
+        # resolve_path applies Windows path rules (see test_path_utils); use host paths here
+        abs_path = os.path.abspath(path)
+        return os.path.commonpath([abs_path, str(tmp_path)]) == str(tmp_path), abs_path
+
+    monkeypatch.setattr(files, "resolve_path", resolve)
+    for n in range(30):
+        (tmp_path / f"d{n:02}").mkdir()
+    for n in range(50):
+        (tmp_path / "d15" / f"e{n:02}").mkdir()
+    for n in range(3):
+        (tmp_path / "d15" / "e49" / f"f{n}").mkdir()
+    (tmp_path / "file.txt").write_text("x")
+    return tmp_path
+
+
+def _names(node):
+    return [c["name"] for c in node["children"]]
+
+
+def _get(root, depth=1, expand_to=None, max_nodes=5000):
+    return dir_tree(str(root), depth=depth, expand_to=expand_to, max_nodes=max_nodes)
+
+
+def _count(node):
+    return sum(1 + _count(c) for c in node["children"] or [])
+
+
+def test_levels(tree):
+    result = _get(tree, depth=2)
+    root = result["root"]
+    assert _names(root) == [f"d{n:02}" for n in range(30)]  # directories only, sorted
+    d15 = root["children"][15]
+    assert len(d15["children"]) == 50
+    assert d15["children"][0]["children"] is None  # third level not loaded
+    assert result == {"root": root, "nodes": 80, "truncated": False}
+    assert _get(tree, depth=0)["root"]["children"] is None
+
+
+def test_max_nodes_cuts_levels(tree):
+    result = _get(tree, depth=2, max_nodes=10)
+    assert result["truncated"] and result["nodes"] == 10
+    assert _names(result["root"]) == [f"d{n:02}" for n in range(10)]
+    assert result["root"]["truncated"] is True
+
+
+def test_expand_to_lists_the_chain(tree):
+    result = _get(tree, depth=1, expand_to=str(tree / "d15" / "e49"))
+    d15 = result["root"]["children"][15]
+    e49 = d15["children"][49]
+    assert len(result["root"]["children"]) == 30 and len(d15["children"]) == 50
+    assert _names(e49) == ["f0", "f1", "f2"]
+    assert not result["truncated"] and result["nodes"] == _count(result["root"]) == 83
+
+
+def test_expand_to_respects_max_nodes(tree):
+    result = _get(tree, depth=1, expand_to=str(tree / "d15" / "e49"), max_nodes=5)
+    root = result["root"]
+    # Each chain level is cut, but keeps the directory leading to expand_to
+    assert _names(root) == ["d00", "d01", "d02", "d03", "d15"]
+    d15 = root["children"][-1]
+    assert _names(d15) == ["e49"]
+    assert root["truncated"] and d15["truncated"] and result["truncated"]
+    assert result["nodes"] == _count(root) == 6  # one over budget to reach expand_to
+    assert d15["children"][0]["children"] is None
+
+
+@pytest.mark.parametrize("root, expand_to, status", [
+    ("d15", "d14", 400),
+    ("", "d15/nope", 404),
+    ("", "file.txt", 404),
+    ("", "..", 403),
+])
+def test_expand_to_errors(tree, root, expand_to, status):
+    with pytest.raises(HTTPException) as e:
+        _get(tree / root, expand_to=os.path.normpath(tree / expand_to))
+    assert e.value.status_code == status
+
+
+def test_missing_root(tree):
+    with pytest.raises(HTTPException) as e:
+        _get(tree / "nope")
+    assert e.value.status_code == 404
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app import file_cache
+from app.file_cache import HotFileCache
+from app.routers import files
+
+
+def _write(path, data: bytes, mtime: int = 1_700_000_000):
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_hit_after_first_read(tmp_path):
+    cache = HotFileCache(max_bytes=1000, max_file_size=100)
+    path = _write(tmp_path / "a.txt", b"hello")
+    first = cache.get(path)
+    second = cache.get(path)
+    assert first.data == b"hello"
+    assert second is first
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 5)
+
+
+def test_lru_eviction_by_bytes(tmp_path):
+    cache = HotFileCache(max_bytes=25, max_file_size=10)
+    a, b, c = (_write(tmp_path / name, b"x" * 10) for name in ("a", "b", "c"))
+    cache.get(a)
+    cache.get(b)
+    cache.get(a)  # a is now the most recently used
+    cache.get(c)  # 30 bytes > 25: evicts b, the least recently used
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 20, 1)
+    hits = cache.hits
+    cache.get(a)
+    cache.get(c)
+    assert cache.hits == hits + 2
+    cache.get(b)
+    assert cache.hits == hits + 2  # b was re-read
+    assert cache.evictions == 2
+
+
+def test_rewrite_invalidates_entry(tmp_path):
+    cache = HotFileCache(max_bytes=1000, max_file_size=100)
+    path = _write(tmp_path / "a.txt", b"one")
+    old = cache.get(path)
+    _write(tmp_path / "a.txt", b"two", mtime=1_700_000_100)
+    new = cache.get(path)
+    assert new.data == b"two"
+    assert new.etag != old.etag
+    assert cache.stats()["entries"] == 1
+    assert cache.misses == 2
+
+
+def test_invalidate_drops_entry(tmp_path):
+    cache = HotFileCache(max_bytes=1000, max_file_size=100)
+    path = _write(tmp_path / "a.txt", b"hello")
+    cache.get(path)
+    cache.invalidate(path)
+    assert cache.stats()["bytes"] == 0
+    cache.get(path)
+    assert cache.misses == 2
+
+
+def test_too_large_is_not_cached(tmp_path):
+    cache = HotFileCache(max_bytes=1000, max_file_size=4)
+    path = _write(tmp_path / "a.txt", b"hello")
+    assert cache.get(path) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_missing_or_directory_raises(tmp_path):
+    cache = HotFileCache(max_bytes=1000, max_file_size=100)
+    with pytest.raises(FileNotFoundError):
+        cache.get(str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        cache.get(str(tmp_path / "missing"))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(file_cache, "hot_files", HotFileCache(max_bytes=1000, max_file_size=100))
+    app = FastAPI()
+
+    @app.get("/read")
+    def read(path: str, request: Request):
+        return files._read_text_response(path, request)
+
+    return TestClient(app)
+
+
+def test_etag_revalidation_returns_304(tmp_path, client):
+    path = _write(tmp_path / "a.txt", b"line1\r\nline2\n")
+    res = client.get("/read", params={"path": path})
+    assert res.status_code == 200
+    assert res.text == "line1\nline2\n"
+    etag = res.headers["etag"]
+
+    res = client.get("/read", params={"path": path}, headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["etag"] == etag
+    assert res.content == b""
+    assert file_cache.hot_files.hits == 1
+
+    res = client.get("/read", params={"path": path}, headers={"If-None-Match": 'W/"other", ' + etag})
+    assert res.status_code == 304
+
+    _write(tmp_path / "a.txt", b"changed", mtime=1_700_000_100)
+    res = client.get("/read", params={"path": path}, headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.text == "changed"
+    assert res.headers["etag"] != etag
+
+
+def test_large_file_still_gets_etag(tmp_path, client):
+    path = _write(tmp_path / "big.txt", b"y" * 500)
+    res = client.get("/read", params={"path": path})
+    assert res.status_code == 200 and len(res.text) == 500
+    res = client.get("/read", params={"path": path}, headers={"If-None-Match": res.headers["etag"]})
+    assert res.status_code == 304
+    assert file_cache.hot_files.stats()["entries"] == 0
@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+import random
+
+import pytest
+
+from app import job_logs
+from app.config import settings
+
+
+def _job(db, job_id, status="success", days_ago=0.0):
+    start = (datetime.datetime.now() - datetime.timedelta(days=days_ago)).isoformat()
+    db.execute("INSERT INTO jobs(id, script, status, start_time) VALUES(?, 'a.py', ?, ?)", (job_id, status, start))
+
+
+def _append(job_id, *parts):
+    async def main():
+        for part in parts:
+            await job_logs.append(job_id, part)
+    asyncio.run(main())
+
+
+def test_paged_reads_across_chunks(database):
+    _job(database, "j")
+    parts = ["héllo\n", "", "x" * 3000 + "\n", "wörld ✓\n"]
+    _append("j", *parts)
+    text = "".join(parts)
+    chunks = database.query_all("SELECT seq, start, length, compressed FROM job_log_chunks WHERE job_id='j' ORDER BY seq")
+    # The empty append stores nothing; only the long, repetitive chunk is compressed
+    assert [(c["seq"], c["start"], c["length"], c["compressed"]) for c in chunks] == [
+        (0, 0, 6, 0), (1, 6, 3001, 1), (2, 3007, 8, 0)
+    ]
+    row = database.query_one("SELECT log_chars, log_bytes FROM jobs WHERE id='j'")
+    assert row["log_chars"] == len(text)
+    assert row["log_bytes"] < len(text.encode("utf-8"))
+
+    assert job_logs.read_range("j") == text
+    pages = [job_logs.read_range("j", offset, 700) for offset in range(0, len(text), 700)]
+    assert "".join(pages) == text
+    assert job_logs.read_range("j", 3, 6) == "lo\nxxx"
+    assert job_logs.read_range("j", 3005, 5) == "x\nwör"
+    assert job_logs.read_range("j", len(text)) == ""
+    assert job_logs.read_range("j", -5, 2) == "hé"
+    assert asyncio.run(job_logs.aread_range("j", 3005, 5)) == "x\nwör"
+
+
+def test_read_is_capped(database, monkeypatch):
+    monkeypatch.setattr(job_logs, "MAX_READ_CHARS", 4)
+    _job(database, "j")
+    _append("j", "abcdefgh")
+    assert job_logs.read_range("j", 1, 100) == "bcde"
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "automation_log_retention_days", 0)
+    monkeypatch.setattr(settings, "automation_max_jobs", 0)
+    monkeypatch.setattr(settings, "automation_max_log_mb", 0)
+    return settings
+
+
+def test_retention_by_age_and_count(database, limits):
+    limits.automation_log_retention_days = 10
+    limits.automation_max_jobs = 2
+    _job(database, "ancient", days_ago=20)
+    _job(database, "old", days_ago=5)
+    _job(database, "mid", days_ago=3)
+    _job(database, "new", days_ago=1)
+    _job(database, "live", status="running", days_ago=40)
+    _job(database, "waiting", status="queued", days_ago=40)
+    for job_id in ("ancient", "old", "new"):
+        _append(job_id, "output of " + job_id)
+
+    assert asyncio.run(job_logs.enforce_retention()) == {"deleted_jobs": 2, "dropped_logs": 0}
+    remaining = {r["id"] for r in database.query_all("SELECT id FROM jobs")}
+    assert remaining == {"mid", "new", "live", "waiting"}
+    chunks = {r["job_id"] for r in database.query_all("SELECT job_id FROM job_log_chunks")}
+    assert chunks == {"new"}
+
+
+def test_byte_budget_drops_oldest_logs_first(database, limits):
+    limits.automation_max_log_mb = 1
+    rng = random.Random(0)
+    big = "".join(chr(0x4E00 + rng.randrange(20000)) for _ in range(320_000))
+    for job_id, days_ago in (("a", 3), ("b", 2), ("c", 1)):
+        _job(database, job_id, days_ago=days_ago)
+        _append(job_id, big)
+    _job(database, "running", status="running", days_ago=5)
+    _append("running", big)
+    stored = database.query_one("SELECT log_bytes FROM jobs WHERE id='a'")["log_bytes"]
+    assert 512 * 1024 < stored <= 1024 * 1024  # only the newest finished log fits
+
+    assert asyncio.run(job_logs.enforce_retention()) == {"deleted_jobs": 0, "dropped_logs": 2}
+    rows = {r["id"]: r for r in database.query_all("SELECT id, log_bytes, log_pruned FROM jobs")}
+    assert [rows[j]["log_pruned"] for j in ("a", "b", "c", "running")] == [1, 1, 0, 0]
+    assert rows["a"]["log_bytes"] == rows["b"]["log_bytes"] == 0
+    assert job_logs.read_range("a") == ""
+    assert job_logs.read_range("c", 0, 10) == big[:10]
+    assert job_logs.read_range("running", 0, 10) == big[:10]
+
+
+def test_delete_removes_chunks(database):
+    _job(database, "j")
+    _append("j", "data")
+    assert asyncio.run(job_logs.delete(["j", "missing"])) == 1
+    assert database.query_all("SELECT * FROM job_log_chunks") == []
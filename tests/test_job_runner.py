@@ -0,0 +1,99 @@
+import asyncio
+import sys
+
+import pytest
+
+from app import db, job_logs, job_runner
+from app.job_runner import JobStream
+
+
+@pytest.fixture
+def job(database):
+    database.execute("INSERT INTO jobs(id, script, status, start_time) VALUES('j1', 'a.py', 'running', '')")
+    return "j1"
+
+
+def _collect(stream: JobStream, offset: int = 0):
+    async def follow():
+        return [msg async for msg in stream.follow(offset)]
+    return asyncio.ensure_future(follow())
+
+
+def test_run_streams_and_persists_output(job):
+    script = "import sys\nfor i in range(3):\n    print('line', i, flush=True)\nsys.stdout.write('no newline\\r\\n')\nsys.exit(3)\n"
+    started = []
+
+    async def main():
+        status, exit_code, stream = await job_runner.run(job, [sys.executable, "-c", script], started.append)
+        assert job_runner.get_stream(job) is stream
+        viewer = _collect(stream)
+        await asyncio.sleep(0)
+        job_runner.finish(stream)
+        return status, exit_code, stream, await viewer
+
+    status, exit_code, stream, messages = asyncio.run(main())
+    expected = "line 0\nline 1\nline 2\nno newline\n"
+    assert (status, exit_code) == ("failed", 3)
+    assert started == [stream] and stream.proc is not None
+    assert messages == [{"type": "output", "data": expected}, {"type": "end", "status": "failed", "exit_code": 3}]
+    assert job_runner.get_stream(job) is None
+    assert job_logs.read_range(job) == expected
+    assert db.query_one("SELECT log_chars FROM jobs WHERE id = ?", (job,))["log_chars"] == len(expected)
+
+
+def test_spawn_failure_is_logged(job):
+    async def main():
+        return await job_runner.run(job, ["/nonexistent/interpreter"])
+
+    status, exit_code, stream = asyncio.run(main())
+    assert (status, exit_code) == ("failed", -1)
+    assert job_logs.read_range(job).startswith("Internal Error:")
+    job_runner.finish(stream)
+
+
+def test_flushes_in_batches(job, monkeypatch):
+    monkeypatch.setattr(job_runner, "FLUSH_CHARS", 10)
+    monkeypatch.setattr(job_runner, "FLUSH_INTERVAL", 3600)
+
+    async def main():
+        stream = JobStream(job)
+        await stream.write("abc")
+        before = job_logs.read_range(job)
+        await stream.write("defghijkl")  # 12 pending >= 10: flushed
+        after = job_logs.read_range(job)
+        await stream.write("xyz")
+        await stream.flush()
+        return before, after
+
+    before, after = asyncio.run(main())
+    assert (before, after) == ("", "abcdefghijkl")
+    assert job_logs.read_range(job) == "abcdefghijkl" + "xyz"
+    assert job_logs.read_range(job, 5, 4) == "fghi"
+
+
+def test_slow_viewer_skips_ahead(job, monkeypatch):
+    monkeypatch.setattr(job_runner, "SCROLLBACK_CHARS", 10)
+    monkeypatch.setattr(job_runner, "FLUSH_INTERVAL", 3600)
+
+    async def main():
+        stream = JobStream(job)
+        for part in ("aaaa", "bbbb", "cccc", "dddd"):
+            await stream.write(part)
+        assert stream.start == 4  # "aaaa" ended 12 characters ago
+        assert stream.read_from(0) == (4, "bbbbccccdddd")
+        assert stream.read_from(10) == (0, "ccdddd")
+        viewer = _collect(stream, 0)
+        await asyncio.sleep(0)
+        await stream.write("e")
+        await asyncio.sleep(0)
+        stream.status, stream.exit_code = "success", 0
+        job_runner.finish(stream)
+        return await viewer
+
+    messages = asyncio.run(main())
+    assert messages == [
+        {"type": "truncated", "chars": 4},
+        {"type": "output", "data": "bbbbccccdddd"},
+        {"type": "output", "data": "e"},
+        {"type": "end", "status": "success", "exit_code": 0},
+    ]
@@ -0,0 +1,135 @@
+import asyncio
+import datetime
+
+import pytest
+
+from app import cluster, db, job_scheduler
+from app.config import settings
+from app.job_scheduler import JobScheduler, _cron_field, cron_matches
+
+
+@pytest.mark.parametrize("spec, lo, hi, expected", [
+    ("*", 0, 5, {0, 1, 2, 3, 4, 5}),
+    ("3", 0, 59, {3}),
+    ("1-4", 0, 59, {1, 2, 3, 4}),
+    ("*/15", 0, 59, {0, 15, 30, 45}),
+    ("10-20/5", 0, 59, {10, 15, 20}),
+    ("50/4", 0, 59, {50, 54, 58}),  # a start with a step runs to the end of the range
+    ("1,5,7-8", 1, 12, {1, 5, 7, 8}),
+    ("0,7", 0, 7, {0, 7}),
+])
+def test_cron_field(spec, lo, hi, expected):
+    assert _cron_field(spec, lo, hi) == expected
+
+
+@pytest.mark.parametrize("spec", ["60", "5-1", "*/0", "x", "1-", "", "1,,2"])
+def test_cron_field_rejects(spec):
+    with pytest.raises(ValueError):
+        _cron_field(spec, 0, 59)
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "* * * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *"])
+def test_cron_matches_rejects(expr):
+    with pytest.raises(ValueError):
+        cron_matches(expr, datetime.datetime(2026, 1, 1))
+
+
+def test_cron_matches():
+    monday = datetime.datetime(2026, 10, 19, 9, 30)
+    assert cron_matches("30 9 * * *", monday)
+    assert not cron_matches("31 9 * * *", monday)
+    assert cron_matches("*/10 8-17 * * 1-5", monday)
+    assert not cron_matches("* * * * 0", monday)
+    sunday = datetime.datetime(2026, 10, 18, 0, 0)
+    assert cron_matches("0 0 * * 0", sunday) and cron_matches("0 0 * * 7", sunday)
+    # Both day fields restricted: either one matching is enough
+    assert cron_matches("30 9 1 * 1", monday)
+    assert cron_matches("30 9 19 * 0", monday)
+    assert not cron_matches("30 9 1 * 0", monday)
+    # Only one restricted: it must match
+    assert not cron_matches("30 9 1 * *", monday)
+
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch, database):
+    """Scripts dir with a.py (@Concurrency: 2) and b.py (default 1)."""
+    scripts_dir = tmp_path / "scripts"
+    scripts_dir.mkdir()
+    (scripts_dir / "a.py").write_text("# @Concurrency: 2\n")
+    (scripts_dir / "b.py").write_text("print('b')\n")
+    monkeypatch.setattr(job_scheduler, "SCRIPTS_DIR", str(scripts_dir))
+    monkeypatch.setattr(settings, "automation_max_concurrent", 10)
+    return scripts_dir
+
+
+def _scheduler(started):
+    sched = JobScheduler()
+
+    async def execute(job_id, run):
+        started.append((job_id, run.script))
+
+    sched._execute = execute
+    return sched
+
+
+def _status(job_id):
+    return db.query_one("SELECT status, owner FROM jobs WHERE id = ?", (job_id,))
+
+
+def test_dispatch_follows_priority_then_queue_order(scripts, monkeypatch):
+    monkeypatch.setattr(settings, "automation_max_concurrent", 1)
+    started = []
+
+    async def main():
+        sched = _scheduler(started)
+        low = await sched.enqueue("a.py")
+        high = await sched.enqueue("b.py", priority=5)
+        later = await sched.enqueue("a.py")
+        order = []
+        for _ in range(3):
+            await sched._dispatch()
+            await asyncio.sleep(0)
+            order.append(started[-1][0])
+            await db.aexecute("UPDATE jobs SET status='success' WHERE id = ?", (order[-1],))
+        return order, [low, high, later]
+
+    order, (low, high, later) = asyncio.run(main())
+    assert order == [high, low, later]
+    assert _status(later) == {"status": "success", "owner": cluster.WORKER_ID}
+
+
+def test_dispatch_respects_per_script_and_global_limits(scripts, monkeypatch):
+    started = []
+
+    async def main():
+        sched = _scheduler(started)
+        a_jobs = [await sched.enqueue("a.py") for _ in range(4)]
+        b_jobs = [await sched.enqueue("b.py") for _ in range(2)]
+        await sched._dispatch()
+        await asyncio.sleep(0)
+        return a_jobs, b_jobs
+
+    a_jobs, b_jobs = asyncio.run(main())
+    # a.py is at its limit of 2 but does not hold up b.py (limit 1)
+    assert [s for _, s in started] == ["a.py", "a.py", "b.py"]
+    assert [_status(j)["status"] for j in a_jobs] == ["running", "running", "queued", "queued"]
+    assert [_status(j)["status"] for j in b_jobs] == ["running", "queued"]
+
+
+def test_dispatch_counts_jobs_running_on_other_workers(scripts, monkeypatch):
+    monkeypatch.setattr(settings, "automation_max_concurrent", 2)
+    started = []
+    # Started by a previous leader that still runs it
+    db.execute("INSERT INTO jobs(id, script, status, start_time, owner) VALUES('old', 'a.py', 'running', '', 'other-worker')")
+
+    async def main():
+        sched = _scheduler(started)
+        queued = [await sched.enqueue("a.py") for _ in range(2)] + [await sched.enqueue("b.py")]
+        await sched._dispatch()
+        await asyncio.sleep(0)
+        return queued
+
+    queued = asyncio.run(main())
+    # One global slot left: a.py (1 of 2 running elsewhere) takes it
+    assert started == [(queued[0], "a.py")]
+    assert [_status(j)["status"] for j in queued] == ["running", "queued", "queued"]
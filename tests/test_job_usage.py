@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import psutil
+import pytest
+
+from app import job_usage
+from app.job_usage import TreeUsage
+
+
+class FakeProc:
+    def __init__(self, pid, created, user, system, rss, io=(0, 0), children=()):
+        self.pid, self._created, self._children = pid, created, list(children)
+        self._cpu = SimpleNamespace(user=user, system=system)
+        self._rss = rss
+        self._io = SimpleNamespace(read_bytes=io[0], write_bytes=io[1]) if io is not None else None
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def create_time(self):
+        return self._created
+
+    def cpu_times(self):
+        return self._cpu
+
+    def memory_info(self):
+        return SimpleNamespace(rss=self._rss)
+
+    def io_counters(self):
+        if self._io is None:
+            raise psutil.AccessDenied(self.pid)
+        return self._io
+
+    def children(self, recursive=False):
+        return self._children
+
+
+@pytest.fixture
+def tree(monkeypatch):
+    """Replace psutil.Process with a lookup into a dict of fake processes."""
+    procs = {}
+
+    def process(pid):
+        if pid not in procs:
+            raise psutil.NoSuchProcess(pid)
+        return procs[pid]
+
+    monkeypatch.setattr(job_usage, "psutil", SimpleNamespace(Process=process, Error=psutil.Error))
+    return procs
+
+
+def test_totals_keep_exited_children(tree):
+    usage = TreeUsage()
+    child = FakeProc(20, 1.0, 2.0, 0.5, 300, io=(1000, 10))
+    tree[10] = FakeProc(10, 0.0, 0.1, 0.1, 100, io=(5, 5), children=[child])
+    usage.sample(10)
+    # The child exits and a new child reuses its pid
+    reused = FakeProc(20, 9.0, 1.0, 0.0, 50, io=(1, 2))
+    tree[10] = FakeProc(10, 0.0, 0.3, 0.2, 120, io=(7, 9), children=[reused])
+    usage.sample(10)
+    assert usage.samples == 2
+    assert usage.totals() == {
+        "cpu_user_s": 3.3,  # 0.3 (root, latest) + 2.0 (first child) + 1.0 (second child)
+        "cpu_system_s": 0.7,
+        "peak_rss": 400,
+        "read_bytes": 1008,
+        "write_bytes": 21,
+    }
+
+
+def test_io_denied_keeps_last_counters(tree):
+    usage = TreeUsage()
+    tree[10] = FakeProc(10, 0.0, 0.1, 0.0, 100, io=(50, 60))
+    usage.sample(10)
+    tree[10] = FakeProc(10, 0.0, 0.2, 0.0, 100, io=None)
+    usage.sample(10)
+    totals = usage.totals()
+    assert (totals["cpu_user_s"], totals["read_bytes"], totals["write_bytes"]) == (0.2, 50, 60)
+
+
+def test_vanished_process_is_not_a_sample(tree):
+    usage = TreeUsage()
+    usage.sample(99)
+    assert usage.samples == 0
+    assert usage.totals()["peak_rss"] == 0
+
+
+def test_track_samples_a_real_process_tree(monkeypatch):
+    monkeypatch.setattr(job_usage, "SAMPLE_INTERVAL", 0.05)
+    child = "import time\nx = bytearray(32 << 20)\nend = time.time() + 0.4\nwhile time.time() < end: pass\n"
+    parent = f"import subprocess, sys\nsubprocess.run([sys.executable, '-c', {child!r}])\n"
+    usage = TreeUsage()
+
+    async def main():
+        procs = []
+        done = asyncio.Event()
+        tracker = asyncio.ensure_future(job_usage.track(usage, lambda: procs[0] if procs else None, done))
+        await asyncio.sleep(0.1)  # no process yet: track keeps polling for it
+        procs.append(subprocess.Popen([sys.executable, "-c", parent]))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, procs[0].wait)
+        done.set()
+        await asyncio.wait_for(tracker, 5)
+
+    asyncio.run(main())
+    totals = usage.totals()
+    assert usage.samples >= 2
+    assert totals["peak_rss"] > 32 << 20
+    assert totals["cpu_user_s"] + totals["cpu_system_s"] > 0.1
@@ -0,0 +1,78 @@
+import base64
+import json
+import os
+
+from app import listing
+from app.listing import Row
+
+
+def _decode(body: bytes) -> list:
+    """Rebuild `Entry` dicts from a columns payload, the way the frontend does."""
+    payload = json.loads(body)
+    assert payload["format"] == "columns"
+    bitmap = base64.b64decode(payload["is_dir"])
+    assert len(bitmap) == (payload["count"] + 7) // 8
+    dirs = payload.get("dirs")
+    entries = []
+    for i in range(payload["count"]):
+        parent = payload["base"]
+        rel = dirs[payload["dir_index"][i]] if dirs is not None else ""
+        if rel:
+            parent = os.path.join(parent, rel)
+        entries.append({
+            "name": payload["names"][i],
+            "path": os.path.join(parent, payload["names"][i]),
+            "is_dir": bool(bitmap[i >> 3] >> (i & 7) & 1),
+            "size": payload["sizes"][i],
+            "modified": payload["modified"][i],
+        })
+    return entries
+
+
+def _tree(tmp_path):
+    (tmp_path / "b.txt").write_bytes(b"12345")
+    (tmp_path / "A.log").write_bytes(b"")
+    (tmp_path / "zeta").mkdir()
+    (tmp_path / "Alpha").mkdir()
+    (tmp_path / "Alpha" / "inner.txt").write_bytes(b"abc")
+    (tmp_path / "ü-ñame.txt").write_bytes(b"x")
+    return str(tmp_path)
+
+
+def test_scan_dir_sorts_folders_first(tmp_path):
+    base = _tree(tmp_path)
+    rows = listing.scan_dir(base)
+    assert [r.name for r in rows] == ["Alpha", "zeta", "A.log", "b.txt", "ü-ñame.txt"]
+    assert [r.is_dir for r in rows] == [True, True, False, False, False]
+    assert rows[0].size == 0 and rows[3].size == 5
+    assert [r.name for r in listing.scan_dir(base, only_dirs=True)] == ["Alpha", "zeta"]
+
+
+def test_columns_round_trip_plain_listing(tmp_path):
+    base = _tree(tmp_path)
+    rows = listing.scan_dir(base)
+    body = listing.columns_response(base, rows).body
+    payload = json.loads(body)
+    assert "dirs" not in payload and "dir_index" not in payload
+    assert _decode(body) == listing.entry_dicts(rows)
+
+
+def test_columns_round_trip_search_results(tmp_path):
+    base = _tree(tmp_path)
+    nested = os.path.join(base, "Alpha")
+    rows = listing.sort_rows(listing.scan_dir(base) + listing.scan_dir(nested))
+    body = listing.columns_response(base, rows).body
+    payload = json.loads(body)
+    assert sorted(payload["dirs"]) == ["", "Alpha"]
+    assert _decode(body) == listing.entry_dicts(rows)
+
+
+def test_bitmap_spans_several_bytes():
+    rows = [Row("/base", "n%02d" % i, i % 3 == 0, i, float(i)) for i in range(19)]
+    body = listing.columns_response("/base", rows).body
+    assert [e["is_dir"] for e in _decode(body)] == [i % 3 == 0 for i in range(19)]
+
+
+def test_empty_listing():
+    payload = json.loads(listing.columns_response("/base", []).body)
+    assert payload["count"] == 0 and payload["names"] == [] and payload["is_dir"] == ""
@@ -0,0 +1,183 @@
+import datetime
+import json
+import os
+import random
+import re
+
+import pytest
+
+from app import log_search
+from app.config import settings
+from app.log_tail import LEVELS
+
+T0 = datetime.datetime(2026, 10, 19, 8, 0, 0)
+LOGGERS = ["app", "app.db", "application", "uvicorn.access"]
+LEVEL_NAMES = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+
+def _stamp(n: int) -> str:
+    return (T0 + datetime.timedelta(seconds=n, milliseconds=n % 1000)).strftime("%Y-%m-%d %H:%M:%S,%f")[:23]
+
+
+def _records(first: int, count: int, seed: int):
+    rng = random.Random(seed)
+    out = []
+    for n in range(first, first + count):
+        record = {
+            "time": _stamp(n),
+            "logger": rng.choice(LOGGERS),
+            "level": rng.choice(LEVEL_NAMES),
+            "message": f"event {n} " + rng.choice(["ok", "Disk FULL", "retry 3"]),
+        }
+        if rng.random() < 0.2:
+            # Continuation lines, including one that starts like a date
+            record["message"] += "\nTraceback (most recent call last):\n  2026 was a year\n    x = 1 - 2 - 3"
+        out.append(record)
+    return out
+
+
+def _write(path, records, json_format=False):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for r in records:
+            if json_format:
+                f.write(json.dumps({"time": r["time"], "logger": r["logger"], "level": r["level"],
+                                    "message": r["message"]}) + "\n")
+            else:
+                f.write(f"{r['time']} - {r['logger']} - {r['level']} - {r['message']}\n")
+
+
+@pytest.fixture
+def logs(tmp_path, monkeypatch):
+    """server.log.1 (older, 300 records) and server.log (newer, 200 records)."""
+    monkeypatch.setattr(settings, "log_file", str(tmp_path / "server.log"))
+    older, newer = _records(0, 300, seed=1), _records(300, 200, seed=2)
+    _write(tmp_path / "server.log.1", older)
+    _write(tmp_path / "server.log", newer)
+    return tmp_path, older + newer
+
+
+def _strip(items):
+    return [{k: r[k] for k in ("time", "logger", "level", "message")} for r in items]
+
+
+def _all_pages(query, limit, cursor=None):
+    items, pages = [], 0
+    while True:
+        page = log_search.search(query, limit=limit, cursor=cursor)
+        items += page["items"]
+        pages += 1
+        cursor = page["next"]
+        if cursor is None:
+            return items, pages
+
+
+def test_log_files_oldest_first(logs):
+    root, _ = logs
+    (root / "server.log.2").write_text("")
+    (root / "server.log.bak").write_text("")
+    assert [os.path.basename(p) for p in log_search.log_files()] == ["server.log.2", "server.log.1", "server.log"]
+
+
+def test_everything_in_order(logs):
+    _, records = logs
+    result = log_search.search(log_search.Query(), limit=1000)
+    assert _strip(result["items"]) == records and result["next"] is None
+    assert result["items"][0]["file"] == "server.log.1" and result["items"][-1]["file"] == "server.log"
+
+
+def test_seek_time_finds_the_first_record_from_any_probe(logs):
+    root, records = logs
+    path = root / "server.log.1"
+    data = path.read_bytes()
+    starts = [m.start() for m in re.finditer(rb"^2026-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} - ", data, re.M)]
+    with open(path, "rb") as f:
+        for n in range(0, 300, 7):
+            assert log_search._seek_time(f, len(data), records[n]["time"].encode()) == starts[n]
+            # A time between two records lands on the later one
+            between = records[n]["time"][:-3].encode() + b"500"
+            assert log_search._seek_time(f, len(data), between) == starts[n + 1]
+        assert log_search._seek_time(f, len(data), b"2030-01-01 00:00:00,000") is None
+        assert log_search._seek_time(f, len(data), b"2000-01-01 00:00:00,000") == 0
+
+
+@pytest.mark.parametrize("lo, hi", [(0, 500), (10, 20), (290, 310), (299, 301), (450, 500), (120, 121)])
+def test_time_range_across_files(logs, lo, hi):
+    _, records = logs
+    query = log_search.Query(start=records[lo]["time"].encode(),
+                             end=records[hi]["time"].encode() if hi < len(records) else None)
+    assert _strip(log_search.search(query, limit=1000)["items"]) == records[lo:hi]
+
+
+def test_normalize_time():
+    assert log_search.normalize_time("2026-10-19T03:12") == b"2026-10-19 03:12:00,000"
+    assert log_search.normalize_time(" 2026-10-19 03:12:05.5 ") == b"2026-10-19 03:12:05,500"
+
+
+@pytest.mark.parametrize("limit", [1, 7, 100])
+def test_paging_returns_each_record_once(logs, limit):
+    _, records = logs
+    query = log_search.Query(start=records[150]["time"].encode())
+    items, pages = _all_pages(query, limit)
+    assert _strip(items) == records[150:]
+    assert pages >= len(records[150:]) // limit
+
+
+def test_scan_budget_pages_without_losing_records(logs, monkeypatch):
+    _, records = logs
+    monkeypatch.setattr(log_search, "SCAN_BUDGET", 2000)
+    query = log_search.Query(text="full")
+    items, pages = _all_pages(query, 1000)
+    assert _strip(items) == [r for r in records if "full" in r["message"].lower()]
+    assert pages > 10
+
+
+def test_cursor_survives_rotation(logs):
+    root, records = logs
+    page = log_search.search(log_search.Query(), limit=350)
+    assert page["items"][-1]["file"] == "server.log"
+    # Rotate: the file the cursor points into becomes server.log.1 (same inode)
+    os.replace(root / "server.log.1", root / "server.log.2")
+    os.replace(root / "server.log", root / "server.log.1")
+    later = _records(500, 20, seed=3)
+    _write(root / "server.log", later)
+    rest, _ = _all_pages(log_search.Query(), 40, page["next"])
+    assert _strip(page["items"] + rest) == records + later
+
+
+def test_cursor_falls_back_to_time_when_the_file_is_gone(logs):
+    root, records = logs
+    page = log_search.search(log_search.Query(), limit=100)
+    assert page["items"][-1]["file"] == "server.log.1"
+    os.remove(root / "server.log.1")
+    rest, _ = _all_pages(log_search.Query(), 1000, page["next"])
+    # Continues at the first record at or after the last one seen
+    assert _strip(rest) == records[300:]
+
+
+def test_invalid_cursor(logs):
+    with pytest.raises(ValueError):
+        log_search.search(log_search.Query(), cursor="not a cursor")
+
+
+def test_filters(logs):
+    _, records = logs
+    cases = [
+        (log_search.Query(min_level=LEVELS["WARNING"]), lambda r: LEVELS[r["level"]] >= 30),
+        (log_search.Query(logger="app"), lambda r: r["logger"] in ("app", "app.db")),
+        (log_search.Query(text="disk full"), lambda r: "disk full" in r["message"].lower()),
+        (log_search.Query(pattern=re.compile(r"retry \d")), lambda r: re.search(r"retry \d", r["message"])),
+        (log_search.Query(text="traceback", min_level=LEVELS["ERROR"]),
+         lambda r: "traceback" in r["message"].lower() and r["level"] == "ERROR"),
+    ]
+    for query, keep in cases:
+        expected = [r for r in records if keep(r)]
+        assert expected and _strip(log_search.search(query, limit=1000)["items"]) == expected
+
+
+def test_json_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "log_file", str(tmp_path / "server.log"))
+    records = _records(0, 80, seed=4)
+    _write(tmp_path / "server.log", records, json_format=True)
+    query = log_search.Query(start=records[30]["time"].encode(), end=records[60]["time"].encode(), logger="app")
+    expected = [r for r in records[30:60] if r["logger"] in ("app", "app.db")]
+    assert _strip(log_search.search(query, limit=1000)["items"]) == expected
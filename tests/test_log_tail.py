@@ -0,0 +1,172 @@
+import asyncio
+import os
+import re
+
+import pytest
+
+from app import log_tail
+from app.log_tail import FileTailer, Subscriber
+
+
+def _drain(sub: Subscriber) -> str:
+    out = []
+    while not sub.queue.empty():
+        out.append(sub.queue.get_nowait())
+    return "".join(out)
+
+
+def _append(path, text: str) -> None:
+    with open(path, "ab") as f:
+        f.write(text.encode("utf-8"))
+
+
+def test_parse_level():
+    assert log_tail.parse_level("warning") == log_tail.parse_level("WARN") == 30
+    assert log_tail.parse_level(None) == log_tail.parse_level("verbose") == 0
+
+
+def test_fan_out_with_filters(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("before subscribing\n")
+
+    async def main():
+        tailer = FileTailer(str(path))
+        tailer._seek_end()
+        everything, warnings, matching = Subscriber(), Subscriber(log_tail.parse_level("warning")), Subscriber(0, re.compile("disk"))
+        tailer.subscribers.update((everything, warnings, matching))
+        _append(path, "t - app - INFO - disk ok\n"
+                      "t - app - ERROR - boom\n"
+                      "Traceback (most recent call last):\n"
+                      "  File x\n"
+                      "t - app - DEBUG - disk sp")
+        await tailer._poll()
+        first = [_drain(s) for s in (everything, warnings, matching)]
+        _append(path, "ace low ✓\n")
+        await tailer._poll()
+        second = [_drain(s) for s in (everything, warnings, matching)]
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first[0] == "t - app - INFO - disk ok\nt - app - ERROR - boom\nTraceback (most recent call last):\n  File x\n"
+    # Traceback lines inherit the ERROR level of the line before them
+    assert first[1] == "t - app - ERROR - boom\nTraceback (most recent call last):\n  File x\n"
+    assert first[2] == "t - app - INFO - disk ok\n"
+    # The unfinished line is held back until its newline arrives
+    assert second == ["t - app - DEBUG - disk space low ✓\n", "", "t - app - DEBUG - disk space low ✓\n"]
+
+
+def test_multibyte_character_split_across_reads(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"")
+    encoded = "größe\n".encode("utf-8")
+
+    async def main():
+        tailer = FileTailer(str(path))
+        tailer._seek_end()
+        sub = Subscriber()
+        tailer.subscribers.add(sub)
+        with open(path, "ab") as f:
+            f.write(encoded[:3])  # ends inside "ö"
+        await tailer._poll()
+        with open(path, "ab") as f:
+            f.write(encoded[3:])
+        await tailer._poll()
+        return _drain(sub)
+
+    assert asyncio.run(main()) == "größe\n"
+
+
+def test_slow_subscriber_drops_with_notice(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_tail, "SUBSCRIBER_QUEUE", 2)
+    path = tmp_path / "app.log"
+    path.write_text("")
+
+    async def main():
+        tailer = FileTailer(str(path))
+        tailer._seek_end()
+        slow, fast = Subscriber(), Subscriber()
+        tailer.subscribers.update((slow, fast))
+        for i in range(5):
+            _append(path, f"line {i}\nmore {i}\n")
+            await tailer._poll()
+            fast.queue.get_nowait()
+        queued = [slow.queue.get_nowait() for _ in range(2)]
+        _append(path, "after\n")
+        await tailer._poll()
+        return queued, _drain(slow), slow.dropped
+
+    queued, rest, dropped = asyncio.run(main())
+    assert queued == ["line 0\nmore 0\n", "line 1\nmore 1\n"]
+    # The three batches that did not fit are reported once there is room again
+    assert rest == "[... 6 lines skipped: client too slow ...]\nafter\n"
+    assert dropped == 0
+
+
+def test_rotation_and_truncation(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("old\n")
+
+    async def main():
+        tailer = FileTailer(str(path))
+        tailer._seek_end()
+        sub = Subscriber()
+        tailer.subscribers.add(sub)
+        _append(path, "last of old file\n")
+        os.replace(path, str(path) + ".1")
+        path.write_text("first of new file\n")
+        await tailer._poll()
+        rotated = _drain(sub)
+        path.write_text("x\n")  # shrank below the read position
+        await tailer._poll()
+        return rotated, _drain(sub)
+
+    rotated, truncated = asyncio.run(main())
+    assert rotated == "last of old file\n[log rotated]\nfirst of new file\n"
+    assert truncated == "[file truncated]\nx\n"
+
+
+def test_backlog_is_filtered(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("a - INFO - one\nb - ERROR - two\n  detail\nc - INFO - three\n")
+
+    async def main():
+        tailer = FileTailer(str(path))
+        tailer._seek_end()
+        errors = Subscriber(log_tail.parse_level("error"))
+        return (await tailer.backlog(Subscriber(), 30), await tailer.backlog(errors, 1000),
+                await tailer.backlog(errors, 0))
+
+    tail, errors, empty = asyncio.run(main())
+    assert tail == "  detail\nc - INFO - three\n"  # the cut first line is dropped
+    assert errors == "b - ERROR - two\n  detail\n"
+    assert empty == ""
+
+
+@pytest.fixture
+def polling(monkeypatch):
+    monkeypatch.setattr(log_tail, "module_available", lambda name: False)
+    monkeypatch.setattr(log_tail, "POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(log_tail, "_TAILERS", {})
+
+
+def test_followers_share_one_tailer(tmp_path, polling):
+    path = tmp_path / "app.log"
+    path.write_text("history\n")
+
+    async def main():
+        a, b = Subscriber(), Subscriber(log_tail.parse_level("error"))
+        tailer = await log_tail.subscribe(str(path), a)
+        assert await log_tail.subscribe(str(tmp_path / "." / "app.log"), b) is tailer
+        assert log_tail.stats() == [{"path": str(path), "subscribers": 2, "position": len("history\n")}]
+        _append(path, "x - INFO - hi\ny - ERROR - bad\n")
+        got_a = await asyncio.wait_for(a.queue.get(), 2)
+        got_b = await asyncio.wait_for(b.queue.get(), 2)
+        await log_tail.unsubscribe(tailer, a)
+        assert tailer._task is not None
+        await log_tail.unsubscribe(tailer, b)
+        return got_a, got_b, tailer
+
+    got_a, got_b, tailer = asyncio.run(main())
+    assert got_a == "x - INFO - hi\ny - ERROR - bad\n"
+    assert got_b == "y - ERROR - bad\n"
+    assert tailer._task is None and log_tail.stats() == []
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+import pytest
+
+from app import logging_config
+from app.config import settings
+from app.logging_config import AccessLog, BoundedQueueHandler, JsonFormatter
+
+
+def _record(msg: str, level: int = logging.INFO, args=None, exc_info=None) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, msg, args, exc_info)
+
+
+def _drain(q: queue.Queue) -> list:
+    out = []
+    while not q.empty():
+        out.append(q.get_nowait().getMessage())
+    return out
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setattr(BoundedQueueHandler, "WARNING_WAIT", 0.05)
+    monkeypatch.setattr(BoundedQueueHandler, "NOTICE_INTERVAL", 0.0)
+    return BoundedQueueHandler(queue.Queue(maxsize=2))
+
+
+def test_full_queue_drops_and_reports(handler):
+    for i in range(5):
+        handler.handle(_record("info %d", args=(i,)))
+    assert handler.dropped == 3
+    assert _drain(handler.queue) == ["info 0", "info 1"]
+    handler.handle(_record("after"))
+    # The notice goes ahead of the first record that gets through
+    assert _drain(handler.queue) == ["3 log records dropped: logging queue full", "after"]
+    assert handler.dropped == 0
+
+
+def test_notice_is_rate_limited(handler):
+    handler.NOTICE_INTERVAL = 3600
+    handler._last_notice = time.monotonic()
+    handler.dropped = 4
+    handler.handle(_record("kept"))
+    assert _drain(handler.queue) == ["kept"]
+    assert handler.dropped == 4
+
+
+def test_warning_waits_for_room(handler):
+    handler.handle(_record("a"))
+    handler.handle(_record("b"))
+    started = time.monotonic()
+    handler.handle(_record("lost", logging.WARNING))
+    assert time.monotonic() - started >= 0.04
+    assert handler.dropped == 1
+
+    threading.Timer(0.01, handler.queue.get_nowait).start()
+    handler.WARNING_WAIT = 2.0
+    handler.handle(_record("kept", logging.ERROR))
+    assert handler.dropped == 1
+    assert _drain(handler.queue)[-1] == "kept"
+
+
+def test_never_waits_on_event_loop(handler):
+    handler.overflow = "block"
+    handler.handle(_record("a"))
+    handler.handle(_record("b"))
+
+    async def main():
+        started = time.monotonic()
+        handler.handle(_record("lost", logging.ERROR))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) < 0.04
+    assert handler.dropped == 1
+
+
+def test_block_mode_waits(handler):
+    handler.overflow = "block"
+    handler.handle(_record("a"))
+    handler.handle(_record("b"))
+    threading.Timer(0.05, handler.queue.get_nowait).start()
+    handler.handle(_record("c"))
+    assert handler.dropped == 0
+    assert _drain(handler.queue) == ["b", "c"]
+
+
+def test_json_lines_keep_request_id_extras_and_traceback(handler):
+    token = logging_config.request_id_var.set("req-1")
+    try:
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            record = _record("failed %s", logging.ERROR, ("x",), sys.exc_info())
+        record.path = "/api/x"
+        handler.handle(record)
+    finally:
+        logging_config.request_id_var.reset(token)
+    line = json.loads(JsonFormatter().format(handler.queue.get_nowait()))
+    assert list(line)[:4] == ["time", "logger", "level", "message"]
+    assert (line["message"], line["level"], line["request_id"], line["path"]) == ("failed x", "ERROR", "req-1", "/api/x")
+    assert "ValueError: bad" in line["exc"]
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def access(monkeypatch):
+    monkeypatch.setattr(settings, "log_sample_paths", ["/api/thumb"])
+    monkeypatch.setattr(settings, "log_sample_rate", 0.25)
+    log = AccessLog()
+    log.logger = logging.getLogger("test.access")
+    log.logger.propagate = False
+    log.logger.setLevel(logging.INFO)
+    captured = ListHandler()
+    log.logger.handlers = [captured]
+    return log, captured.records
+
+
+def test_sampled_paths_are_aggregated(access):
+    log, records = access
+    log.record("GET", "/api/list", "path=C%3A", 200, 3.0, "1.2.3.4")
+    for i in range(8):
+        log.record("GET", "/api/thumb", f"path={i}", 200, float(i + 1), "1.2.3.4")
+    log.record("GET", "/api/thumb", "path=x", 404, 20.0, "1.2.3.4")
+    log.record("GET", "/api/thumb", "path=y", 503, 30.0, "1.2.3.4")
+
+    lines = [r.getMessage() for r in records]
+    assert lines[0] == '1.2.3.4 - "GET /api/list?path=C%3A" 200 3.0ms'
+    # A quarter of the 10 thumbnails are written (2), plus the 503 which always is
+    assert len([line for line in lines if "(sampled)" in line]) == 3
+    assert lines[-1] == '1.2.3.4 - "GET /api/thumb?path=y" 503 30.0ms (sampled)'
+    assert records[-1].status == 503 and records[-1].path == "/api/thumb"
+
+    del records[:]
+    log.flush()
+    assert len(records) == 1
+    summary = records[0]
+    assert summary.getMessage().startswith("/api/thumb: 10 requests, 2 errors, avg 8.6ms, max 30.0ms")
+    assert (summary.count, summary.errors, summary.avg_ms, summary.max_ms) == (10, 2, 8.6, 30.0)
+
+    del records[:]
+    log.flush()
+    assert records == []
+
+
+def test_stop_flushes_pending_totals(access):
+    log, records = access
+    log.start()
+    log.record("GET", "/api/thumb", "", 200, 1.0, "c")
+    log.stop()
+    assert log._thread is None
+    assert records[-1].getMessage().startswith("/api/thumb: 1 requests, 0 errors")
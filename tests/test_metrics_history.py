@@ -0,0 +1,63 @@
+import pytest
+
+from app import db, metrics_history
+from app.config import settings
+from app.metrics_history import FIELDS, MetricsHistory
+
+T0 = 1_700_000_000  # aligned on every tier step
+
+
+@pytest.fixture
+def shared_db(database, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_persist", False)
+    monkeypatch.setattr(metrics_history, "_SHARED", (0.0, MetricsHistory()))
+    return database
+
+
+def _filled(seconds: int) -> MetricsHistory:
+    history = MetricsHistory()
+    for n in range(seconds):
+        history.add(T0 + n, [float(n % 100), 50.0, 10.0, n * 2.0, n * 3.0])
+    return history
+
+
+def _publish(history: MetricsHistory, monkeypatch) -> None:
+    monkeypatch.setattr(metrics_history, "history", history)
+    metrics_history.publish()
+    db.execute("SELECT 1")  # the writer is FIFO: the publication is committed
+
+
+def test_snapshot_round_trip_answers_the_same(shared_db):
+    history = _filled(2 * 3600)
+    copy = MetricsHistory()
+    copy.restore(history.snapshot())
+    for window in (60, 3600, 2 * 3600):
+        end = T0 + 2 * 3600
+        assert copy.query(end - window, end, 300) == history.query(end - window, end, 300)
+    assert [r.size for r in copy.rings] == [r.size for r in history.rings]
+
+
+def test_every_worker_answers_from_the_publication(shared_db, monkeypatch):
+    leader = _filled(1800)
+    _publish(leader, monkeypatch)
+    end = T0 + 1800
+    answer = metrics_history.shared().query(end - 600, end, 600)
+    assert answer["resolution"] == 1
+    assert answer == leader.query(end - 600, end, 600)
+    # A worker that never sampled (fresh cache) gets the same answer
+    monkeypatch.setattr(metrics_history, "_SHARED", (0.0, MetricsHistory()))
+    assert metrics_history.shared().query(end - 600, end, 600) == answer
+
+
+def test_shared_is_empty_before_anything_is_published(shared_db):
+    answer = metrics_history.shared().query(T0, T0 + 60, 60)
+    assert answer["t"] == [] and all(answer[f] == [] for f in FIELDS)
+
+
+def test_new_leader_resumes_from_the_last_publication(shared_db, monkeypatch):
+    _publish(_filled(600), monkeypatch)
+    stale = _filled(60)  # rings left over from an earlier term of this worker
+    monkeypatch.setattr(metrics_history, "history", stale)
+    metrics_history.resume()
+    assert stale.rings[0].size == 600
+    assert stale.rings[0].range(0, float("inf"))[0][-1] == T0 + 599
@@ -0,0 +1,115 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.auth import SESSION_COOKIE
+from app.config import settings
+from app.middlewares import NO_COMPRESS_PATHS, AuthMiddleware, CompressionMiddleware
+
+TEXT = "line of compressible text\n" * 400  # ~10KB
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/text")
+    def text():
+        return PlainTextResponse(TEXT)
+
+    @app.get("/api/json")
+    def json_list():
+        return [{"name": f"file{i}.txt", "size": i} for i in range(300)]
+
+    @app.get("/api/small")
+    def small():
+        return PlainTextResponse("tiny")
+
+    @app.get("/api/image")
+    def image():
+        return Response(TEXT.encode(), media_type="image/svg+xml")
+
+    @app.get("/api/attachment")
+    def attachment():
+        return Response(TEXT.encode(), media_type="text/plain",
+                        headers={"Content-Disposition": 'attachment; filename="a.txt"'})
+
+    @app.get("/api/partial")
+    def partial():
+        return Response(TEXT.encode(), status_code=206, media_type="text/plain")
+
+    @app.get("/api/events")
+    def events():
+        return StreamingResponse(iter(["data: x\n\n"] * 200), media_type="text/event-stream")
+
+    for path in NO_COMPRESS_PATHS:
+        app.add_api_route(path, lambda: PlainTextResponse(TEXT), methods=["GET"])
+
+    @app.get("/index.html")
+    def index():
+        return PlainTextResponse("page")
+
+    app.add_middleware(AuthMiddleware)
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+    return app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "auth_enabled", False)
+    return TestClient(_app())
+
+
+def _encoding(client, path):
+    res = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert res.status_code in (200, 206)
+    return res.headers.get("content-encoding")
+
+
+@pytest.mark.parametrize("path", ["/api/text", "/api/json"])
+def test_text_responses_are_gzipped(client, path):
+    res = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in res.headers["vary"].lower()
+
+
+def test_gzip_body_round_trips(client):
+    with client.stream("GET", "/api/text", headers={"Accept-Encoding": "gzip"}) as res:
+        raw = b"".join(res.iter_raw())
+    assert len(raw) < len(TEXT) // 10
+    assert gzip.decompress(raw).decode() == TEXT
+
+
+@pytest.mark.parametrize("path", NO_COMPRESS_PATHS)
+def test_download_routes_are_never_compressed(client, path):
+    assert _encoding(client, path) is None
+
+
+@pytest.mark.parametrize("path", ["/api/small", "/api/image", "/api/attachment", "/api/partial", "/api/events"])
+def test_policy_skips_incompressible_responses(client, path):
+    assert _encoding(client, path) is None
+
+
+def test_no_gzip_without_accept_encoding(client):
+    res = client.get("/api/text", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert res.text == TEXT
+
+
+def test_event_stream_is_not_buffered(client):
+    with client.stream("GET", "/api/events", headers={"Accept-Encoding": "gzip"}) as res:
+        assert "content-encoding" not in res.headers
+        assert res.read().decode().count("data: x") == 200
+
+
+def test_auth_middleware(monkeypatch):
+    monkeypatch.setattr(settings, "auth_enabled", True)
+    client = TestClient(_app())
+    assert client.get("/api/text").status_code == 401
+    res = client.get("/index.html", follow_redirects=False)
+    assert res.status_code in (302, 307) and res.headers["location"] == "/login.html"
+    client.cookies.set(SESSION_COOKIE, "1")
+    res = client.get("/api/text", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200 and res.headers["content-encoding"] == "gzip"
@@ -0,0 +1,131 @@
+import ntpath
+import os
+import types
+
+import pytest
+
+from app import path_utils
+from app.config import settings
+
+
+def _reference_resolve(request_path, roots):
+    """resolve_path as it was before RootMatcher: commonpath against every root."""
+    osmod = path_utils.os
+    if not request_path:
+        return False, ""
+    normalized = path_utils.normalize_path(request_path)
+    if osmod.path.isabs(normalized):
+        abs_target = osmod.path.abspath(normalized)
+    else:
+        abs_target = osmod.path.abspath(osmod.path.join(roots[0], normalized))
+    for root in roots:
+        root_norm = osmod.path.normpath(root)
+        try:
+            common = osmod.path.commonpath([osmod.path.normcase(abs_target), osmod.path.normcase(root_norm)])
+        except ValueError:
+            continue
+        if common == osmod.path.normcase(root_norm):
+            return True, abs_target
+    return False, abs_target
+
+
+@pytest.fixture
+def windows(monkeypatch):
+    """Run path_utils with Windows path rules, whatever the host OS."""
+    shim = types.SimpleNamespace(path=ntpath, sep="\\", getcwd=lambda: "C:\\srv")
+    monkeypatch.setattr(path_utils, "os", shim)
+    monkeypatch.setattr(settings, "root_dirs", ["C:\\foo", "D:\\"])
+    path_utils._resolve_cached.cache_clear()
+    yield
+    path_utils._resolve_cached.cache_clear()
+
+
+@pytest.mark.parametrize("path, allowed", [
+    ("C:\\foo", True),
+    ("C:\\foo\\bar.txt", True),
+    ("C:\\foobar", False),
+    ("C:\\foobar\\x", False),
+    ("C:\\fo", False),
+    ("C:\\", False),
+    ("D:\\anything\\at\\all", True),
+    ("E:\\foo", False),
+])
+def test_prefix_confusion(windows, path, allowed):
+    assert path_utils.resolve_path(path)[0] is allowed
+    assert path_utils.is_within_allowed_roots(path) is allowed
+
+
+@pytest.mark.parametrize("path", [
+    "c:\\FOO\\Bar", "C:/foo/bar", "c:/Foo/", "C:\\foo\\\\bar", "C:\\foo\\.\\bar",
+])
+def test_case_and_separators(windows, path):
+    allowed, abs_path = path_utils.resolve_path(path)
+    assert allowed
+    assert abs_path.lower().startswith("c:\\foo")
+
+
+@pytest.mark.parametrize("path, allowed", [
+    ("C:\\foo\\..\\windows", False),
+    ("C:\\foo\\bar\\..\\..\\foobar", False),
+    ("C:\\foo\\bar\\..\\baz", True),
+    ("C:/foo/../foo/x", True),
+    ("..\\..\\windows", False),  # relative: joined to the first root, then normalized
+    ("bar\\..\\baz", True),
+    ("C:foo", True),  # drive-relative: joined to the first root like any relative path
+])
+def test_parent_references(windows, path, allowed):
+    assert path_utils.resolve_path(path)[0] is allowed
+
+
+def test_matches_reference_implementation(windows):
+    paths = [
+        "C:\\foo", "C:\\foobar", "c:\\foo\\x", "C:/foo/../bar", "D:", "D:\\", "d:/x/y/../z",
+        "..", "x\\y", "\\\\server\\share\\foo", "C:\\foo\\..\\..\\..", "E:\\",
+    ]
+    for path in paths:
+        assert path_utils.resolve_path(path) == _reference_resolve(path, settings.root_dirs), path
+
+
+def test_cache_follows_root_changes(windows, monkeypatch):
+    assert path_utils.resolve_path("C:\\foo\\x") == (True, "C:\\foo\\x")
+    assert path_utils.resolve_path("rel") == (True, "C:\\foo\\rel")
+    # reassigned
+    monkeypatch.setattr(settings, "root_dirs", ["D:\\"])
+    assert path_utils.resolve_path("C:\\foo\\x") == (False, "C:\\foo\\x")
+    assert path_utils.resolve_path("rel") == (True, "D:\\rel")
+    # edited in place
+    settings.root_dirs.append("C:\\foo")
+    assert path_utils.resolve_path("C:\\foo\\x") == (True, "C:\\foo\\x")
+    settings.root_dirs.clear()
+    assert path_utils.resolve_path("D:\\x") == (False, "D:\\x")
+
+
+def test_cached_entry_keyed_on_roots(windows, monkeypatch):
+    # A result computed under the old roots must not be served even if
+    # nothing cleared the cache
+    assert path_utils.resolve_path("E:\\data")[0] is False
+    monkeypatch.setattr(path_utils._resolve_cached, "cache_clear", lambda: None)
+    monkeypatch.setattr(settings, "root_dirs", ["E:\\"])
+    assert path_utils.resolve_path("E:\\data")[0] is True
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="no symlinks")
+def test_symlinks_are_not_followed(tmp_path, monkeypatch):
+    # The check is lexical, as before: a link inside a root is allowed by its
+    # own path, and retargeting it does not change (or go stale in) the answer
+    root = tmp_path / "root"
+    outside = tmp_path / "outside"
+    root.mkdir()
+    outside.mkdir()
+    link = root / "link"
+    try:
+        link.symlink_to(outside, target_is_directory=True)
+    except OSError:
+        pytest.skip("cannot create symlinks here")
+    monkeypatch.setattr(settings, "root_dirs", [str(root)])
+    assert path_utils.is_within_allowed_roots(str(link / "file"))
+    assert not path_utils.is_within_allowed_roots(str(outside / "file"))
+    link.unlink()
+    link.symlink_to(root, target_is_directory=True)
+    assert path_utils.is_within_allowed_roots(str(link / "file"))
+    assert not path_utils.is_within_allowed_roots(str(root) + "x")
@@ -0,0 +1,91 @@
+import gzip
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from app import static_assets
+from app.static_assets import PrecompressedStaticFiles
+
+SCRIPT = "function f() { return 1; }\n" * 200
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    monkeypatch.setattr(static_assets, "_VARIANTS", {})
+    (tmp_path / "app.js").write_text(SCRIPT)
+    (tmp_path / "tiny.css").write_text("a{}")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + b"\0" * 5000)
+    static = PrecompressedStaticFiles(directory=str(tmp_path))
+    return tmp_path, static, TestClient(Starlette(routes=[Mount("/", static)]))
+
+
+def _get(client, path, **headers):
+    """(response, raw body as sent, before any decoding)."""
+    with client.stream("GET", path, headers=headers) as res:
+        return res, b"".join(res.iter_raw())
+
+
+def test_gzip_variant(assets):
+    _, _, client = assets
+    res, raw = _get(client, "/app.js", **{"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["etag"].endswith('-gzip"')
+    assert int(res.headers["content-length"]) == len(raw) < len(SCRIPT)
+    assert gzip.decompress(raw).decode() == SCRIPT
+
+
+@pytest.mark.parametrize("accept", ["identity", "gzip;q=0", "deflate", ""])
+def test_identity_when_gzip_not_accepted(assets, accept):
+    _, _, client = assets
+    res, raw = _get(client, "/app.js", **{"Accept-Encoding": accept})
+    assert "content-encoding" not in res.headers
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert raw.decode() == SCRIPT
+
+
+@pytest.mark.parametrize("path", ["/tiny.css", "/logo.png"])
+def test_small_or_binary_assets_are_not_compressed(assets, path):
+    _, _, client = assets
+    res, _ = _get(client, path, **{"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in res.headers
+    assert "vary" not in res.headers
+
+
+def test_not_modified_per_encoding(assets):
+    _, _, client = assets
+    res, _ = _get(client, "/app.js", **{"Accept-Encoding": "gzip"})
+    etag = res.headers["etag"]
+    res, raw = _get(client, "/app.js", **{"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert res.status_code == 304 and raw == b""
+    # The identity representation has a different validator
+    res, _ = _get(client, "/app.js", **{"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert res.status_code == 200
+
+
+def test_changed_file_gets_new_variant(assets):
+    root, _, client = assets
+    _, before = _get(client, "/app.js", **{"Accept-Encoding": "gzip"})
+    changed = SCRIPT + "// more\n"
+    (root / "app.js").write_text(changed)
+    _, after = _get(client, "/app.js", **{"Accept-Encoding": "gzip"})
+    assert gzip.decompress(before).decode() == SCRIPT
+    assert gzip.decompress(after).decode() == changed
+
+
+def test_precompress_builds_variants_up_front(assets):
+    root, static, _ = assets
+    static.precompress()
+    assert set(static_assets._VARIANTS) == {os.path.join(str(root), "app.js")}
+
+
+@pytest.mark.skipif(static_assets.brotli is None, reason="Brotli is not installed")
+def test_brotli_preferred(assets):
+    _, _, client = assets
+    res, raw = _get(client, "/app.js", **{"Accept-Encoding": "gzip, br"})
+    assert res.headers["content-encoding"] == "br"
+    assert static_assets.brotli.decompress(raw).decode() == SCRIPT
@@ -0,0 +1,57 @@
+import asyncio
+import sys
+
+import pytest
+
+from app import terminal
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32" or not terminal.available()[0], reason="needs a POSIX pty")
+
+
+async def _until(predicate, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.02)
+
+
+async def _output(viewer, needle: bytes) -> bytes:
+    seen = b""
+    async for frame in viewer.frames():
+        seen += frame
+        if needle in seen:
+            break
+    return seen
+
+
+def test_reattach_replays_scrollback():
+    async def main():
+        session = terminal.create_session("test")
+        try:
+            first = session.attach()
+            session.write("echo hel''lo\n")
+            await asyncio.wait_for(_output(first, b"hello"), 5)
+            session.detach(first)
+            assert terminal.get_session(session.id) is session
+            again = session.attach(writable=False)
+            assert b"hello" in await asyncio.wait_for(_output(again, b"hello"), 5)
+            session.detach(again)
+        finally:
+            await terminal.close_all()
+
+    asyncio.run(main())
+
+
+def test_exited_session_is_not_reattached_and_is_reaped():
+    async def main():
+        session = terminal.create_session("test")
+        try:
+            session.write("exit\n")
+            await _until(lambda: not session.alive)
+            assert terminal.get_session(session.id) is None
+            await terminal.reap()
+            assert session.id not in [s["id"] for s in terminal.list_sessions()]
+        finally:
+            await terminal.close_all()
+
+    asyncio.run(main())
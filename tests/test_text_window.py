@@ -0,0 +1,231 @@
+import codecs
+import os
+import random
+
+import pytest
+
+from app import text_window
+
+
+def _lines(text: str):
+    """Lines with their terminators, the way read_lines returns them."""
+    out, start = [], 0
+    while start < len(text):
+        end = text.find("\n", start)
+        end = len(text) if end == -1 else end + 1
+        out.append(text[start:end])
+        start = end
+    return out
+
+
+@pytest.fixture(autouse=True)
+def small_steps(monkeypatch):
+    """Tiny checkpoints and chunks, so small files cross every boundary."""
+    monkeypatch.setattr(text_window, "INDEX_STEP", 7)
+    monkeypatch.setattr(text_window, "CHUNK_SIZE", 64)
+    monkeypatch.setattr(text_window, "_BLOCK_SIZE", 16)
+    text_window._INDEX_CACHE.clear()
+    yield
+    text_window._INDEX_CACHE.clear()
+
+
+def _write(path, text: str, encoding: str = "utf-8", bom: bytes = b"") -> None:
+    path.write_bytes(bom + text.encode(encoding))
+    # A distinct mtime for every write, however fast the test runs
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + random.randrange(1, 10**9)))
+
+
+def _text(n: int, seed: int = 0, ending: str = "\n") -> str:
+    rng = random.Random(seed)
+    return "".join(f"line {i} " + "é" * rng.randrange(0, 30) + ending for i in range(n))
+
+
+@pytest.mark.parametrize("encoding, bom", [
+    ("utf-8", b""), ("utf-8", codecs.BOM_UTF8), ("utf-16-le", codecs.BOM_UTF16_LE), ("utf-16-be", codecs.BOM_UTF16_BE),
+])
+def test_windows_match_the_file(tmp_path, encoding, bom):
+    text = _text(100) + "no newline at the end"
+    path = tmp_path / "f.txt"
+    _write(path, text, encoding, bom)
+    lines = _lines(text)
+    raw = path.read_bytes()
+    for start, count in [(0, 5), (6, 3), (7, 7), (13, 30), (95, 10), (100, 5), (101, 5), (250, 1)]:
+        window = text_window.read_lines(str(path), start, count)
+        assert window["text"] == "".join(lines[start:start + count]), (start, count)
+        assert window["line_count"] == len(lines[start:start + count])
+        # Offsets address exactly the bytes returned
+        body = raw[window["start_offset"]:window["end_offset"]]
+        assert body.decode(window["encoding"]) == window["text"]
+        assert window["eof"] == (window["end_offset"] == len(raw))
+        assert not window["truncated"]
+    # total_lines is known once the index reached the end
+    assert text_window.read_lines(str(path), 100, 1)["total_lines"] == 101
+
+
+def test_window_stops_before_a_line_that_does_not_fit(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_window, "MAX_WINDOW_BYTES", 100)
+    text = "a" * 40 + "\n" + "b" * 40 + "\n" + "c" * 40 + "\n"
+    path = tmp_path / "f.txt"
+    _write(path, text)
+    window = text_window.read_lines(str(path), 0, 10)
+    assert window["text"] == text[:82] and window["line_count"] == 2 and not window["truncated"]
+    follow = text_window.read_lines(str(path), 2, 10)
+    assert follow["start_offset"] == window["end_offset"] and follow["text"] == "c" * 40 + "\n"
+
+
+def test_line_longer_than_a_window_returns_its_head(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_window, "MAX_WINDOW_BYTES", 100)
+    text = "short\n" + "x" * 1000 + "\nafter\n"
+    path = tmp_path / "f.txt"
+    _write(path, text)
+    window = text_window.read_lines(str(path), 1, 5)
+    assert window["truncated"] and window["line_count"] == 1
+    assert window["text"] == "x" * 100
+    assert window["start_offset"] == 6 and window["end_offset"] == 106
+    # Skipping the long line on the way to a later one costs no memory and stays exact
+    assert text_window.read_lines(str(path), 2, 5)["text"] == "after\n"
+
+
+@pytest.mark.parametrize("encoding, bom", [("utf-8", b""), ("utf-16-le", codecs.BOM_UTF16_LE)])
+@pytest.mark.parametrize("trailing", ["\n", ""])
+def test_tail(tmp_path, encoding, bom, trailing):
+    text = _text(50).rstrip("\n") + trailing
+    path = tmp_path / "f.txt"
+    _write(path, text, encoding, bom)
+    lines = _lines(text)
+    for n in (1, 3, 49, 50, 80):
+        tail = text_window.read_tail(str(path), n)
+        assert tail["text"] == "".join(lines[-n:]), n
+        assert tail["line_count"] == min(n, len(lines))
+        assert tail["end_offset"] == len(path.read_bytes())
+
+
+def test_tail_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_window, "MAX_WINDOW_BYTES", 50)
+    path = tmp_path / "f.txt"
+    _write(path, _text(20))
+    tail = text_window.read_tail(str(path), 20)
+    assert tail["truncated"] and tail["start_offset"] == len(path.read_bytes()) - 50
+
+
+def test_rewritten_file_is_reindexed(tmp_path):
+    path = tmp_path / "f.txt"
+    _write(path, _text(60, seed=1))
+    assert text_window.read_lines(str(path), 40, 2)["text"] == "".join(_lines(_text(60, seed=1))[40:42])
+    # Grows, but the lines in front of the checkpoints changed length too
+    rewritten = _text(70, seed=2)
+    _write(path, rewritten)
+    assert text_window.read_lines(str(path), 40, 2)["text"] == "".join(_lines(rewritten)[40:42])
+    # Same size, different content
+    same_size = rewritten.replace("line", "LINE")
+    _write(path, same_size)
+    window = text_window.read_lines(str(path), 65, 5)
+    assert window["text"] == "".join(_lines(same_size)[65:70])
+    assert window["eof"]
+
+
+def test_read_bytes_aligns_two_byte_encodings(tmp_path):
+    path = tmp_path / "f.txt"
+    _write(path, "abcdef\n", "utf-16-le", codecs.BOM_UTF16_LE)
+    chunk = text_window.read_bytes(str(path), 3, 4)
+    assert chunk["start_offset"] == 2 and chunk["text"] == "ab"
+
+
+# ---------------- Saves ----------------
+
+def _apply(lines, edits):
+    out = list(lines)
+    for start, end, text in reversed(edits):
+        out[start:end] = [text]
+    return "".join(out)
+
+
+def test_write_text_and_stale_etag(tmp_path):
+    path = tmp_path / "f.txt"
+    etag = text_window.write_text(str(path), "one\n")
+    assert path.read_text() == "one\n" and etag == text_window.file_etag(str(path))
+    etag2 = text_window.write_text(str(path), "two\n", base_etag=etag)
+    with pytest.raises(text_window.VersionConflict):
+        text_window.write_text(str(path), "three\n", base_etag=etag)
+    assert path.read_text() == "two\n"
+    assert text_window.write_text(str(path), "three\n", base_etag=etag2.strip('"'))  # quotes optional
+    assert os.listdir(tmp_path) == ["f.txt"]  # no temp files left behind
+
+
+@pytest.mark.parametrize("encoding, bom", [("utf-8", b""), ("utf-16-le", codecs.BOM_UTF16_LE)])
+def test_line_edits(tmp_path, encoding, bom):
+    text = _text(60)
+    path = tmp_path / "f.txt"
+    _write(path, text, encoding, bom)
+    edits = [(0, 1, "first\n"), (8, 8, "inserted\n"), (20, 35, ""), (59, 60, "last é\n")]
+    # Read first, so a cached index exists when the save runs
+    text_window.read_lines(str(path), 50, 5)
+    etag = text_window.apply_line_edits(str(path), edits, text_window.file_etag(str(path)))
+    raw = path.read_bytes()
+    assert raw.startswith(bom) and raw[len(bom):].decode(encoding) == _apply(_lines(text), edits)
+    assert etag == text_window.file_etag(str(path))
+    assert text_window.read_lines(str(path), 45, 1)["text"] == "last é\n"  # 60 + 1 - 15 lines
+
+
+def test_line_edits_use_the_version_on_disk(tmp_path):
+    """An index cached for an older version must never locate the edits."""
+    path = tmp_path / "f.txt"
+    _write(path, _text(30, seed=1))
+    text_window.read_lines(str(path), 25, 5)
+    new = _text(30, seed=2)
+    _write(path, new)
+    edits = [(20, 21, "replaced\n")]
+    text_window.apply_line_edits(str(path), edits, text_window.file_etag(str(path)))
+    assert path.read_text() == _apply(_lines(new), edits)
+
+
+def test_line_edits_reject_a_stale_etag(tmp_path):
+    path = tmp_path / "f.txt"
+    _write(path, _text(10))
+    etag = text_window.file_etag(str(path))
+    _write(path, _text(10, seed=3))
+    before = path.read_bytes()
+    with pytest.raises(text_window.VersionConflict):
+        text_window.apply_line_edits(str(path), [(0, 1, "x\n")], etag)
+    assert path.read_bytes() == before
+
+
+def test_line_edits_must_be_sorted(tmp_path):
+    path = tmp_path / "f.txt"
+    _write(path, _text(10))
+    etag = text_window.file_etag(str(path))
+    for edits in ([(5, 6, ""), (2, 3, "")], [(2, 6, ""), (4, 8, "")], [(3, 2, "")]):
+        with pytest.raises(ValueError):
+            text_window.apply_line_edits(str(path), edits, etag)
+
+
+def test_stale_etag_is_412(tmp_path):
+    from fastapi import HTTPException
+
+    from app.routers.files import LineEdit, _save_patch, _save_text
+
+    path = tmp_path / "f.txt"
+    _write(path, "a\nb\n")
+    stale = text_window.file_etag(str(path))
+    _write(path, "a\nc\n")
+    for save in (lambda: _save_text(str(path), "new\n", stale),
+                 lambda: _save_patch(str(path), [LineEdit(start_line=0, end_line=1, text="x\n")], stale, None)):
+        with pytest.raises(HTTPException) as e:
+            save()
+        assert e.value.status_code == 412
+    assert path.read_text() == "a\nc\n"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX modes")
+def test_saves_keep_or_apply_the_file_mode(tmp_path):
+    path = tmp_path / "f.txt"
+    old = os.umask(0o027)
+    try:
+        text_window.write_text(str(path), "new\n")
+    finally:
+        os.umask(old)
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    os.chmod(path, 0o604)
+    text_window.write_text(str(path), "again\n")
+    assert os.stat(path).st_mode & 0o777 == 0o604
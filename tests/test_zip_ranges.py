@@ -0,0 +1,92 @@
+import os
+import zipfile
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app import zip_cache
+from app.config import settings
+from app.routers import files
+
+
+@pytest.fixture
+def cached_zip(tmp_path, monkeypatch):
+    """A source file whose archive is already in the ZIP cache (10000 known bytes)."""
+    monkeypatch.setattr(zip_cache, "ZIP_CACHE_DIR", str(tmp_path / "zips"))
+    os.makedirs(zip_cache.ZIP_CACHE_DIR)
+    source = tmp_path / "data.txt"
+    source.write_text("x")
+    files_to_zip = [(str(source), "data.txt")]
+    body = bytes(range(250)) * 40
+    key = zip_cache.fingerprint(files_to_zip, zipfile.ZIP_STORED)
+    with open(os.path.join(zip_cache.ZIP_CACHE_DIR, key + ".zip"), "wb") as f:
+        f.write(body)
+    return files_to_zip, body
+
+
+def _client(files_to_zip, evict: bool = False) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/zip")
+    def download(request: Request):
+        response = files._zip_response(request, files_to_zip, zipfile.ZIP_STORED, "x.zip")
+        if evict:
+            # The quota sweep runs between the headers and the body
+            settings.zip_cache_max_bytes, limit = 0, settings.zip_cache_max_bytes
+            try:
+                zip_cache.enforce_quota()
+            finally:
+                settings.zip_cache_max_bytes = limit
+            assert not os.listdir(zip_cache.ZIP_CACHE_DIR)
+        return response
+
+    return TestClient(app)
+
+
+def test_full_download(cached_zip):
+    files_to_zip, body = cached_zip
+    r = _client(files_to_zip).get("/zip")
+    assert r.status_code == 200
+    assert r.content == body
+    assert r.headers["content-length"] == str(len(body))
+    assert r.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=9990-", 9990, 9999),
+    ("bytes=-10", 9990, 9999),
+    ("bytes=5000-20000", 5000, 9999),
+])
+def test_range(cached_zip, header, start, end):
+    files_to_zip, body = cached_zip
+    r = _client(files_to_zip).get("/zip", headers={"Range": header})
+    assert r.status_code == 206
+    assert r.content == body[start:end + 1]
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(body)}"
+    assert r.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("header", ["items=0-5", "bytes=0-1,5-6", "bytes=a-b"])
+def test_unsupported_range_serves_everything(cached_zip, header):
+    files_to_zip, body = cached_zip
+    r = _client(files_to_zip).get("/zip", headers={"Range": header})
+    assert r.status_code == 200 and r.content == body
+
+
+def test_unsatisfiable_range(cached_zip):
+    files_to_zip, body = cached_zip
+    r = _client(files_to_zip).get("/zip", headers={"Range": "bytes=10000-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(body)}"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="an open file cannot be deleted on Windows")
+@pytest.mark.parametrize("headers", [{}, {"Range": "bytes=100-199"}])
+def test_eviction_after_headers_keeps_the_body(cached_zip, headers):
+    files_to_zip, body = cached_zip
+    r = _client(files_to_zip, evict=True).get("/zip", headers=headers)
+    expected = body[100:200] if headers else body
+    assert r.content == expected
+    assert r.headers["content-length"] == str(len(expected))